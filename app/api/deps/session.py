@@ -1,7 +1,16 @@
-from app.core.db import session_factory
+from app.core.db import session_factory, run_after_commit, mark_recent_write, create_read_session
 
 
 async def get_session():
     async with session_factory() as session:
         yield session
         await session.commit()
+        if session.info.get("has_writes"):
+            await mark_recent_write()
+        await run_after_commit(session)
+
+
+async def get_read_session():
+    """只读路由（列表、查询、导出）的会话，优先使用从库；自动提交模式，不提交"""
+    async with await create_read_session() as session:
+        yield session
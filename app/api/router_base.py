@@ -1,23 +1,39 @@
 from enum import Enum
-from typing import Type, Annotated, Set, Dict
+from typing import Type, Annotated, Set, Dict, Any, Callable, Awaitable
 
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, Query, Depends, Request
 from pydantic import BaseModel
+from starlette.responses import StreamingResponse, Response
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.deps.session import get_session
+from app.api.deps.session import get_session, get_read_session
+from app.config import config
+from app.exceptions import ParamValidationError
+from app.schemas.batch import BulkCreate, BulkCreateResult, UpdateMany, UpdateManyResult, BatchGet, BatchGetResult
 from app.schemas.pagination import Paged
-from app.schemas.query import CommonQuery, ComplexQuery
+from app.schemas.query import CommonQuery, ComplexQuery, ExportQuery, ExportFormat, ExportSource, RelationLoad
 from app.schemas.response import APIResponse
 from app.service.base import BaseService
+from app.utils.entity_cache import EntityCache
 from app.utils.model_util import get_primary_keys
+from app.utils.query_deadline import get_request_timeout, run_with_deadline
+from app.utils.query_util import check_filter_params, make_digest, normalize_condition
+from app.utils.response_util import FastJSONRenderer
+from app.utils.result_cache import ResultCache
+from app.utils.search_index import SearchIndex
+from app.utils.string_util import split_comma_separated
 
 
 class Route(str, Enum):
     LIST = "list"
+    GET = "get"
     CREATE = "create"
     UPDATE = "update"
+    EXPORT = "export"
+    BULK_CREATE = "bulk_create"
+    UPDATE_MANY = "update_many"
+    BATCH_GET = "batch_get"
 
 
 class RouterBase:
@@ -29,25 +45,65 @@ class RouterBase:
         schema_update: Type[BaseModel],
         schema_response: Type[BaseModel],
         service_class: Type[BaseService] = BaseService,
+        entity_cache_ttl: int = 0,
+        entity_negative_ttl: int = 0,
+        fast_response: bool = False,
+        relation_loading: Dict[str, RelationLoad] = None,
+        query_timeout: int = None,
+        search_index: SearchIndex = None,
     ):
+        """
+        :param entity_cache_ttl: 主键缓存的过期时间（秒），大于0时 /get 接口启用主键缓存
+        :param entity_negative_ttl: 不存在的主键的缓存时间（秒），0表示不缓存
+        :param fast_response: 查询接口用 orjson 直接输出响应，跳过按 response_model 的逐条校验，OpenAPI 文档不变
+        :param relation_loading: 关系字段的加载策略和关联模型返回的字段，如 {"team": RelationLoad(strategy="joined", fields=["name"])}
+        :param query_timeout: /list、/query 的查询时限（秒），默认 config.db.query_timeout，0表示不限，请求头 X-Query-Timeout 可覆盖
+        :param search_index: 模型的ES检索索引，/query 的模糊匹配条件先在ES中检索主键，如 SearchIndex("hero", ["name", "intro"])
+        """
         self.model = model
         self.schema_query = schema_query
         self.schema_create = schema_create
         self.schema_update = schema_update
         self.schema_response = schema_response
         self.service: BaseService = service_class(self.model)
-
-    def get_router(self, routes: Set[Route] = None, update_doc: Dict[str, str] = None):
+        check_filter_params(self.model, self.schema_query)
+        if relation_loading:
+            self.service.crud.set_relation_loading(relation_loading)
+        if entity_cache_ttl > 0:
+            self.service.enable_entity_cache(
+                EntityCache(self.model.__tablename__, ttl=entity_cache_ttl, negative_ttl=entity_negative_ttl)
+            )
+        self.renderer = FastJSONRenderer(self.model, self.schema_response) if fast_response else None
+        self.query_timeout = config.db.query_timeout if query_timeout is None else query_timeout
+        if search_index is not None:
+            self.service.enable_search_index(search_index)
+
+    def get_router(self, routes: Set[Route] = None, update_doc: Dict[str, str] = None, result_cache_ttl: int = 0):
+        """
+        :param result_cache_ttl: /list、/query 查询结果缓存的最长时间（秒），大于0时启用，写操作提交后立即失效
+        """
         if routes is None:
             routes = set(Route)
+        if result_cache_ttl > 0:
+            self.service.enable_result_cache(ResultCache(self.model.__tablename__, ttl=result_cache_ttl))
 
         router = APIRouter()
         if Route.LIST in routes:
             self._add_list_routes(router)
+        if Route.GET in routes:
+            self._add_get_route(router)
         if Route.CREATE in routes:
             self._add_create_route(router)
         if Route.UPDATE in routes:
             self._add_update_route(router)
+        if Route.EXPORT in routes:
+            self._add_export_route(router)
+        if Route.BULK_CREATE in routes:
+            self._add_bulk_create_route(router)
+        if Route.UPDATE_MANY in routes:
+            self._add_update_many_route(router)
+        if Route.BATCH_GET in routes:
+            self._add_batch_get_route(router)
 
         self.update_route_doc(router, update_doc)
         return router
@@ -63,13 +119,61 @@ class RouterBase:
 
     def _add_list_routes(self, router: APIRouter):
         schema_query = self.schema_query
+        response_model = APIResponse[Paged[self.schema_response]]
         route_kwargs = {
-            "response_model": APIResponse[Paged[self.schema_response]],
+            "response_model": response_model,
             "response_model_exclude_unset": True,
         }
 
+        def render(data: Dict[str, Any]) -> str | bytes:
+            if self.renderer is None:
+                response = response_model.model_validate({"code": 200, "message": "", "data": data})
+                return response.model_dump_json(exclude_unset=True)
+            if self.renderer.need_filter:
+                data["items"] = [self.renderer.filter(item) for item in data["items"]]
+            return self.renderer.render(data)
+
+        async def make_response(
+            kind: str,
+            query: CommonQuery,
+            request: Request,
+            session: AsyncSession,
+            fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        ):
+            """启用结果缓存时，以规范化的查询参数为键缓存序列化后的响应，命中时跳过查询和序列化"""
+            timeout = get_request_timeout(request, self.query_timeout)
+
+            async def load() -> Dict[str, Any]:
+                try:
+                    return await run_with_deadline(request, session, timeout, fetch)
+                finally:
+                    await session.close()  # 读会话无需提交，结果取完即归还连接，不占用到响应序列化完成
+
+            result_cache = self.service.result_cache
+            if result_cache is None:
+                if self.renderer is None:
+                    return APIResponse(code=200, message="", data=await load())
+                return Response(render(await load()), media_type="application/json")
+            digest = make_digest(
+                [
+                    kind,
+                    query.model_dump(mode="json", exclude={"condition"}),
+                    normalize_condition(getattr(query, "condition", None)),
+                ]
+            )
+            key, body = await result_cache.get(digest)
+            if body is None:
+                body = render(await load())
+                if key is not None:
+                    await result_cache.set(key, body)
+            return Response(body, media_type="application/json")
+
         @router.get("/list", **route_kwargs, summary=f"{self.model.__name__} 列表查询")
-        async def read_items(query: Annotated[schema_query, Query()], session: AsyncSession = Depends(get_session)):
+        async def read_items(
+            request: Request,
+            query: Annotated[schema_query, Query()],
+            session: AsyncSession = Depends(get_read_session),
+        ):
             """列表查询
 
             **查询参数**:
@@ -80,6 +184,14 @@ class RouterBase:
             - `sort_order`: 排序顺序，"asc"表示升序，"desc"表示降序，默认升序
             - `fields`: 查询和返回的字段，英文逗号分隔的字段名列表，如fields=ref_id,order
             - `count`: 是否查询返回总记录数，true/false，默认false
+            - `count_strategy`: 计数策略，`exact`精确计数(默认)，`cached`缓存计数结果，`estimated`按统计信息估算，
+              `bounded`最多计数到`count_limit`并返回`has_more`，实际生效的策略见返回的`count_strategy`
+            - `cursor`: 游标分页，首页传空值`cursor=`，之后传上一页返回的`next_cursor`，启用后忽略`page`，深分页性能与首页一致，
+              排序字段不能为可空字段，`next_cursor`为空表示没有下一页
+
+            **请求头**:
+
+            - `X-Query-Timeout`: 查询时限（秒），超时返回504并终止数据库查询，不传时使用接口的默认时限
 
             **字段筛选参数**:
 
@@ -99,18 +211,22 @@ class RouterBase:
             - 查询创建时间在2024-09-03的数据:
               `/list?create_time__ge=2024-09-03 00:00:00&create_time__le=2024-09-03 23:59:59`
             - 查询`source_type`字段为3或4的数据：
-              `list/?source_type__in=3,4`"""
-            data = await self.service.list(session, query)
-            return APIResponse(code=200, message="", data=data)
+              `list/?source_type__in=3,4`
+            - 按`update_time`游标分页遍历，首页`cursor`传空，下一页传返回的`next_cursor`:
+              `/list?sort_by=update_time&page_size=1000&cursor=`"""
+            return await make_response("list", query, request, session, lambda: self.service.list(session, query))
 
         @router.post("/list", **route_kwargs, summary=f"{self.model.__name__} 列表查询")
-        async def post_read_items(query: schema_query, session: AsyncSession = Depends(get_session)):
+        async def post_read_items(
+            request: Request, query: schema_query, session: AsyncSession = Depends(get_read_session)
+        ):
             """POST类型的列表查询，参数与GET xx/list一致。用请求体参数代替查询参数，解决参数长度限制问题。"""
-            data = await self.service.list(session, query)
-            return APIResponse(code=200, message="", data=data)
+            return await make_response("list", query, request, session, lambda: self.service.list(session, query))
 
         @router.post("/query", **route_kwargs, summary=f"{self.model.__name__} 复杂条件查询")
-        async def complex_query(query: ComplexQuery, session: AsyncSession = Depends(get_session)):
+        async def complex_query(
+            request: Request, query: ComplexQuery, session: AsyncSession = Depends(get_read_session)
+        ):
             """复杂条件查询接口
 
             在 `condition` 字段以 JSON 组合条件，基本条件格式为：
@@ -138,12 +254,15 @@ class RouterBase:
             - `le`: 小于等于
             - `ge`: 大于等于
             - `json_contains`: json数组字段的包含查询
-            - `like`: 字符串模糊匹配
+            - `like`: 字符串模糊匹配，接口配置了ES检索索引时，与其他条件 AND 组合的模糊匹配先在ES中检索候选记录，
+              结果不包含ES尚未同步或分词后匹配不到的记录
 
             `value` 多值的以 json 数组表示，如：
 
             `{"field": "sex", "operator": "in", "value": [0, 1]}`
 
+            `cursor` 用法与 `/list` 一致：首页传 `""`，之后传上一页返回的 `next_cursor`，按排序字段+主键定位，忽略 `page`。
+
             示例：
 
             ```json
@@ -175,8 +294,41 @@ class RouterBase:
               }
             }
             ```"""
-            data = await self.service.complex_query(session, query)
-            return APIResponse(code=200, message="", data=data)
+            return await make_response(
+                "query", query, request, session, lambda: self.service.complex_query(session, query)
+            )
+
+    def _add_get_route(self, router: APIRouter):
+        @router.get(
+            "/get/{pk:path}",
+            response_model=APIResponse[self.schema_response],
+            summary=f"{self.model.__name__} 按主键查询",
+            description="按主键查询接口\n\n路径参数`pk`表示主键`{pk}`，联合主键多个值以`,`分隔".format(
+                pk=",".join(get_primary_keys(self.model))
+            ),
+        )
+        async def get_item(pk: str, session: AsyncSession = Depends(get_session)):
+            data = await self.service.get(session, pk, self.schema_response)
+            if self.renderer is not None:
+                return Response(self.renderer.render(data), media_type="application/json")
+            return APIResponse(data=data)
+
+    def _add_batch_get_route(self, router: APIRouter):
+        @router.post(
+            "/batch_get",
+            response_model=APIResponse[BatchGetResult],
+            summary=f"{self.model.__name__} 按主键批量查询",
+            description=(
+                "按主键批量查询接口\n\n`pks`为主键`{pk}`的列表，联合主键多个值以`,`分隔，"
+                "`fields`为返回的字段\n\n返回的`items`与`pks`一一对应，不存在的记录为`null`并列入`missing`"
+            ).format(pk=",".join(get_primary_keys(self.model))),
+        )
+        async def batch_get_items(body: BatchGet, session: AsyncSession = Depends(get_session)):
+            data = await self.service.get_many(session, body.pks, fields=body.fields)
+            if self.renderer is not None:
+                data["items"] = [self.renderer.filter(item) for item in data["items"]]
+                return Response(self.renderer.render(data), media_type="application/json")
+            return APIResponse(data=data)
 
     def _add_create_route(self, router: APIRouter):
         schema_create = self.schema_create
@@ -186,17 +338,91 @@ class RouterBase:
             db_item = await self.service.create(session, item)
             return APIResponse(data=db_item)
 
+    def _add_bulk_create_route(self, router: APIRouter):
+        schema_bulk_create = BulkCreate[self.schema_create]
+
+        @router.post(
+            "/bulk_create",
+            response_model=APIResponse[BulkCreateResult],
+            response_model_exclude_unset=True,
+            summary=f"{self.model.__name__} 批量创建",
+        )
+        async def bulk_create_items(body: schema_bulk_create, session: AsyncSession = Depends(get_session)):
+            """批量创建接口
+
+            `items` 中的记录以多行 INSERT 分块写入，同一请求在一个事务内提交。
+
+            - `upsert`: 主键或唯一键冲突时更新已有记录，而不是报错
+            - `fields`: 返回创建结果的字段，以一次批量查询取回（包括数据库生成的默认值），为空时只返回主键
+
+            返回的 `keys` 与 `items` 按请求顺序排列，`upsert` 模式下未提供主键的记录无法确定主键，返回 `null`。"""
+            data = await self.service.bulk_create(session, body.items, upsert=body.upsert, fields=body.fields)
+            return APIResponse(code=200, message="", data=data)
+
     def _add_update_route(self, router: APIRouter):
         schema_update = self.schema_update
+        pk_names = ",".join(get_primary_keys(self.model))
 
         @router.post(
             "/update/{pk:path}",
             response_model=APIResponse[self.schema_response],
+            response_model_exclude_unset=True,
             summary=f"{self.model.__name__} 更新",
-            description="更新接口\n\n路径参数`pk`表示主键`{pk}`，即更新`{pk}`=pk的记录，联合主键多个值以`,`分隔".format(
-                pk=",".join(get_primary_keys(self.model))
+            description=(
+                f"更新接口\n\n路径参数`pk`表示主键`{pk_names}`，即更新`{pk_names}`=pk的记录，联合主键多个值以`,`分隔"
+                "\n\n默认只返回主键和本次更新的字段，需要其他字段（如`update_time`）时以查询参数`fields`指定，"
+                "如`fields=id,update_time`\n\n表声明了版本列时，请求体带上读取时的版本号，版本不一致返回409"
             ),
         )
-        async def update_item(pk: str, item: schema_update, session: AsyncSession = Depends(get_session)):
-            db_item = await self.service.update(session, pk, item)
-            return APIResponse(data=db_item)
+        async def update_item(
+            pk: str,
+            item: schema_update,
+            fields: Annotated[str, Query(description="更新后返回的字段，英文逗号分隔")] = "",
+            session: AsyncSession = Depends(get_session),
+        ):
+            db_item = await self.service.update(session, pk, item, fields=split_comma_separated(fields))
+            return APIResponse(code=200, message="", data=db_item)
+
+    def _add_update_many_route(self, router: APIRouter):
+        schema_update_many = UpdateMany[self.schema_update]
+
+        @router.post(
+            "/update_many",
+            response_model=APIResponse[UpdateManyResult],
+            summary=f"{self.model.__name__} 按条件批量更新",
+        )
+        async def update_many_items(body: schema_update_many, session: AsyncSession = Depends(get_session)):
+            """按条件批量更新接口
+
+            以一条 `UPDATE ... WHERE` 语句更新所有匹配 `condition` 的记录，返回匹配的记录数。
+
+            - `condition`: 格式同复杂条件查询 `/query`，不允许为空条件（防止误更新全表）
+            - `values`: 更新的字段值，只更新请求中出现的字段
+            - `dry_run`: 为 `true` 时只返回匹配的记录数，不执行更新，可用于更新前确认影响范围"""
+            data = await self.service.update_many(session, body.condition, body.values, dry_run=body.dry_run)
+            return APIResponse(data=data)
+
+    def _add_export_route(self, router: APIRouter):
+        table_name = self.model.__tablename__
+
+        @router.post("/export", response_class=StreamingResponse, summary=f"{self.model.__name__} 流式导出")
+        async def export_items(query: ExportQuery):
+            """流式导出接口
+
+            `condition`、`fields`、`sort_by`、`sort_order` 与复杂条件查询一致，不分页，边查询边输出。
+
+            - `format=ndjson`: 每行一个JSON对象，`Content-Type: application/x-ndjson`
+            - `format=csv`: 首行为字段名，json字段以字符串输出
+
+            大表导出请使用该接口代替大 `page_size` 的 `/list` 翻页，服务端内存占用与导出行数无关。
+
+            - `source=es`: 从ES检索索引导出（需接口配置了检索索引），以 point in time + search_after 遍历，
+              结果为导出开始时的快照；ES由增量同步更新，可能落后数据库，不包含已软删除的记录"""
+            if query.source is ExportSource.ES and self.service.search_index is None:
+                raise ParamValidationError("该接口未配置ES检索索引，不支持 source=es")
+            if query.format is ExportFormat.CSV:
+                media_type = "text/csv; charset=utf-8"
+            else:
+                media_type = "application/x-ndjson"
+            headers = {"Content-Disposition": f"attachment; filename={table_name}.{query.format.value}"}
+            return StreamingResponse(self.service.export(query), media_type=media_type, headers=headers)
@@ -1,7 +1,7 @@
 import os
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Literal, Any, Dict
+from typing import Optional, Literal, Any, Dict, List
 
 from pydantic import BaseModel, field_validator, model_validator, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict, PydanticBaseSettingsSource, YamlConfigSettingsSource
@@ -60,19 +60,53 @@ class LogConfig(BaseModel):
         return v
 
 
+class MySQLReplicaConfig(BaseModel):
+    host: str
+    port: int = 3306
+    user: Optional[str] = None
+    password: Optional[str] = None
+    database: Optional[str] = None
+
+
 class MySQLConfig(BaseModel):
     host: str
     port: int = 3306
     user: str
     password: str
     database: str
+    replicas: List[MySQLReplicaConfig] = []
 
 
 class DBConfig(BaseModel):
     echo: bool = False
     pool_size: int = 64
     max_overflow: int = 128
+    read_pool_size: int = 8
+    read_max_overflow: int = 16
     slow_query_threshold: float = 2.0
+    count_cache_ttl: int = 60
+    count_bounded_limit: int = 10000
+    parallel_count: bool = True
+    parallel_pool_usage: float = 0.8
+    statement_cache_size: int = 1024
+    bulk_chunk_size: int = 1000
+    bulk_max_items: int = 10000
+    batch_get_concurrency: int = 4
+    read_your_writes_ttl: int = 5
+    replica_max_lag: float = 5.0
+    replica_check_interval: int = 10
+    query_timeout: int = 30
+    max_query_timeout: int = 300
+    disconnect_check_interval: float = 0.5
+    admission_mode: Literal["off", "reject", "slow_lane"] = "off"
+    admission_min_rows: int = 1000000
+    admission_explain: bool = False
+    slow_lane_concurrency: int = 2
+    table_rows_cache_ttl: int = 600
+
+
+class CacheConfig(BaseModel):
+    entity_local_ttl: int = 5
 
 
 class NacosConfig(BaseModel):
@@ -111,11 +145,33 @@ class RedisConfig(BaseModel):
     db: int = 1
 
 
-class ESConfig(BaseModel):
+class ESClusterConfig(BaseModel):
     host: str
     user: str
     password: str
     timeout: int = 60
+    connections_per_node: int = 10
+    max_retries: int = 3
+    retry_on_timeout: bool = False
+    sniff_on_start: bool = False
+    sniff_on_node_failure: bool = False
+    sniff_interval: Optional[float] = None
+    sniff_timeout: float = 1.0
+
+
+class ESConfig(ESClusterConfig):
+    clusters: Dict[str, ESClusterConfig] = {}
+    prefilter_max_hits: int = 10000
+    msearch_chunk_size: int = 100
+    msearch_concurrency: int = 4
+    msearch_max_retries: int = 2
+    scan_batch_size: int = 1000
+    pit_keep_alive: str = "1m"
+    sync_interval: int = 60
+    sync_batch_size: int = 5000
+    sync_chunk_size: int = 500
+    sync_concurrency: int = 4
+    sync_safety_lag: int = 10
 
 
 class MongoDBConfig(BaseModel):
@@ -159,6 +215,7 @@ class AppConfig(BaseSettings):
     log: LogConfig
     mysql: MySQLConfig
     db: DBConfig
+    cache: CacheConfig = CacheConfig()
     nacos: NacosConfig
     gateway: GatewayConfig
     redis: RedisConfig
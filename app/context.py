@@ -3,6 +3,7 @@ import contextvars
 request_id_context = contextvars.ContextVar("request_id", default=None)
 user_id_context = contextvars.ContextVar("user_id", default="")
 appid_context = contextvars.ContextVar("appid", default="")
+query_timeout_context = contextvars.ContextVar("query_timeout", default=None)
 
 
 def get_user_id() -> str:
@@ -11,3 +12,8 @@ def get_user_id() -> str:
 
 def get_appid() -> str:
     return appid_context.get()
+
+
+def get_query_timeout() -> int | None:
+    """当前请求的查询时限（秒），None表示不限"""
+    return query_timeout_context.get()
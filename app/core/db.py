@@ -1,14 +1,21 @@
+import asyncio
 import logging
 import time
+from typing import Callable, Awaitable, List, Optional, Set
 from urllib import parse
 
-from sqlalchemy import create_engine, AsyncAdaptedQueuePool, event
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncConnection
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, AsyncAdaptedQueuePool, event, QueuePool, NullPool
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncConnection, AsyncEngine
+from sqlalchemy.orm import sessionmaker, ORMExecuteState
 from sqlmodel import Session, SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.config import config
+from app.context import get_appid, get_user_id
+from app.core.mysql_dialect import READ_ONLY_DRIVER
+from app.core.nacos.load_balancer import RoundRobinBalancer
+from app.utils.cache import redis_cache
 
 logger = logging.getLogger(__name__)
 
@@ -42,31 +49,20 @@ sync_session_factory = sessionmaker[Session](
     autoflush=False,
 )
 
-ASYNC_DATABASE_URL = "mysql+aiomysql://{}:{}@{}:{}/{}".format(
-    parse.quote(config.mysql.user),
-    parse.quote(config.mysql.password),
-    config.mysql.host,
-    config.mysql.port,
-    config.mysql.database,
-)
-# 异步数据库引擎
-engine = create_async_engine(
-    ASYNC_DATABASE_URL,
-    echo=config.db.echo,  # 是否输出 SQL
-    poolclass=AsyncAdaptedQueuePool,
-    pool_size=config.db.pool_size,  # 连接池大小
-    # https://docs.pingcap.com/zh/tidb/stable/dev-guide-timeouts-in-tidb#jdbc-%E6%9F%A5%E8%AF%A2%E8%B6%85%E6%97%B6
-    pool_recycle=60 * 60,
-    max_overflow=config.db.max_overflow,  # 连接池的溢出连接数
+
+def make_async_url(host: str, port: int, user: str, password: str, database: str, driver: str = "aiomysql") -> str:
+    return "mysql+{}://{}:{}@{}:{}/{}".format(driver, parse.quote(user), parse.quote(password), host, port, database)
+
+
+ASYNC_DATABASE_URL = make_async_url(
+    config.mysql.host, config.mysql.port, config.mysql.user, config.mysql.password, config.mysql.database
 )
 
 
-@event.listens_for(engine.sync_engine, "before_cursor_execute")
 def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
     conn.info["start_time"] = time.perf_counter()
 
 
-@event.listens_for(engine.sync_engine, "after_cursor_execute")
 def log_slow_queries(conn, cursor, statement, parameters, context, executemany):
     start_time = conn.info.pop("start_time", None)
     if start_time is None:
@@ -76,6 +72,54 @@ def log_slow_queries(conn, cursor, statement, parameters, context, executemany):
         logger.info(f"Slow query ({elapsed_time:.2f} seconds): {statement} | Parameters: {parameters}")
 
 
+def create_mysql_engine(url: str, pool_size: int = None, max_overflow: int = None, **kwargs) -> AsyncEngine:
+    """创建异步引擎，主库和每个从库各有独立的连接池，连接池大小默认为 config.db.pool_size、max_overflow"""
+    async_engine = create_async_engine(
+        url,
+        **kwargs,
+        echo=config.db.echo,  # 是否输出 SQL
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=config.db.pool_size if pool_size is None else pool_size,  # 连接池大小
+        # https://docs.pingcap.com/zh/tidb/stable/dev-guide-timeouts-in-tidb#jdbc-%E6%9F%A5%E8%AF%A2%E8%B6%85%E6%97%B6
+        pool_recycle=60 * 60,
+        max_overflow=config.db.max_overflow if max_overflow is None else max_overflow,  # 连接池的溢出连接数
+    )
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(async_engine.sync_engine, "after_cursor_execute", log_slow_queries)
+    return async_engine
+
+
+def create_read_engine(host: str, port: int, user: str, password: str, database: str, **kwargs) -> AsyncEngine:
+    """创建读引擎：连接建立时设为自动提交，每条查询单独提交，不发送 COMMIT/ROLLBACK"""
+    url = make_async_url(host, port, user, password, database, driver=READ_ONLY_DRIVER)
+    return create_mysql_engine(url, isolation_level="AUTOCOMMIT", **kwargs)
+
+
+# 异步数据库引擎（主库）
+engine = create_mysql_engine(ASYNC_DATABASE_URL)
+# 主库的读引擎，未配置从库或需要读主库时使用；独立连接池与主库连接池同时占用主库连接，默认较小
+read_engine = create_read_engine(
+    config.mysql.host,
+    config.mysql.port,
+    config.mysql.user,
+    config.mysql.password,
+    config.mysql.database,
+    pool_size=config.db.read_pool_size,
+    max_overflow=config.db.read_max_overflow,
+)
+# 只读从库引擎
+replica_engines: List[AsyncEngine] = [
+    create_read_engine(
+        replica.host,
+        replica.port,
+        replica.user or config.mysql.user,
+        replica.password if replica.password is not None else config.mysql.password,
+        replica.database or config.mysql.database,
+    )
+    for replica in config.mysql.replicas
+]
+
+
 async def create_tables():
     async with engine.begin() as conn:
         conn: AsyncConnection
@@ -93,3 +137,188 @@ session_factory = async_sessionmaker[AsyncSession](
     autocommit=False,
     autoflush=False,
 )
+
+
+@event.listens_for(Session, "after_flush")
+def mark_flush_writes(session: Session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def mark_statement_writes(orm_execute_state: ORMExecuteState):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+class ReplicaSet:
+    """只读从库集合，轮询选择（与服务发现实例的负载均衡方式相同），定期检查复制延迟，超过阈值的从库暂时摘除"""
+
+    def __init__(self, engines: List[AsyncEngine]):
+        self.engines = engines
+        self.healthy: List[AsyncEngine] = list(engines)
+        self.balancer = RoundRobinBalancer()
+        self._task: Optional[asyncio.Task] = None
+
+    async def select(self) -> Optional[AsyncEngine]:
+        if not self.healthy:
+            return None
+        return await self.balancer.select("mysql_replica", self.healthy)
+
+    async def check(self):
+        healthy = []
+        for replica in self.engines:
+            try:
+                lag = await get_replica_lag(replica)
+            except Exception as e:
+                logger.warning(f"检查从库 {replica.url.host}:{replica.url.port} 复制延迟失败: {e}")
+                continue
+            if lag is not None and lag <= config.db.replica_max_lag:
+                healthy.append(replica)
+            else:
+                state = "复制已中断" if lag is None else f"复制延迟 {lag} 秒"
+                logger.warning(f"从库 {replica.url.host}:{replica.url.port} {state}，暂时摘除")
+        if healthy != self.healthy:
+            self.healthy = healthy
+            await self.balancer.reset("mysql_replica")
+
+    async def _check_loop(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(config.db.replica_check_interval)
+
+    async def start(self):
+        if self.engines:
+            self._task = asyncio.create_task(self._check_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for replica in self.engines:
+            await replica.dispose()
+
+
+async def get_replica_lag(replica: AsyncEngine) -> Optional[float]:
+    """从库复制延迟（秒），复制中断时为None；非复制从库（如TiDB、云数据库只读地址）或无权限查询复制状态时视为无延迟"""
+    async with replica.connect() as conn:
+        try:
+            result = await conn.exec_driver_sql("SHOW REPLICA STATUS")
+        except DBAPIError:
+            await conn.rollback()
+            try:
+                result = await conn.exec_driver_sql("SHOW SLAVE STATUS")  # MySQL 8.0.22 以前
+            except DBAPIError as e:
+                # 不支持复制状态语句（如TiDB）或账号缺少 REPLICATION CLIENT 权限
+                logger.debug(f"查询从库 {replica.url.host} 复制状态失败，视为无延迟: {e}")
+                return 0
+        status = result.mappings().first()
+    if status is None:
+        return 0
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+replica_set = ReplicaSet(replica_engines)
+
+
+def _recent_write_key() -> Optional[str]:
+    appid, user_id = get_appid(), get_user_id()
+    if not appid and not user_id:
+        return None
+    return f"recent_write:{appid}:{user_id}"
+
+
+async def mark_recent_write():
+    """记录当前用户/应用刚写入，写后读窗口内的读请求走主库"""
+    if not replica_set.engines or not (key := _recent_write_key()):
+        return
+    try:
+        await redis_cache.set(key, 1, ttl=config.db.read_your_writes_ttl)
+    except Exception as e:
+        logger.warning(f"记录写后读窗口失败: {e}")
+
+
+async def in_read_your_writes_window() -> bool:
+    if not (key := _recent_write_key()):
+        return False
+    try:
+        return bool(await redis_cache.get(key))
+    except Exception as e:
+        logger.warning(f"读取写后读窗口失败，读请求走主库: {e}")
+        return True
+
+
+async def get_read_engine() -> AsyncEngine:
+    """读请求使用的引擎：未配置从库、处于写后读窗口内或从库均不可用时使用主库的读引擎"""
+    if not replica_set.engines or await in_read_your_writes_window():
+        return read_engine
+    return await replica_set.select() or read_engine
+
+
+async def create_read_session() -> AsyncSession:
+    """创建读会话，绑定从库（见 get_read_engine）
+
+    读引擎为自动提交模式，会话不需要提交；查询结果取完后即可调用 close 归还连接，不必等到响应序列化完成
+    """
+    return session_factory(bind=await get_read_engine())
+
+
+def pool_has_capacity(bind: AsyncEngine, required: int = 1) -> bool:
+    """连接池占用率低于阈值时才允许额外占用连接，容量包括溢出连接（max_overflow），非 QueuePool（如NullPool）一律返回False"""
+    pool = bind.pool
+    if not isinstance(pool, QueuePool):
+        return False
+    if pool._max_overflow < 0:  # 溢出连接不限数量
+        return True
+    return pool.checkedout() + required <= (pool.size() + pool._max_overflow) * config.db.parallel_pool_usage
+
+
+def fork_session(session: AsyncSession) -> AsyncSession:
+    """在同一引擎上创建独立会话，用于与原会话并发执行查询；共享原会话的连接ID记录，超时时一并终止"""
+    connection_ids = session.info.get("connection_ids")
+    return session_factory(
+        bind=session.bind, info=None if connection_ids is None else {"connection_ids": connection_ids}
+    )
+
+
+@event.listens_for(Session, "after_begin")
+def track_connection_id(session: Session, transaction, connection):
+    """记录会话使用的 MySQL 连接ID（仅限设置了 connection_ids 的会话），用于超时或客户端断开时 KILL QUERY"""
+    connection_ids = session.info.get("connection_ids")
+    if connection_ids is None:
+        return
+    thread_id = getattr(connection.connection.driver_connection, "thread_id", None)
+    if thread_id is not None:
+        connection_ids.add(thread_id())
+
+
+async def kill_queries(bind: AsyncEngine, connection_ids: Set[int]):
+    """终止连接上正在执行的查询，使用不经过连接池的新连接，连接池耗尽时也能执行"""
+    if not connection_ids or bind.dialect.name != "mysql":
+        return
+    killer = create_async_engine(bind.url, poolclass=NullPool)
+    try:
+        async with killer.connect() as conn:
+            for connection_id in connection_ids:
+                try:
+                    await conn.exec_driver_sql(f"KILL QUERY {int(connection_id)}")
+                except DBAPIError as e:
+                    logger.warning(f"终止查询失败（连接 {connection_id}）: {e}")
+    finally:
+        await killer.dispose()
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable]):
+    """登记会话提交后执行的回调，如缓存失效，由 get_session 在提交后调用"""
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+async def run_after_commit(session: AsyncSession):
+    for callback in session.info.pop("after_commit", []):
+        try:
+            await callback()
+        except Exception as e:
+            logger.warning(f"提交后回调执行失败: {e}")
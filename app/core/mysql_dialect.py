@@ -0,0 +1,23 @@
+from sqlalchemy.dialects import registry
+from sqlalchemy.dialects.mysql.aiomysql import MySQLDialect_aiomysql
+
+
+class ReadOnlyAioMySQLDialect(MySQLDialect_aiomysql):
+    """读引擎方言：连接为自动提交模式，服务端报告没有进行中的事务时不发送 COMMIT/ROLLBACK
+
+    会话关闭和连接归还连接池时都会调用 rollback，aiomysql 在自动提交模式下仍会发送 ROLLBACK，每次多一个往返
+    """
+
+    supports_statement_cache = True
+
+    def do_rollback(self, dbapi_connection):
+        if dbapi_connection.driver_connection.get_transaction_status():
+            super().do_rollback(dbapi_connection)
+
+    def do_commit(self, dbapi_connection):
+        if dbapi_connection.driver_connection.get_transaction_status():
+            super().do_commit(dbapi_connection)
+
+
+READ_ONLY_DRIVER = "aiomysql_readonly"
+registry.register(f"mysql.{READ_ONLY_DRIVER}", __name__, "ReadOnlyAioMySQLDialect")
@@ -1,22 +1,112 @@
-from typing import TypeVar, Generic, Type, Dict, Any, List
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import (
+    TypeVar,
+    Generic,
+    Type,
+    Dict,
+    Any,
+    List,
+    AsyncIterator,
+    Sequence,
+    Callable,
+    Awaitable,
+    Tuple,
+    Hashable,
+    Set,
+    AsyncContextManager,
+)
 
 from pydantic import BaseModel
-from sqlalchemy.orm import load_only, selectinload
-from sqlmodel import SQLModel, func, select
+from sqlalchemy import RowMapping, ColumnElement, literal_column, bindparam, Select, insert, tuple_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import load_only, selectinload, joinedload, subqueryload, InstrumentedAttribute
+from sqlmodel import SQLModel, func, select, inspect, and_
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.schemas.pagination import Paged
-from app.schemas.query import CommonQuery, LogicCondition, Condition, SortOrder, ComplexQuery
-from app.utils.condition_builder import ConditionBuilder
-from app.utils.query_util import build_conditions, format_fields, format_sort, extract_query_params
+from app.config import config
+from app.core.db import pool_has_capacity, fork_session
+from app.exceptions import ParamValidationError, ResourceNotFound, ResourceConflict, QueryNotIndexed
+from app.schemas.pagination import Paged, CountResult
+from app.schemas.query import (
+    CommonQuery,
+    LogicCondition,
+    Condition,
+    SortOrder,
+    ComplexQuery,
+    CountStrategy,
+    RelationLoad,
+    LoadStrategy,
+)
+from app.utils.cache import redis_cache, stats_cache
+from app.utils.condition_builder import ConditionBuilder, SARGABLE_OPERATORS
+from app.utils.model_util import get_primary_keys, get_version_column, get_indexes, get_unique_keys
+from app.utils.query_util import (
+    build_conditions,
+    format_fields,
+    format_sort,
+    extract_query_params,
+    format_keyset,
+    build_keyset_condition,
+    encode_cursor,
+    decode_cursor,
+    normalize_condition,
+    make_digest,
+    flatten_query_params,
+    build_conditions_from_shape,
+    make_params,
+)
+from app.utils.sql_util import explain, estimate_rows, get_table_rows, apply_query_timeout, is_full_scan
+from app.utils.statement_cache import statement_cache, StatementCache
 from app.utils.string_util import split_comma_separated
 
+logger = logging.getLogger(__name__)
+
 T = TypeVar("T", bound=SQLModel)
 
+# 查询形状能否使用索引的判断结果
+admission_cache = StatementCache(maxsize=config.db.statement_cache_size)
+# 慢查询通道，大表上无法使用索引的查询排队执行
+slow_lane = asyncio.Semaphore(config.db.slow_lane_concurrency)
+
 
 class CRUDBase(Generic[T]):
     def __init__(self, model: Type[T]):
         self.model = model
+        self.relation_loading: Dict[str, RelationLoad] = {}
+
+    def set_relation_loading(self, relation_loading: Dict[str, RelationLoad]):
+        """配置关系字段的加载策略和关联模型的返回字段"""
+        relationships = inspect(self.model).relationships
+        for name, load in relation_loading.items():
+            if name not in relationships:
+                raise ValueError(f"{self.model.__name__} 没有关系字段 {name}")
+            related_model = relationships[name].mapper.class_
+            related_keys = {attr.key for attr in inspect(related_model).column_attrs}
+            if invalid_fields := set(load.fields) - related_keys:
+                raise ValueError(f"{related_model.__name__} 没有字段 {','.join(sorted(invalid_fields))}")
+        self.relation_loading = dict(relation_loading)
+
+    def get_relation_load(self, relation: InstrumentedAttribute) -> RelationLoad:
+        return self.relation_loading.get(relation.key) or RelationLoad()
+
+    def get_relation_options(self, relation_columns: List[InstrumentedAttribute]) -> list:
+        """ORM模式下关系字段的加载选项"""
+        loaders = {
+            LoadStrategy.JOINED: joinedload,
+            LoadStrategy.SELECTIN: selectinload,
+            LoadStrategy.SUBQUERY: subqueryload,
+        }
+        options = []
+        for relation in relation_columns:
+            load = self.get_relation_load(relation)
+            option = loaders[load.strategy](relation)
+            if load.fields:
+                related_model = relation.property.mapper.class_
+                option = option.load_only(*(getattr(related_model, f) for f in load.fields), raiseload=True)
+            options.append(option)
+        return options
 
     async def create(self, session: AsyncSession, obj_new: BaseModel, extra_data: Dict[str, Any] = None) -> T:
         obj_db = self.model.model_validate(obj_new, update=extra_data)
@@ -25,6 +115,171 @@ class CRUDBase(Generic[T]):
         await session.refresh(obj_db)  # 从数据库刷新create_time和update_time
         return obj_db
 
+    async def bulk_create(
+        self,
+        session: AsyncSession,
+        objs_new: Sequence[BaseModel],
+        upsert: bool = False,
+        extra_data: Dict[str, Any] = None,
+        chunk_size: int = None,
+    ) -> Tuple[int, List[Tuple | None]]:
+        """批量创建，按列组合分组后分块执行多行INSERT，返回影响行数和按输入顺序排列的主键元组
+
+        未提供的自增主键由每块的 lastrowid 推算：MySQL/TiDB 单条多行INSERT分配的自增值连续
+        （要求 auto_increment_increment=1）。upsert 时无法区分插入与更新，未提供主键的行返回None
+        """
+        chunk_size = chunk_size or config.db.bulk_chunk_size
+        pk_names = get_primary_keys(self.model)
+        autoincrement_column = self.model.__table__.autoincrement_column
+        rows = [self.to_insert_row(obj_new, extra_data) for obj_new in objs_new]
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for index, row in enumerate(rows):
+            groups.setdefault(tuple(row), []).append(index)
+
+        rowcount = 0
+        keys: List[Tuple | None] = [None] * len(rows)
+        for column_names, indexes in groups.items():
+            has_pk = all(name in column_names for name in pk_names)
+            for start in range(0, len(indexes), chunk_size):
+                chunk = indexes[start : start + chunk_size]
+                statement = self._build_insert(column_names, [rows[i] for i in chunk], upsert)
+                result = await session.exec(statement)
+                rowcount += result.rowcount
+                if has_pk:
+                    for i in chunk:
+                        keys[i] = tuple(rows[i][name] for name in pk_names)
+                elif not upsert and autoincrement_column is not None and pk_names == [autoincrement_column.key]:
+                    for offset, i in enumerate(chunk):
+                        keys[i] = (result.lastrowid + offset,)
+        return rowcount, keys
+
+    async def get_upsert_conflicts(
+        self, session: AsyncSession, objs_new: Sequence[BaseModel], extra_data: Dict[str, Any] = None
+    ) -> List[Tuple]:
+        """upsert 前查询会被更新的已有记录的主键
+
+        ON DUPLICATE KEY UPDATE 在任一唯一键（包括非主键的唯一索引）冲突时更新已有记录，
+        按每个唯一键查询与待写入行取值相同的记录；含 NULL 的唯一键不会冲突，跳过
+        """
+        rows = [self.to_insert_row(obj_new, extra_data) for obj_new in objs_new]
+        chunk_size = config.db.bulk_chunk_size
+        idents = {}
+        for unique_key in get_unique_keys(self.model):
+            values = list(
+                dict.fromkeys(
+                    tuple(row[name] for name in unique_key)
+                    for row in rows
+                    if all(row.get(name) is not None for name in unique_key)
+                )
+            )
+            key_columns = [getattr(self.model, name) for name in unique_key]
+            for start in range(0, len(values), chunk_size):
+                chunk = values[start : start + chunk_size]
+                if len(key_columns) == 1:
+                    condition = key_columns[0].in_([value[0] for value in chunk])
+                else:
+                    condition = tuple_(*key_columns).in_(chunk)
+                idents.update(dict.fromkeys(await self._select_pks(session, [condition])))
+        return list(idents)
+
+    def to_insert_row(self, obj_new: BaseModel, extra_data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """转换为INSERT的行数据，值为None的服务端默认列和自增列不写入，交给数据库生成"""
+        obj_db = self.model.model_validate(obj_new, update=extra_data)
+        autoincrement_column = self.model.__table__.autoincrement_column
+        row = {}
+        for attr in inspect(self.model).column_attrs:
+            column = attr.columns[0]
+            value = getattr(obj_db, attr.key)
+            if value is None and (column.server_default is not None or column is autoincrement_column):
+                continue
+            row[column.key] = value
+        return row
+
+    def _build_insert(self, column_names: Tuple[str, ...], rows: List[Dict[str, Any]], upsert: bool):
+        table = self.model.__table__
+        if not upsert:
+            return insert(table).values(rows)
+        statement = mysql_insert(table).values(rows)
+        pk_names = get_primary_keys(self.model)
+        # 全部为主键列时没有可更新的列，用主键自身赋值使冲突行保持不变
+        update_names = [name for name in column_names if name not in pk_names] or list(column_names)
+        return statement.on_duplicate_key_update({name: statement.inserted[name] for name in update_names})
+
+    async def get_by_pks(
+        self,
+        session: AsyncSession,
+        idents: Sequence[Tuple],
+        fields: List[str] = None,
+        chunk_size: int = None,
+        populate_existing: bool = False,
+    ) -> List[T]:
+        """按主键元组批量查询，每块一条 IN 查询，结果不保证顺序
+
+        多块且连接池空闲时各块在独立会话上并发查询（并发数 config.db.batch_get_concurrency）；
+        populate_existing 为 True 时以查询结果覆盖会话中已加载的对象（如 UPDATE 语句之后重新读取）
+        """
+        chunk_size = chunk_size or config.db.bulk_chunk_size
+        chunks = [idents[start : start + chunk_size] for start in range(0, len(idents), chunk_size)]
+        concurrency = min(len(chunks), config.db.batch_get_concurrency)
+        if concurrency <= 1 or session.in_transaction() or not pool_has_capacity(session.bind, concurrency):
+            items = []
+            for chunk in chunks:
+                items.extend(await self._get_chunk(session, chunk, fields, populate_existing))
+            return items
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get_chunk(chunk: Sequence[Tuple]) -> List[T]:
+            async with semaphore, fork_session(session) as chunk_session:
+                return await self._get_chunk(chunk_session, chunk, fields, populate_existing)
+
+        results = await asyncio.gather(*(get_chunk(chunk) for chunk in chunks))
+        return [item for items in results for item in items]
+
+    async def _get_chunk(
+        self, session: AsyncSession, idents: Sequence[Tuple], fields: List[str] = None, populate_existing: bool = False
+    ) -> List[T]:
+        pk_columns = [getattr(self.model, name) for name in get_primary_keys(self.model)]
+        select_columns, relation_columns = format_fields(self.model, fields)
+        if select_columns:
+            # 调用方需要主键对应回请求顺序
+            select_keys = {c.key for c in select_columns}
+            select_columns.extend(c for c in pk_columns if c.key not in select_keys)
+        if len(idents) == 1:
+            # 单值 IN 在 TiDB 上可能不走点查，改为等值条件
+            condition = and_(*(column == value for column, value in zip(pk_columns, idents[0])))
+        elif len(pk_columns) == 1:
+            condition = pk_columns[0].in_([ident[0] for ident in idents])
+        else:
+            condition = tuple_(*pk_columns).in_(idents)
+        statement = select(self.model).where(condition)
+        if select_columns:
+            statement = statement.options(load_only(*select_columns, raiseload=True))
+        if relation_columns:
+            statement = statement.options(*self.get_relation_options(relation_columns))
+        if populate_existing:
+            statement = statement.execution_options(populate_existing=True)
+        result = await session.exec(statement)
+        return result.all()
+
+    async def get_by_pk(self, session: AsyncSession, ident: Tuple, relations: Sequence[str] = ()) -> T | None:
+        """按主键查询单条记录，relations 中的关系字段一并加载"""
+        options = self.get_relation_options([getattr(self.model, relation) for relation in relations])
+        return await session.get(self.model, ident, options=options)
+
+    async def get_pks(
+        self, session: AsyncSession, query_params: Dict[str, Any] = None, condition: LogicCondition | Condition = None
+    ) -> List[Tuple]:
+        """查询匹配条件的记录的主键元组"""
+        return await self._select_pks(session, self.build_where(query_params, condition))
+
+    async def _select_pks(self, session: AsyncSession, conditions: List[ColumnElement[bool]]) -> List[Tuple]:
+        pk_columns = [getattr(self.model, name) for name in get_primary_keys(self.model)]
+        result = await session.exec(select(*pk_columns).where(*conditions))
+        if len(pk_columns) == 1:
+            return [(value,) for value in result.all()]  # 单列查询返回标量
+        return [tuple(row) for row in result.all()]
+
     async def update(self, session: AsyncSession, obj_db: T, obj_new: Dict[str, Any] | BaseModel) -> T:
         if isinstance(obj_new, BaseModel):
             update_data = obj_new.model_dump(exclude_unset=True)
@@ -36,52 +291,390 @@ class CRUDBase(Generic[T]):
         await session.refresh(obj_db)  # 从数据库刷新update_time
         return obj_db
 
+    async def update_by_pk(self, session: AsyncSession, ident: Tuple, values: Dict[str, Any]) -> Dict[str, Any]:
+        """按主键直接执行 UPDATE，不预先读取记录，返回主键和更新后的字段值
+
+        模型声明了版本列时版本号自增，values 中带版本号时作为期望版本加入条件。
+        仅在影响行数为0时查询一次主键，区分记录不存在（ResourceNotFound）与版本冲突（ResourceConflict）
+        """
+        self.check_update_values(values)
+        pk_names = get_primary_keys(self.model)
+        pk_conditions = [getattr(self.model, name) == value for name, value in zip(pk_names, ident)]
+        conditions = list(pk_conditions)
+        values = dict(values)
+        version_name = get_version_column(self.model)
+        expected_version = None
+        if version_name:
+            version_column = getattr(self.model, version_name)
+            expected_version = values.pop(version_name, None)
+            if expected_version is not None:
+                conditions.append(version_column == expected_version)
+            values[version_name] = version_column + 1
+
+        if values:
+            statement = (
+                update(self.model).where(*conditions).values(values).execution_options(synchronize_session=False)
+            )
+            result = await session.exec(statement)
+            updated = result.rowcount > 0
+        else:
+            updated = False
+        if not updated:
+            pk_columns = [getattr(self.model, name) for name in pk_names]
+            if (await session.exec(select(*pk_columns).where(*pk_conditions))).first() is None:
+                raise ResourceNotFound("更新目标不存在")
+            if expected_version is not None:
+                raise ResourceConflict(f"记录已被修改，当前版本不是 {expected_version}，请重新读取后再更新")
+            # 驱动未启用 CLIENT.FOUND_ROWS 时，值未变化的行不计入影响行数
+
+        data = {**dict(zip(pk_names, ident)), **values}
+        if version_name:
+            if expected_version is None:
+                data.pop(version_name)  # 未读取当前版本，不返回
+            else:
+                data[version_name] = expected_version + 1
+        return data
+
+    def check_update_values(self, values: Dict[str, Any]):
+        column_keys = {attr.key for attr in inspect(self.model).column_attrs}
+        if invalid_keys := set(values) - column_keys:
+            raise ParamValidationError(f"更新的字段 `{','.join(sorted(invalid_keys))}` 不存在")
+
+    async def update_many(
+        self,
+        session: AsyncSession,
+        condition: LogicCondition | Condition,
+        values: Dict[str, Any],
+        dry_run: bool = False,
+    ) -> int:
+        """按条件批量更新，单条 UPDATE ... WHERE 语句，返回匹配的记录数；dry_run 时只计数"""
+        if not values:
+            raise ParamValidationError("批量更新的字段不能为空")
+        self.check_update_values(values)
+        conditions = self.build_where(condition=condition)
+        if not conditions:
+            raise ParamValidationError("批量更新的条件不能为空")
+        if dry_run:
+            return await self.count(session, condition=condition)
+        # 不同步会话中已加载的对象，避免为匹配内存对象而额外查询
+        statement = update(self.model).where(*conditions).values(values).execution_options(synchronize_session=False)
+        result = await session.exec(statement)
+        return result.rowcount  # MySQL方言默认启用 CLIENT.FOUND_ROWS，值未变化的行也计入
+
     async def list(
-        self, session: AsyncSession, query: CommonQuery, condition: LogicCondition | Condition = None
-    ) -> Paged[T]:
+        self,
+        session: AsyncSession,
+        query: CommonQuery,
+        condition: LogicCondition | Condition = None,
+        rows: bool = False,
+    ) -> Paged[T] | Paged[Dict[str, Any]]:
+        """列表查询，rows 为 True 时以 Core 行模式查询，items 为字典"""
         query_params = extract_query_params(query)
-        if query.count:
-            count = await self.count(session, query_params, condition=condition)
-        else:
-            count = -1
-        items = await self.get_list(
-            session,
-            query_params,
-            condition=condition,
-            fields=split_comma_separated(query.fields),
-            sort_by=query.sort_by,
-            sort_order=query.sort_order,
-            page=query.page,
-            page_size=query.page_size,
-        )
-        return Paged[T](count=count, items=items)
 
-    async def complex_query(self, session: AsyncSession, query: ComplexQuery) -> Paged[T]:
-        if query.count:
-            count = await self.count(session, condition=query.condition)
+        async def count(_session: AsyncSession) -> CountResult:
+            return await self.count_by_strategy(
+                _session, query_params, condition, strategy=query.count_strategy, limit=query.count_limit
+            )
+
+        async def get_list(_session: AsyncSession) -> List[T]:
+            return await self.get_list(
+                _session,
+                query_params,
+                condition=condition,
+                fields=split_comma_separated(query.fields),
+                sort_by=query.sort_by,
+                sort_order=query.sort_order,
+                page=query.page,
+                page_size=query.page_size,
+                cursor=query.cursor,
+                rows=rows,
+            )
+
+        async with await self.admit(session, query_params, condition):
+            count_result, items = await self.count_and_get_list(session, count if query.count else None, get_list)
+        return self.make_paged(items, query, count_result, rows=rows)
+
+    async def complex_query(
+        self, session: AsyncSession, query: ComplexQuery, rows: bool = False
+    ) -> Paged[T] | Paged[Dict[str, Any]]:
+        async def count(_session: AsyncSession) -> CountResult:
+            return await self.count_by_strategy(
+                _session, condition=query.condition, strategy=query.count_strategy, limit=query.count_limit
+            )
+
+        async def get_list(_session: AsyncSession) -> List[T]:
+            return await self.get_list(
+                _session,
+                condition=query.condition,
+                fields=query.fields,
+                sort_by=query.sort_by,
+                sort_order=query.sort_order,
+                page=query.page,
+                page_size=query.page_size,
+                cursor=query.cursor,
+                rows=rows,
+            )
+
+        async with await self.admit(session, condition=query.condition):
+            count_result, items = await self.count_and_get_list(session, count if query.count else None, get_list)
+        return self.make_paged(items, query, count_result, rows=rows)
+
+    async def admit(
+        self, session: AsyncSession, query_params: Dict[str, Any] = None, condition: LogicCondition | Condition = None
+    ) -> AsyncContextManager:
+        """查询准入：表行数达到 admission_min_rows 时检查过滤条件能否使用索引
+
+        不能使用索引时按 admission_mode 拒绝（QueryNotIndexed），或返回慢查询通道的信号量，由调用方在其中执行查询
+        """
+        mode = config.db.admission_mode
+        if mode == "off" or (not query_params and condition is None):
+            return nullcontext()
+        rows = await self.get_table_rows(session)
+        if rows is None or rows < config.db.admission_min_rows:
+            return nullcontext()
+        where_shape, params = self.flatten_where(query_params, condition)
+        if await self.is_indexed(session, where_shape, params):
+            return nullcontext()
+        if mode == "reject":
+            raise self.not_indexed_error(where_shape)
+        logger.warning(f"{self.not_indexed_error(where_shape).message}，进入慢查询通道")
+        return slow_lane
+
+    async def get_table_rows(self, session: AsyncSession) -> int | None:
+        """表行数统计值（仅 MySQL/TiDB），进程内缓存 table_rows_cache_ttl 秒"""
+        if session.bind.dialect.name != "mysql":
+            return None
+        key = f"table_rows:{self.model.__tablename__}"
+        rows = await stats_cache.get(key)
+        if rows is None:
+            try:
+                rows = await get_table_rows(session, self.model.__tablename__)
+            except Exception as e:
+                logger.warning(f"读取表行数统计失败: {e}")
+                return None
+            if rows is not None:
+                await stats_cache.set(key, rows, ttl=config.db.table_rows_cache_ttl)
+        return rows
+
+    async def is_indexed(self, session: AsyncSession, where_shape: Hashable, params: Dict[str, Any]) -> bool:
+        """过滤条件能否使用索引，按查询形状缓存；admission_explain 开启时以执行计划判断"""
+        key = ("indexed", where_shape, config.db.admission_explain)
+        indexed = admission_cache.get(key)
+        if indexed is not None:
+            return indexed
+        if config.db.admission_explain:
+            pk_columns = [getattr(self.model, pk) for pk in get_primary_keys(self.model)]
+            statement = select(*pk_columns).where(*self.build_where_from_shape(where_shape)).params(params)
+            indexed = not is_full_scan(await explain(session, statement))
         else:
-            count = -1
-        items = await self.get_list(
-            session,
-            condition=query.condition,
-            fields=query.fields,
-            sort_by=query.sort_by,
-            sort_order=query.sort_order,
-            page=query.page,
-            page_size=query.page_size,
+            _, q_shape, c_shape = where_shape
+            leading_fields = {columns[0] for columns in get_indexes(self.model).values()}
+            q_fields = {field for field, op in q_shape if op in SARGABLE_OPERATORS}
+            indexed = ConditionBuilder(self.model).index_usable(c_shape, leading_fields, q_fields)
+        admission_cache.set(key, indexed)
+        return indexed
+
+    def not_indexed_error(self, where_shape: Hashable) -> QueryNotIndexed:
+        """拒绝信息：无法使用索引的条件、可用的索引（按最左列），以及能使查询走索引的索引建议"""
+        _, q_shape, c_shape = where_shape
+        predicates = list(dict.fromkeys([*q_shape, *ConditionBuilder(self.model).iter_predicates(c_shape)]))
+        indexes = get_indexes(self.model)
+        leading_fields = {columns[0] for columns in indexes.values()}
+        unindexed = [
+            f"{field} {op}" for field, op in predicates if op not in SARGABLE_OPERATORS or field not in leading_fields
+        ]
+        # 建议的索引：等值条件的字段在前，范围条件的字段在后
+        equality = [field for field, op in predicates if op in ("eq", "in", "is_null")]
+        ranged = [field for field, op in predicates if op in SARGABLE_OPERATORS and field not in equality]
+        suggested = list(dict.fromkeys(equality + ranged))
+        available = [f"{columns[0]}({name})" for name, columns in indexes.items()]
+        message = f"{self.model.__tablename__} 数据量较大，查询条件无法使用索引: {', '.join(unindexed)}"
+        if suggested:
+            message += f"；建议索引 Index({', '.join(suggested)})"
+        message += f"；可用索引的最左列: {', '.join(available)}"
+        return QueryNotIndexed(
+            message,
+            data={
+                "unindexed": unindexed,
+                "suggested_index": suggested,
+                "indexes": {name: list(columns) for name, columns in indexes.items()},
+            },
         )
-        return Paged[T](count=count, items=items)
 
-    async def count(
-        self, session: AsyncSession, query_params: Dict[str, Any] = None, condition: LogicCondition | Condition = None
-    ) -> int:
+    @staticmethod
+    async def count_and_get_list(
+        session: AsyncSession,
+        count: Callable[[AsyncSession], Awaitable[CountResult]] | None,
+        get_list: Callable[[AsyncSession], Awaitable[List[T]]],
+    ) -> Tuple[CountResult | None, List[T]]:
+        """执行计数和分页查询
+
+        连接池空闲时计数在独立会话（另一连接）上与分页查询并发，耗时取两者较慢者；
+        连接池紧张或会话已开启事务（需读到本事务未提交的写入）时顺序执行。
+        """
+        if count is None:
+            return None, await get_list(session)
+        if config.db.parallel_count and not session.in_transaction() and pool_has_capacity(session.bind, 2):
+            async with fork_session(session) as count_session:
+                count_task = asyncio.create_task(count(count_session))
+                try:
+                    items = await get_list(session)
+                    count_result = await count_task
+                except BaseException:
+                    # 分页查询失败或被取消时先取消并等待计数查询结束，再关闭计数会话；
+                    # 中途取消的连接状态不确定，作废而不归还连接池
+                    if count_task.cancel():
+                        await asyncio.gather(count_task, return_exceptions=True)
+                        await count_session.invalidate()
+                    elif not count_task.cancelled():
+                        count_task.exception()  # 计数已失败时以先抛出的异常为准
+                    raise
+            return count_result, items
+        return await count(session), await get_list(session)
+
+    def make_paged(
+        self,
+        items: List[T] | List[Dict[str, Any]],
+        query: CommonQuery | ComplexQuery,
+        count_result: CountResult = None,
+        rows: bool = False,
+    ):
+        next_cursor = None
+        if query.cursor is not None:
+            next_cursor = self.get_next_cursor(items, query.sort_by, query.page_size)
+            items = items[: query.page_size]
+        paged_class = Paged[Dict[str, Any]] if rows else Paged[T]
+        paged = paged_class(count=-1 if count_result is None else count_result.count, items=items)
+        if count_result is not None:
+            paged.count_strategy = count_result.strategy
+            if count_result.has_more is not None:
+                paged.has_more = count_result.has_more
+        if query.cursor is not None:
+            paged.next_cursor = next_cursor
+        return paged
+
+    def get_next_cursor(self, items: List[T] | List[Dict[str, Any]], sort_by: str, page_size: int) -> str | None:
+        """根据本页最后一条记录生成下一页游标；items 为多查一条的结果，不超过一页说明已到末尾，不返回游标"""
+        if len(items) <= page_size:
+            return None
+        last_item = items[page_size - 1]
+        keyset_columns = format_keyset(self.model, sort_by)
+        if isinstance(last_item, dict):
+            return encode_cursor([last_item[column.key] for column in keyset_columns])
+        return encode_cursor([getattr(last_item, column.key) for column in keyset_columns])
+
+    def build_where(
+        self, query_params: Dict[str, Any] = None, condition: LogicCondition | Condition = None
+    ) -> List[ColumnElement[bool]]:
         conditions = build_conditions(self.model, query_params)
         _condition = ConditionBuilder(self.model).build_condition(condition)
         if _condition is not None:
             conditions.append(_condition)
-        result = await session.exec(select(func.count()).select_from(self.model).where(*conditions))
+        return conditions
+
+    def flatten_where(
+        self, query_params: Dict[str, Any] = None, condition: LogicCondition | Condition = None
+    ) -> Tuple[Hashable, Dict[str, Any]]:
+        """拆分过滤条件为形状和参数，形状作为语句缓存的键"""
+        q_shape, q_values = flatten_query_params(self.model, query_params)
+        c_shape, c_values = ConditionBuilder(self.model).flatten(condition)
+        params = {**make_params("q", q_values), **make_params("c", c_values)}
+        return (self.model, q_shape, c_shape), params
+
+    def build_where_from_shape(self, where_shape: Hashable) -> List[ColumnElement[bool]]:
+        _, q_shape, c_shape = where_shape
+        conditions = build_conditions_from_shape(self.model, q_shape, prefix="q")
+        _condition = ConditionBuilder(self.model, prefix="c").build_from_shape(c_shape)
+        if _condition is not None:
+            conditions.append(_condition)
+        return conditions
+
+    async def count(
+        self, session: AsyncSession, query_params: Dict[str, Any] = None, condition: LogicCondition | Condition = None
+    ) -> int:
+        where_shape, params = self.flatten_where(query_params, condition)
+
+        def build():
+            conditions = self.build_where_from_shape(where_shape)
+            return select(func.count()).select_from(self.model).where(*conditions)
+
+        statement = apply_query_timeout(statement_cache.get_or_build(("count", where_shape), build))
+        result = await session.exec(statement, params=params)
         return result.one()
 
+    async def count_by_strategy(
+        self,
+        session: AsyncSession,
+        query_params: Dict[str, Any] = None,
+        condition: LogicCondition | Condition = None,
+        strategy: CountStrategy = CountStrategy.EXACT,
+        limit: int = None,
+    ) -> CountResult:
+        """按计数策略计数，返回结果中的 strategy 为实际生效的策略（估算不可信时降级为精确计数）"""
+        match strategy:
+            case CountStrategy.CACHED:
+                return await self._count_cached(session, query_params, condition)
+            case CountStrategy.ESTIMATED:
+                return await self._count_estimated(session, query_params, condition)
+            case CountStrategy.BOUNDED:
+                return await self._count_bounded(session, query_params, condition, limit)
+        count = await self.count(session, query_params, condition=condition)
+        return CountResult(count=count, strategy=CountStrategy.EXACT)
+
+    async def _count_cached(
+        self, session: AsyncSession, query_params: Dict[str, Any], condition: LogicCondition | Condition
+    ) -> CountResult:
+        key = "count:{}:{}".format(
+            self.model.__tablename__, make_digest([query_params or {}, normalize_condition(condition)])
+        )
+        try:
+            count = await redis_cache.get(key)
+        except Exception as e:
+            logger.warning(f"读取计数缓存失败: {e}")
+            count = None
+        if count is None:
+            count = await self.count(session, query_params, condition=condition)
+            try:
+                await redis_cache.set(key, count, ttl=config.db.count_cache_ttl)
+            except Exception as e:
+                logger.warning(f"写入计数缓存失败: {e}")
+        return CountResult(count=count, strategy=CountStrategy.CACHED)
+
+    async def _count_estimated(
+        self, session: AsyncSession, query_params: Dict[str, Any], condition: LogicCondition | Condition
+    ) -> CountResult:
+        conditions = self.build_where(query_params, condition)
+        if conditions:
+            pk_columns = [getattr(self.model, pk) for pk in get_primary_keys(self.model)]
+            estimated = estimate_rows(await explain(session, select(*pk_columns).where(*conditions)))
+        else:
+            estimated = await get_table_rows(session, self.model.__tablename__)
+        if estimated is None:
+            count = await self.count(session, query_params, condition=condition)
+            return CountResult(count=count, strategy=CountStrategy.EXACT)
+        return CountResult(count=estimated, strategy=CountStrategy.ESTIMATED)
+
+    async def _count_bounded(
+        self,
+        session: AsyncSession,
+        query_params: Dict[str, Any],
+        condition: LogicCondition | Condition,
+        limit: int = None,
+    ) -> CountResult:
+        limit = limit or config.db.count_bounded_limit
+        where_shape, params = self.flatten_where(query_params, condition)
+
+        def build():
+            conditions = self.build_where_from_shape(where_shape)
+            # 多取一行用于判断是否超出上限
+            bounded = select(literal_column("1")).select_from(self.model).where(*conditions)
+            return select(func.count()).select_from(bounded.limit(bindparam("_limit")).subquery())
+
+        statement = apply_query_timeout(statement_cache.get_or_build(("count_bounded", where_shape), build))
+        result = await session.exec(statement, params={**params, "_limit": limit + 1})
+        count = result.one()
+        return CountResult(count=min(count, limit), strategy=CountStrategy.BOUNDED, has_more=count > limit)
+
     async def get_list(
         self,
         session: AsyncSession,
@@ -92,22 +685,206 @@ class CRUDBase(Generic[T]):
         sort_order: SortOrder = SortOrder.ASC,
         page: int = 1,
         page_size: int = 100 * 10000,
-    ) -> List[T]:
-        conditions = build_conditions(self.model, query_params)
-        _condition = ConditionBuilder(self.model).build_condition(condition)
-        if _condition is not None:
-            conditions.append(_condition)
-        select_columns, relation_columns = format_fields(self.model, fields)
-        sort_columns = format_sort(self.model, sort_by, sort_order)
-        statement = select(self.model).where(*conditions).offset((page - 1) * page_size).limit(page_size)
-        if select_columns:
-            statement = statement.options(load_only(*select_columns, raiseload=True))
+        cursor: str = None,
+        rows: bool = False,
+    ) -> List[T] | List[Dict[str, Any]]:
+        """查询列表
+
+        cursor 不为 None 时使用游标分页（首页传空字符串），按 排序字段+主键 seek 定位，忽略 page，最多返回 page_size + 1 条。
+        rows 为 True 时只查询所需的列，返回字典，不构造ORM对象；关系字段以单独的批量查询加载
+        """
+        where_shape, params = self.flatten_where(query_params, condition)
+        if cursor is None:
+            params["_offset"] = (page - 1) * page_size
+        elif cursor:
+            keyset_values = decode_cursor(cursor, format_keyset(self.model, sort_by))
+            params.update(make_params("k", keyset_values))
+        # 游标分页多查一条，由 make_paged 判断是否有下一页后截断，最后一页不再返回游标
+        params["_limit"] = page_size if cursor is None else page_size + 1
+        cursor_mode = None if cursor is None else bool(cursor)
+        relation_key = tuple(
+            sorted((name, load.strategy, tuple(load.fields)) for name, load in self.relation_loading.items())
+        )
+        key = ("list", where_shape, tuple(fields or ()), sort_by, sort_order, cursor_mode, rows, relation_key)
+        statement = statement_cache.get_or_build(
+            key, lambda: self._build_list_statement(where_shape, fields, sort_by, sort_order, cursor_mode, rows)
+        )
+        statement = apply_query_timeout(statement)
+        result = await session.exec(statement, params=params)
+        _, relation_columns = format_fields(self.model, fields)
+        if not rows:
+            if any(self.is_collection_joined(relation) for relation in relation_columns):
+                return result.unique().all()
+            return result.all()
+        items = [dict(row) for row in result.mappings()]
         if relation_columns:
-            statement = statement.options(selectinload(*relation_columns))
+            _, hidden_keys = self.get_row_columns(fields, sort_by, cursor_mode)
+            joined = [relation for relation in relation_columns if self.is_row_joined(relation)]
+            self.assemble_joined(items, joined)
+            await self.load_relations(session, items, [r for r in relation_columns if r not in joined])
+            for item in items:
+                for hidden_key in hidden_keys:
+                    del item[hidden_key]
+        return items
+
+    def _build_list_statement(
+        self,
+        where_shape: Hashable,
+        fields: List[str],
+        sort_by: str,
+        sort_order: SortOrder,
+        cursor_mode: bool | None,
+        rows: bool = False,
+    ) -> Select:
+        """构造列表查询语句，分页与游标的值均为命名参数；cursor_mode 为None表示偏移分页，False为游标分页首页"""
+        conditions = self.build_where_from_shape(where_shape)
+        select_columns, relation_columns = format_fields(self.model, fields)
+        if cursor_mode is None:
+            sort_columns = format_sort(self.model, sort_by, sort_order)
+        else:
+            keyset_columns = format_keyset(self.model, sort_by)
+            if cursor_mode:
+                conditions.append(build_keyset_condition(keyset_columns, None, sort_order, prefix="k"))
+            sort_columns = [c.desc() if sort_order is SortOrder.DESC else c for c in keyset_columns]
+            if select_columns:
+                # 生成下一页游标需要读取排序键
+                select_keys = {c.key for c in select_columns}
+                select_columns.extend(c for c in keyset_columns if c.key not in select_keys)
+        if rows:
+            row_columns, _ = self.get_row_columns(fields, sort_by, cursor_mode)
+            statement = select(*row_columns).where(*conditions)
+            for relation in relation_columns:
+                if self.is_row_joined(relation):
+                    statement = statement.outerjoin(relation)
+        else:
+            statement = select(self.model).where(*conditions)
+            if select_columns:
+                # 与行模式一致，批量加载的关系字段额外加载本表的关联列（subquery 策略必需），不输出
+                hidden_keys = self.get_hidden_keys(fields, sort_by, cursor_mode)
+                select_columns.extend(getattr(self.model, key) for key in sorted(hidden_keys))
+                statement = statement.options(load_only(*select_columns, raiseload=True))
+            if relation_columns:
+                statement = statement.options(*self.get_relation_options(relation_columns))
+        if cursor_mode is None:
+            statement = statement.offset(bindparam("_offset"))
+        statement = statement.limit(bindparam("_limit"))
         if sort_columns:
             statement = statement.order_by(*sort_columns)
-        result = await session.exec(statement)
-        return result.all()
+        return statement
+
+    def get_row_columns(
+        self, fields: List[str], sort_by: str = None, cursor_mode: bool | None = None
+    ) -> Tuple[list, Set[str]]:
+        """行模式查询的列和其中不输出的列
+
+        输出的列与ORM模式加载的列一致：指定的列（未指定时为全部列）、主键、游标分页的排序键；
+        连接查询的关系字段的列以 `关系名__字段名` 为标签查询，批量查询的关系字段所需的外键列额外查询，均不输出
+        """
+        select_columns, relation_columns = format_fields(self.model, fields)
+        columns = select_columns or self.get_column_attrs()
+        columns.extend(getattr(self.model, pk) for pk in get_primary_keys(self.model))
+        if cursor_mode is not None:
+            columns.extend(format_keyset(self.model, sort_by))
+        columns = list({column.key: column for column in columns}.values())
+        column_keys = {column.key for column in columns}
+        hidden_keys = set()
+        for relation in relation_columns:
+            if self.is_row_joined(relation):
+                related_columns, _ = self.get_related_columns(relation)
+                columns.extend(column.label(f"{relation.key}__{column.key}") for column in related_columns)
+                continue
+            for local_column, _ in relation.property.local_remote_pairs:
+                key = self.model.__mapper__.get_property_by_column(local_column).key
+                if key not in column_keys:
+                    columns.append(getattr(self.model, key))
+                    column_keys.add(key)
+                    hidden_keys.add(key)
+        return columns, hidden_keys
+
+    def get_hidden_keys(
+        self, fields: List[str] | str, sort_by: str = None, cursor_mode: bool | None = None
+    ) -> Set[str]:
+        """为加载关系字段而额外查询、不输出的本表关联列"""
+        _, hidden_keys = self.get_row_columns(fields, sort_by, cursor_mode)
+        return hidden_keys
+
+    def get_related_columns(self, relation: InstrumentedAttribute) -> Tuple[List[InstrumentedAttribute], Set[str]]:
+        """关联模型查询的列和其中不输出的列：配置的返回字段和主键，批量查询时另加关联键（不输出）"""
+        prop = relation.property
+        related_model = prop.mapper.class_
+        load = self.get_relation_load(relation)
+        if not load.fields:
+            return [getattr(related_model, attr.key) for attr in inspect(related_model).column_attrs], set()
+        columns = [getattr(related_model, field) for field in load.fields]
+        columns.extend(getattr(related_model, column.key) for column in prop.mapper.primary_key)
+        columns = list({column.key: column for column in columns}.values())
+        hidden_keys = set()
+        if not self.is_row_joined(relation):
+            ((_, remote_column),) = prop.local_remote_pairs
+            remote_key = prop.mapper.get_property_by_column(remote_column).key
+            if remote_key not in {column.key for column in columns}:
+                columns.append(getattr(related_model, remote_key))
+                hidden_keys.add(remote_key)
+        return columns, hidden_keys
+
+    def is_row_joined(self, relation: InstrumentedAttribute) -> bool:
+        """行模式下只有多对一关系使用连接查询，一对多连接会使分页行数不准，改为批量查询"""
+        return self.get_relation_load(relation).strategy is LoadStrategy.JOINED and not relation.property.uselist
+
+    def is_collection_joined(self, relation: InstrumentedAttribute) -> bool:
+        """ORM模式下一对多关系使用连接加载时，结果需按主实体去重"""
+        return self.get_relation_load(relation).strategy is LoadStrategy.JOINED and relation.property.uselist
+
+    def supports_rows(self, fields: List[str] | str = None) -> bool:
+        """行模式只支持单列关联、无中间表的关系字段"""
+        _, relation_columns = format_fields(self.model, fields)
+        return all(
+            relation.property.secondary is None and len(relation.property.local_remote_pairs) == 1
+            for relation in relation_columns
+        )
+
+    def assemble_joined(self, items: List[Dict[str, Any]], relation_columns: List[InstrumentedAttribute]):
+        """把连接查询得到的 `关系名__字段名` 列组装为关联记录，同一关联记录只构造一次"""
+        for relation in relation_columns:
+            related_columns, _ = self.get_related_columns(relation)
+            labels = [(f"{relation.key}__{column.key}", column.key) for column in related_columns]
+            pk_keys = [column.key for column in relation.property.mapper.primary_key]
+            related: Dict[Tuple, Dict[str, Any]] = {}
+            for item in items:
+                values = {key: item.pop(label) for label, key in labels}
+                ident = tuple(values[key] for key in pk_keys)
+                if all(value is None for value in ident):
+                    item[relation.key] = None  # 外连接未匹配
+                else:
+                    item[relation.key] = related.setdefault(ident, values)
+
+    async def load_relations(
+        self, session: AsyncSession, items: List[Dict[str, Any]], relation_columns: List[InstrumentedAttribute]
+    ):
+        """按关系批量查询关联记录并填入 items，每个关系每块一条 IN 查询，同一关联记录只构造一次
+
+        行模式下 subquery 策略同样以 IN 批量查询，不重复执行主查询
+        """
+        for relation in relation_columns:
+            prop = relation.property
+            ((local_column, remote_column),) = prop.local_remote_pairs
+            local_key = self.model.__mapper__.get_property_by_column(local_column).key
+            remote_attr = getattr(prop.mapper.class_, prop.mapper.get_property_by_column(remote_column).key)
+            related_columns, hidden_keys = self.get_related_columns(relation)
+            values = list({item[local_key] for item in items if item[local_key] is not None})
+            related: Dict[Any, List[Dict[str, Any]]] = {}
+            chunk_size = config.db.bulk_chunk_size
+            for start in range(0, len(values), chunk_size):
+                statement = select(*related_columns).where(remote_attr.in_(values[start : start + chunk_size]))
+                for row in (await session.exec(statement)).mappings():
+                    related_item = {key: value for key, value in row.items() if key not in hidden_keys}
+                    related.setdefault(row[remote_attr.key], []).append(related_item)
+            for item in items:
+                matched = related.get(item[local_key], [])
+                if prop.uselist:
+                    item[relation.key] = matched
+                else:
+                    item[relation.key] = matched[0] if matched else None
 
     async def get_first(
         self,
@@ -129,3 +906,38 @@ class CRUDBase(Generic[T]):
             page_size=1,
         )
         return items[0] if items else None
+
+    def get_column_attrs(self, fields: List[str] = None, strict: bool = False) -> List[InstrumentedAttribute]:
+        """指定字段中的普通列，未指定时返回全部列；strict 为 True 时字段不存在抛出 ParamValidationError"""
+        select_columns, _ = format_fields(self.model, fields, strict=strict)
+        if select_columns:
+            return select_columns
+        return [getattr(self.model, attr.key) for attr in inspect(self.model).column_attrs]
+
+    def stream_statement(
+        self,
+        columns: List[InstrumentedAttribute],
+        query_params: Dict[str, Any] = None,
+        condition: LogicCondition | Condition = None,
+        sort_by: str = None,
+        sort_order: SortOrder = SortOrder.ASC,
+        batch_size: int = 1000,
+    ) -> Select:
+        """流式读取的语句，条件或排序字段无效时抛出 ParamValidationError"""
+        conditions = self.build_where(query_params, condition)
+        statement = select(*columns).where(*conditions).execution_options(yield_per=batch_size)
+        if sort_columns := format_sort(self.model, sort_by, sort_order):
+            statement = statement.order_by(*sort_columns)
+        return statement
+
+    @staticmethod
+    async def stream(session: AsyncSession, statement: Select) -> AsyncIterator[Sequence[RowMapping]]:
+        """服务端游标流式读取 stream_statement 构造的语句，按批返回行映射，不构造ORM对象"""
+        result = await session.stream(statement)
+        try:
+            async for partition in result.mappings().partitions():
+                yield partition
+        except (asyncio.CancelledError, GeneratorExit):
+            # 消费方中断（如客户端断开）时直接废弃连接，避免关闭流式游标时读完剩余结果
+            await session.invalidate()
+            raise
@@ -43,7 +43,7 @@ class AppException(Exception):
         return " ".join(parts)
 
     def __repr__(self):
-        return f"{self.__class__.__name__}(" f"message={self.message!r}, " f"data={self.data!r})"
+        return f"{self.__class__.__name__}(message={self.message!r}, data={self.data!r})"
 
 
 class ClientException(AppException):
@@ -77,6 +77,11 @@ class ParamRequired(ParamException):
     MESSAGE = "关键参数缺失"
 
 
+class QueryNotIndexed(ParamException):
+    ERROR_CODE = "40013"
+    MESSAGE = "查询条件无法使用索引"
+
+
 class AuthException(ClientException):
     """认证异常基类"""
 
@@ -129,18 +134,37 @@ class ResourceNotFound(ClientException):
     STATUS_CODE = 404
 
 
+class ResourceConflict(ClientException):
+    ERROR_CODE = "40090"
+    MESSAGE = "资源已被修改"
+    STATUS_CODE = 409
+
+
 class MethodError(ClientException):
     ERROR_CODE = "40050"
     MESSAGE = "请求方法不支持"
     STATUS_CODE = 405
 
 
+class QueryCancelled(ClientException):
+    ERROR_CODE = "40060"
+    MESSAGE = "客户端已断开，查询已取消"
+    STATUS_CODE = 499
+
+
 # ------------------------- 服务端异常 (5xxxx) -------------------------
 class DatabaseError(ServerException):
     ERROR_CODE = "50010"
     MESSAGE = "数据库异常"
 
 
+class QueryTimeout(DatabaseError):
+    ERROR_CODE = "50011"
+    MESSAGE = "查询超时"
+    STATUS_CODE = 504
+    LOG_LEVEL = logging.WARNING
+
+
 class RemoteServiceException(ServerException):
     """远程服务异常基类"""
 
@@ -9,6 +9,7 @@ from starlette.requests import Request
 from starlette.responses import JSONResponse
 
 from app.api.deps.oauth2 import oauth2_scheme, get_signature
+from app.core.db import replica_set
 from app.core.log import LOGGING_CONFIG
 from app.core.middleware import register_middlewares
 from app.core.nacos.discovery import service_discovery
@@ -20,6 +21,9 @@ from app.schemas.token import Token
 from app.config import config, APP_ENV
 from app.config.dynamic_config import dynamic_config_manager
 from app.core.nacos.config import ConfigSyncer
+from app.utils.cache import get_hit_miss_ratio
+from app.utils.es_util import es_clients
+from app.utils.statement_cache import statement_cache
 from app.utils.sw import start_sw_agent
 
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -34,6 +38,8 @@ async def lifespan(_app: FastAPI):
 
         try:
             await service_discovery.init()
+            await replica_set.start()
+            await es_clients.start()
             start_sw_agent()
 
             # await dynamic_config_manager.register(
@@ -46,6 +52,8 @@ async def lifespan(_app: FastAPI):
         finally:
             # close_mongo()
             # await dynamic_config_manager.stop()
+            await es_clients.close()
+            await replica_set.stop()
             await service_discovery.shutdown()
 
 
@@ -104,6 +112,16 @@ if config.debug:
         """列出所有动态配置"""
         return dynamic_config_manager.current_values
 
+    @app.get("/cache-stats")
+    async def get_cache_stats():
+        """查询缓存命中统计"""
+        return {"statement_cache": statement_cache.stats(), "aiocache": get_hit_miss_ratio()}
+
+    @app.get("/es-stats")
+    async def get_es_stats():
+        """查询ES客户端连接池使用情况"""
+        return es_clients.stats()
+
 
 if config.enable_oauth2:
 
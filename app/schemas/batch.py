@@ -0,0 +1,45 @@
+from typing import TypeVar, Generic, List, Any, Dict, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from app.config import config
+from app.schemas.query import LogicCondition, Condition
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class BulkCreate(BaseModel, Generic[T]):
+    items: List[T] = Field(..., min_length=1, max_length=config.db.bulk_max_items, description="待创建的记录")
+    upsert: bool = Field(False, description="主键或唯一键冲突时更新已有记录（ON DUPLICATE KEY UPDATE）")
+    fields: List[str] = Field([], description="返回创建结果的字段，为空时只返回主键")
+
+
+class BulkCreateResult(BaseModel):
+    count: int = Field(description="影响行数，upsert 更新已有记录时每条计2行")
+    keys: List[Any] = Field(description="按请求顺序排列的主键，联合主键为数组，无法确定时为null")
+    items: Optional[List[Optional[Dict[str, Any]]]] = Field(
+        None, description="按请求顺序排列的创建结果，仅指定fields时返回"
+    )
+
+
+class UpdateMany(BaseModel, Generic[T]):
+    condition: LogicCondition | Condition = Field(..., description="更新条件，格式同复杂条件查询，不能为空")
+    values: T = Field(..., description="更新的字段值，仅更新请求中出现的字段")
+    dry_run: bool = Field(False, description="只返回匹配的记录数，不执行更新")
+
+
+class UpdateManyResult(BaseModel):
+    count: int = Field(description="匹配条件的记录数")
+    dry_run: bool
+
+
+class BatchGet(BaseModel):
+    pks: List[Union[int, str]] = Field(
+        ..., min_length=1, max_length=config.db.bulk_max_items, description="主键列表，联合主键多个值以`,`分隔"
+    )
+    fields: List[str] = Field([], description="返回的字段，为空时返回全部字段")
+
+
+class BatchGetResult(BaseModel):
+    items: List[Optional[Dict[str, Any]]] = Field(description="按请求顺序排列的记录，不存在的为null")
+    missing: List[Union[int, str]] = Field(description="不存在的主键")
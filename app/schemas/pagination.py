@@ -1,6 +1,8 @@
-from typing import TypeVar, Generic, List
+from typing import TypeVar, Generic, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from app.schemas.query import CountStrategy
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -8,3 +10,12 @@ T = TypeVar("T", bound=BaseModel)
 class Paged(BaseModel, Generic[T]):
     count: int
     items: List[T]
+    next_cursor: Optional[str] = Field(None, description="下一页游标，仅游标分页时返回，为空表示没有更多数据")
+    count_strategy: Optional[CountStrategy] = Field(None, description="产生 count 的计数策略，仅查询总数时返回")
+    has_more: Optional[bool] = Field(None, description="bounded 计数策略下，实际记录数是否超过 count")
+
+
+class CountResult(BaseModel):
+    count: int
+    strategy: CountStrategy
+    has_more: Optional[bool] = None
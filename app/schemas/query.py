@@ -22,9 +22,44 @@ class Operator(str, Enum):
     LIKE = "like"
 
 
+class CountStrategy(str, Enum):
+    EXACT = "exact"
+    CACHED = "cached"
+    ESTIMATED = "estimated"
+    BOUNDED = "bounded"
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class ExportSource(str, Enum):
+    DB = "db"
+    ES = "es"
+
+
+class LoadStrategy(str, Enum):
+    JOINED = "joined"
+    SELECTIN = "selectin"
+    SUBQUERY = "subquery"
+
+
+class RelationLoad(BaseModel):
+    """关系字段的加载方式"""
+
+    strategy: LoadStrategy = Field(
+        LoadStrategy.SELECTIN, description="加载策略：joined 连接查询；selectin/subquery 单独批量查询"
+    )
+    fields: List[str] = Field([], description="关联模型返回的字段，为空时返回全部字段，主键总是返回")
+
+
 class Pagination(BaseModel):
     page: conint(ge=1, le=1000) = Field(1, description="页码，范围为 1-1000")
     page_size: conint(ge=0, le=10 * 10000) = Field(10, description="每页返回的记录数，范围为 0-100000")
+    cursor: Optional[str] = Field(
+        None, description="游标分页，首页传空字符串，后续传上一页返回的 next_cursor；启用后忽略 page", examples=[None]
+    )
 
 
 class Sort(BaseModel):
@@ -35,6 +70,12 @@ class Sort(BaseModel):
 class CommonQuery(Pagination, Sort, extra="forbid"):
     fields: str = Field(..., description="指定需要返回的字段，多个字段以英文逗号分隔")
     count: Optional[bool] = Field(False, description="是否返回总记录数")
+    count_strategy: CountStrategy = Field(
+        CountStrategy.EXACT,
+        description="计数策略：exact 精确计数；cached 缓存计数结果；estimated 按表统计或执行计划估算；"
+        "bounded 最多计数到 count_limit 并返回 has_more",
+    )
+    count_limit: Optional[conint(ge=1)] = Field(None, description="bounded 策略的计数上限，默认取服务配置")
 
 
 class Condition(BaseModel):
@@ -51,9 +92,24 @@ class LogicCondition(BaseModel):
 class ComplexQuery(Pagination, Sort, extra="forbid"):
     fields: List[str] = Field(..., description="指定需要返回的字段列表")
     count: Optional[bool] = Field(False, description="是否返回总记录数")
+    count_strategy: CountStrategy = Field(
+        CountStrategy.EXACT,
+        description="计数策略：exact 精确计数；cached 缓存计数结果；estimated 按表统计或执行计划估算；"
+        "bounded 最多计数到 count_limit 并返回 has_more",
+    )
+    count_limit: Optional[conint(ge=1)] = Field(None, description="bounded 策略的计数上限，默认取服务配置")
     condition: LogicCondition | Condition | None = Field(None, description="查询条件，可以是简单条件或复杂逻辑组合")
 
 
+class ExportQuery(Sort, extra="forbid"):
+    fields: List[str] = Field([], description="指定需要导出的字段列表，为空时导出全部字段，不支持关系字段")
+    condition: LogicCondition | Condition | None = Field(None, description="查询条件，格式同复杂条件查询")
+    format: ExportFormat = Field(ExportFormat.NDJSON, description="导出格式，可选值：ndjson、csv")
+    source: ExportSource = Field(
+        ExportSource.DB, description="数据来源，可选值：db（数据库）、es（ES检索索引，需接口配置了检索索引）"
+    )
+
+
 TEMP_QUERY_FIELDS = set()
 
 
@@ -1,71 +1,306 @@
-from typing import Type, TypeVar, Generic, Dict, Any, List
+from typing import Type, TypeVar, Generic, Dict, Any, List, AsyncIterator, Sequence, Set, Mapping
 
 from pydantic import BaseModel
+from sqlalchemy import Select
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.db import create_read_session, after_commit
 from app.crud.base import CRUDBase
 from app.exceptions import ResourceNotFound
 from app.schemas.pagination import Paged
-from app.schemas.query import CommonQuery, ComplexQuery
-from app.utils.model_util import get_primary_keys, get_relationship_fields
+from app.schemas.query import (
+    CommonQuery,
+    ComplexQuery,
+    ExportQuery,
+    ExportFormat,
+    ExportSource,
+    LogicCondition,
+    Condition,
+)
+from app.utils.entity_cache import EntityCache
+from app.utils.export_util import to_ndjson, to_csv
+from app.utils.result_cache import ResultCache
+from app.utils.search_index import SearchIndex
+from app.utils.model_util import get_primary_keys, get_relationship_fields, parse_pk
+from app.utils.query_util import format_sort
 from app.utils.string_util import split_comma_separated
 
 T = TypeVar("T", bound=SQLModel)
 
 
 class BaseService(Generic[T]):
+    # 列表查询以 Core 行模式执行，不构造ORM对象；需要在 list/complex_query 中使用ORM对象的子类可关闭
+    row_mode: bool = True
+
     def __init__(self, model: Type[T]):
         self.model = model
         self.crud = CRUDBase(model)
+        self.entity_cache: EntityCache | None = None
+        self.result_cache: ResultCache | None = None
+        self.search_index: SearchIndex | None = None
+
+    def enable_entity_cache(self, entity_cache: EntityCache):
+        self.entity_cache = entity_cache
+
+    def enable_result_cache(self, result_cache: ResultCache):
+        self.result_cache = result_cache
+
+    def enable_search_index(self, search_index: SearchIndex):
+        self.search_index = search_index
+
+    async def invalidate(self, session: AsyncSession, idents: Sequence[tuple] = ()):
+        """写操作后失效缓存
+
+        主键缓存立即删除，提交后再删除一次，避免提交前被并发读取回填旧值；查询结果缓存在提交后整体失效
+        """
+        if self.result_cache is not None:
+            self.result_cache.mark_dirty(session)
+        if self.entity_cache is None or not idents:
+            return
+        await self.entity_cache.delete(idents)
+        after_commit(session, lambda: self.entity_cache.delete(idents))
+
+    async def get(self, session: AsyncSession, pk: str, schema_response: Type[BaseModel]) -> Dict[str, Any]:
+        """按主键查询单条记录，返回响应模型序列化后的字典；启用主键缓存时先读缓存"""
+        ident = parse_pk(self.model, pk)
+        if self.entity_cache is not None:
+            hit, value = await self.entity_cache.get(ident)
+            if hit:
+                if value is None:
+                    raise ResourceNotFound("记录不存在")
+                return value
+        relations = set(schema_response.model_fields) & set(get_relationship_fields(self.model))
+        db_item = await self.crud.get_by_pk(session, ident, relations)
+        value = None
+        if db_item is not None:
+            value = schema_response.model_validate(db_item, from_attributes=True).model_dump(mode="json")
+        if self.entity_cache is not None:
+            await self.entity_cache.set(ident, value)
+        if value is None:
+            raise ResourceNotFound("记录不存在")
+        return value
 
     async def create(self, session: AsyncSession, obj_new: BaseModel) -> T:
         db_item = await self.crud.create(session, obj_new)
+        # 清除可能存在的负缓存
+        await self.invalidate(session, [tuple(getattr(db_item, name) for name in get_primary_keys(self.model))])
         return db_item
 
-    async def update(self, session: AsyncSession, pk: str, obj_new: BaseModel) -> T:
-        primary_keys = get_primary_keys(self.model)
-        if len(primary_keys) > 1:
-            ident = tuple(pk.split(","))
-        else:
-            ident = pk
-        db_item = await session.get(self.model, ident)
-        if not db_item:
-            raise ResourceNotFound("更新目标不存在")
-        db_item = await self.do_update(session, db_item, obj_new)
-        return db_item
+    async def bulk_create(
+        self, session: AsyncSession, objs_new: Sequence[BaseModel], upsert: bool = False, fields: List[str] = None
+    ) -> Dict[str, Any]:
+        """批量创建，指定 fields 时用一次批量查询取回服务端生成的字段
+
+        启用主键缓存且为 upsert 时，先按唯一键查询会被更新的已有记录并失效其缓存（返回的主键可能为None，
+        且冲突的可能是非主键的唯一键）
+        """
+        conflicts = []
+        if upsert and self.entity_cache is not None:
+            conflicts = await self.crud.get_upsert_conflicts(session, objs_new)
+        count, keys = await self.crud.bulk_create(session, objs_new, upsert=upsert)
+        await self.invalidate(session, list(dict.fromkeys([*conflicts, *(key for key in keys if key is not None)])))
+        pk_names = get_primary_keys(self.model)
+        data = {"count": count, "keys": [self._format_key(key, len(pk_names) == 1) for key in keys]}
+        if fields:
+            idents = list(dict.fromkeys(key for key in keys if key is not None))
+            items = await self.crud.get_by_pks(session, idents, fields)
+            item_dicts = self._dump_items(items, fields)
+            dict_map = {tuple(item_dict[name] for name in pk_names): item_dict for item_dict in item_dicts}
+            data["items"] = [None if key is None else dict_map.get(key) for key in keys]
+        return data
+
+    @staticmethod
+    def _format_key(key: tuple | None, single_pk: bool):
+        if key is None:
+            return None
+        return key[0] if single_pk else list(key)
+
+    async def update(
+        self, session: AsyncSession, pk: str, obj_new: BaseModel, fields: List[str] = None
+    ) -> T | Dict[str, Any]:
+        """按主键更新
+
+        默认一条 UPDATE 完成，不预先读取记录，返回主键和更新的字段；指定 fields 时再查询一次返回这些字段。
+        子类重写了 do_update 时保留先读取记录再更新的流程，返回完整记录
+        """
+        ident = parse_pk(self.model, pk)
+        await self.invalidate(session, [ident])
+        if type(self).do_update is not BaseService.do_update:
+            db_item = await session.get(self.model, ident)
+            if not db_item:
+                raise ResourceNotFound("更新目标不存在")
+            db_item = await self.do_update(session, db_item, obj_new)
+            return db_item
+        values = obj_new.model_dump(exclude_unset=True) if isinstance(obj_new, BaseModel) else obj_new
+        data = await self.crud.update_by_pk(session, ident, values)
+        new_ident = tuple(data[name] for name in get_primary_keys(self.model))
+        if new_ident != ident:
+            await self.invalidate(session, [new_ident])
+        if fields:
+            # UPDATE 语句不会刷新会话中已加载的对象，重新读取时覆盖
+            items = await self.crud.get_by_pks(session, [new_ident], fields, populate_existing=True)
+            if item_dicts := self._dump_items(items, fields):
+                data.update(item_dicts[0])
+        return data
 
     async def do_update(self, session: AsyncSession, db_item: T, obj_new: Dict[str, Any] | BaseModel) -> T:
         db_item = await self.crud.update(session, db_item, obj_new)
         return db_item
 
+    async def update_many(
+        self,
+        session: AsyncSession,
+        condition: LogicCondition | Condition,
+        obj_new: Dict[str, Any] | BaseModel,
+        dry_run: bool = False,
+    ) -> Dict[str, Any]:
+        if isinstance(obj_new, BaseModel):
+            values = obj_new.model_dump(exclude_unset=True)
+        else:
+            values = obj_new
+        if not dry_run:
+            idents = await self.crud.get_pks(session, condition=condition) if self.entity_cache is not None else ()
+            await self.invalidate(session, idents)
+        count = await self.crud.update_many(session, condition, values, dry_run=dry_run)
+        return {"count": count, "dry_run": dry_run}
+
+    async def get_many(
+        self, session: AsyncSession, pks: Sequence[int | str], fields: List[str] = None
+    ) -> Dict[str, Any]:
+        """按主键批量查询，启用主键缓存时先读缓存（由单条查询写入），其余分块查询；结果按请求顺序排列，不存在的为None"""
+        idents = [parse_pk(self.model, str(pk)) for pk in pks]
+        unique_idents = list(dict.fromkeys(idents))
+        dict_map: Dict[tuple, Dict[str, Any] | None] = {}
+        if self.entity_cache is not None:
+            needed = self._dump_keys(fields)
+            for ident in unique_idents:
+                hit, value = await self.entity_cache.get(ident)
+                if not hit:
+                    continue
+                if value is None:
+                    dict_map[ident] = None  # 负缓存，记录不存在
+                elif needed <= value.keys():
+                    dict_map[ident] = {key: value[key] for key in needed}
+        if to_query := [ident for ident in unique_idents if ident not in dict_map]:
+            pk_names = get_primary_keys(self.model)
+            items = await self.crud.get_by_pks(session, to_query, fields)
+            for item_dict in self._dump_items(items, fields):
+                dict_map[tuple(item_dict[name] for name in pk_names)] = item_dict
+        return {
+            "items": [dict_map.get(ident) for ident in idents],
+            "missing": [pk for pk, ident in zip(pks, idents) if dict_map.get(ident) is None],
+        }
+
+    def _dump_keys(self, fields: List[str] = None) -> Set[str]:
+        """_dump_items 输出的字段：指定的字段和主键，未指定时为全部列"""
+        if fields:
+            return set(fields) | set(get_primary_keys(self.model))
+        return {attr.key for attr in self.model.__mapper__.column_attrs}
+
     async def list(self, session: AsyncSession, query: CommonQuery) -> Dict[str, Any]:
+        if self.row_mode and self.crud.supports_rows(query.fields):
+            data = await self.crud.list(session, query, rows=True)
+            return data.model_dump(include=data.model_fields_set)
         data = await self.crud.list(session, query)
-        return self._dump_paged_data(data, query.fields)
+        return self._dump_paged_data(data, query.fields, self.get_hidden_keys(query))
 
     async def complex_query(self, session: AsyncSession, query: ComplexQuery) -> Dict[str, Any]:
+        if self.search_index is not None:
+            # 模糊匹配条件先在ES中检索出候选主键，缩小数据库中执行原条件、排序、分页和计数的范围
+            condition = await self.search_index.prefilter(self.model, query.condition)
+            if condition is not query.condition:
+                query = query.model_copy(update={"condition": condition})
+        if self.row_mode and self.crud.supports_rows(query.fields):
+            data = await self.crud.complex_query(session, query, rows=True)
+            return data.model_dump(include=data.model_fields_set)
         data = await self.crud.complex_query(session, query)
-        return self._dump_paged_data(data, query.fields)
+        return self._dump_paged_data(data, query.fields, self.get_hidden_keys(query))
+
+    def export(self, query: ExportQuery) -> AsyncIterator[bytes]:
+        """流式导出，数据来自数据库或ES检索索引
+
+        在返回迭代器前解析字段、构造查询，参数错误时直接抛出 ParamValidationError，而不是在开始响应后中断。
+        """
+        columns = self.crud.get_column_attrs(query.fields, strict=True)
+        if query.source is ExportSource.ES:
+            # ES查询使用同名字段，先按模型校验条件和排序字段
+            self.crud.build_where(condition=query.condition)
+            format_sort(self.model, query.sort_by, query.sort_order)
+            batches = self.search_index.scan(
+                query.condition, [column.key for column in columns], query.sort_by, query.sort_order
+            )
+        else:
+            statement = self.crud.stream_statement(
+                columns, condition=query.condition, sort_by=query.sort_by, sort_order=query.sort_order
+            )
+            batches = self._stream_rows(statement)
+        return self._encode_export(query.format, [column.key for column in columns], batches)
+
+    @staticmethod
+    async def _encode_export(
+        export_format: ExportFormat, column_names: List[str], batches: AsyncIterator[Sequence[Mapping[str, Any]]]
+    ) -> AsyncIterator[bytes]:
+        if export_format is ExportFormat.CSV:
+            yield to_csv([], column_names, header=True)
+        async for rows in batches:
+            if export_format is ExportFormat.CSV:
+                yield to_csv(rows, column_names)
+            else:
+                yield to_ndjson(rows)
+
+    async def _stream_rows(self, statement: Select) -> AsyncIterator[Sequence[Mapping[str, Any]]]:
+        """响应期间独立持有读会话（请求依赖的会话在响应发送前已关闭）"""
+        async with await create_read_session() as session:
+            async for rows in self.crud.stream(session, statement):
+                yield rows
 
-    def _dump_paged_data(self, data: Paged, fields: List[str] | str):
+    def get_hidden_keys(self, query: CommonQuery | ComplexQuery) -> Set[str]:
+        cursor_mode = None if query.cursor is None else bool(query.cursor)
+        return self.crud.get_hidden_keys(query.fields, query.sort_by, cursor_mode)
+
+    def _dump_paged_data(self, data: Paged, fields: List[str] | str, hidden_keys: Set[str] = None):
         if isinstance(fields, str):
             _fields = split_comma_separated(fields)
         else:
             _fields = fields
-        data_dict = data.model_dump()
-        relation_fields = set(_fields) & set(get_relationship_fields(self.model))
+        data_dict = data.model_dump(include=data.model_fields_set)  # 非游标分页时不返回 next_cursor
+        self._dump_relations(data.items, data_dict["items"], _fields)
+        for item_dict in data_dict["items"]:
+            for hidden_key in hidden_keys or ():
+                item_dict.pop(hidden_key, None)
+        return data_dict
+
+    def _dump_items(self, items: List[T], fields: List[str] = None) -> List[Dict[str, Any]]:
+        """序列化记录，指定 fields 时只包含这些字段和主键"""
+        include = None
+        if fields:
+            include = set(fields) | set(get_primary_keys(self.model))
+        item_dicts = [item.model_dump(include=include) for item in items]
+        if fields:
+            self._dump_relations(items, item_dicts, fields)
+        return item_dicts
+
+    def _dump_relations(self, items: List[T], item_dicts: List[Dict[str, Any]], fields: List[str]):
+        relation_fields = set(fields) & set(get_relationship_fields(self.model))
         if not relation_fields:
-            return data_dict
-        # 序列化关系字段
-        for item_obj, item_dict in zip(data.items, data_dict["items"]):
+            return
+        # 序列化关系字段，会话中同一关联对象只有一个实例，按对象只序列化一次
+        dumped: Dict[int, Dict[str, Any]] = {}
+
+        def dump(obj: BaseModel) -> Dict[str, Any]:
+            if id(obj) not in dumped:
+                dumped[id(obj)] = obj.model_dump()
+            return dumped[id(obj)]
+
+        for item_obj, item_dict in zip(items, item_dicts):
             for field_name in relation_fields:
                 value = getattr(item_obj, field_name)
                 if value is None:
                     item_dict[field_name] = None
                 elif isinstance(value, BaseModel):
-                    item_dict[field_name] = value.model_dump()
+                    item_dict[field_name] = dump(value)
                 elif isinstance(value, (list, set)):
-                    item_dict[field_name] = [obj.model_dump() for obj in value]
+                    item_dict[field_name] = [dump(obj) for obj in value]
                 else:
                     item_dict[field_name] = str(value)  # 兜底处理，序列化为字符串
-        return data_dict
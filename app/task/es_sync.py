@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from elasticsearch.helpers import async_bulk
+from pydantic import BaseModel
+from sqlalchemy import RowMapping
+from sqlmodel import SQLModel, select
+
+from app.config import config
+from app.core.db import create_read_session
+from app.schemas.query import SortOrder
+from app.utils.cache import redis_cache
+from app.utils.es_util import get_es, DEFAULT_CLUSTER
+from app.utils.model_util import get_primary_keys
+from app.utils.query_util import build_keyset_condition
+
+logger = logging.getLogger(__name__)
+
+
+class ESSyncTask:
+    """MySQL 到ES的增量同步，按 (更新时间, 主键) 游标分批读取变更的记录，以 bulk 写入ES
+
+    水位线（最后同步的更新时间和主键）保存在 Redis，每批写入成功后推进；每轮从水位线减去 sync_safety_lag 秒处开始，
+    重新同步这段时间内的记录，避免漏掉提交晚于更新时间（长事务）或从库延迟的记录，重复写入是幂等的。
+    软删除字段为真的记录从ES中删除，物理删除的记录不会同步。
+    表需要有以更新时间开头的索引，如 Index("hero_update_time_IDX", "update_time", "id")。
+    """
+
+    def __init__(
+        self,
+        model: Type[SQLModel],
+        schema: Type[BaseModel],
+        index: str,
+        time_field: str = "update_time",
+        deleted_field: Optional[str] = "is_deprecated",
+        cluster: str = DEFAULT_CLUSTER,
+    ):
+        """
+        :param schema: 文档的结构，一般为模型的响应模型，只同步模型中存在的列，不包括关系字段
+        :param index: 写入的索引名或别名，文档 _id 为记录主键
+        :param deleted_field: 软删除字段，为None时不处理删除
+        :param cluster: ES集群名称
+        """
+        (self.pk_name,) = get_primary_keys(model)  # 文档 _id 为主键，不支持联合主键
+        self.model = model
+        self.schema = schema
+        self.index = index
+        self.time_field = time_field
+        self.deleted_field = deleted_field
+        self.cluster = cluster
+        column_keys = {attr.key for attr in model.__mapper__.column_attrs}
+        self.doc_fields = [name for name in schema.model_fields if name in column_keys]
+        selected = dict.fromkeys(
+            [*self.doc_fields, self.pk_name, time_field] + ([deleted_field] if deleted_field else [])
+        )
+        self.columns = [getattr(model, name) for name in selected]
+        self.watermark_key = f"es_sync:{model.__tablename__}:{index}"
+
+    async def get_watermark(self) -> Tuple[Optional[datetime], Any]:
+        value = await redis_cache.get(self.watermark_key)
+        if not value:
+            return None, None
+        return datetime.fromisoformat(value["time"]), value["pk"]
+
+    async def set_watermark(self, row_time: datetime, pk: Any):
+        await redis_cache.set(self.watermark_key, {"time": row_time.isoformat(), "pk": pk})
+
+    async def reset_watermark(self):
+        """清除水位线，下一轮全量同步"""
+        await redis_cache.delete(self.watermark_key)
+
+    async def fetch_batches(self, since: Optional[datetime]) -> AsyncIterator[List[RowMapping]]:
+        """按 (更新时间, 主键) 游标分批读取 since 之后更新的记录，每批使用独立的读会话，不长时间占用连接"""
+        time_column, pk_column = getattr(self.model, self.time_field), getattr(self.model, self.pk_name)
+        statement = select(*self.columns).order_by(time_column, pk_column).limit(config.es.sync_batch_size)
+        where = [] if since is None else [time_column >= since]
+        while True:
+            async with await create_read_session() as session:
+                result = await session.exec(statement.where(*where))
+                rows = result.mappings().all()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < config.es.sync_batch_size:
+                return
+            last = rows[-1]
+            keyset = [last[self.time_field], last[self.pk_name]]
+            where = [build_keyset_condition([time_column, pk_column], keyset, SortOrder.ASC)]
+
+    def to_action(self, row: RowMapping) -> Dict[str, Any]:
+        pk = row[self.pk_name]
+        if self.deleted_field and row[self.deleted_field]:
+            return {"_op_type": "delete", "_index": self.index, "_id": pk}
+        doc = self.schema.model_validate({name: row[name] for name in self.doc_fields}).model_dump(
+            mode="json", include=set(self.doc_fields)
+        )
+        return {"_op_type": "index", "_index": self.index, "_id": pk, "_source": doc}
+
+    async def index_batch(self, rows: List[RowMapping]) -> int:
+        """分块并发写入ES，返回失败数；删除不存在的文档不算失败"""
+        semaphore = asyncio.Semaphore(config.es.sync_concurrency)
+        chunk_size = config.es.sync_chunk_size
+
+        async def index_chunk(chunk: List[RowMapping]) -> List[dict]:
+            async with semaphore:
+                _, errors = await async_bulk(
+                    get_es(self.cluster),
+                    [self.to_action(row) for row in chunk],
+                    chunk_size=chunk_size,
+                    raise_on_error=False,
+                    request_timeout=config.es.timeout,
+                )
+                return [e for e in errors if e.get("delete", {}).get("status") != 404]
+
+        chunks = [rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        results = await asyncio.gather(*(index_chunk(chunk) for chunk in chunks))
+        errors = [error for chunk_errors in results for error in chunk_errors]
+        if errors:
+            logger.error(f"同步 {self.index} 失败 {len(errors)} 条，如: {errors[:3]}")
+        return len(errors)
+
+    async def run(self):
+        """同步一轮：读取下一批的同时写入上一批，写入成功后推进水位线，失败时停止本轮，下一轮从水位线重试"""
+        start = time.perf_counter()
+        since, _ = await self.get_watermark()
+        if since is not None:
+            since -= timedelta(seconds=config.es.sync_safety_lag)
+        total = 0
+        pending: Optional[Tuple[asyncio.Task, RowMapping]] = None
+        try:
+            async for rows in self.fetch_batches(since):
+                if pending and not await self._commit(*pending):
+                    return
+                pending = asyncio.create_task(self.index_batch(rows)), rows[-1]
+                total += len(rows)
+            if pending and not await self._commit(*pending):
+                return
+        finally:
+            if pending and not pending[0].done():
+                pending[0].cancel()
+        if total:
+            logger.info(
+                f"同步 {self.model.__tablename__} -> {self.index}: {total} 条，耗时 {time.perf_counter() - start:.1f} 秒"
+            )
+
+    async def _commit(self, task: asyncio.Task, last: RowMapping) -> bool:
+        if await task:
+            return False
+        await self.set_watermark(last[self.time_field], last[self.pk_name])
+        return True
@@ -11,6 +11,7 @@ caches.set_config(
         "default": {
             "cache": "aiocache.SimpleMemoryCache",
             "serializer": {"class": "aiocache.serializers.PickleSerializer"},
+            "plugins": [{"class": "aiocache.plugins.HitMissRatioPlugin"}],
         },
         "redis_alt": {
             "cache": "aiocache.RedisCache",
@@ -28,3 +29,13 @@ caches.set_config(
 
 mem_cache: SimpleMemoryCache = caches.get("default")
 redis_cache: RedisCache = caches.get("redis_alt")
+# 框架内部的统计值（如表行数），不使用插件，不计入 /cache-stats 的命中率
+stats_cache = SimpleMemoryCache()
+
+
+def get_hit_miss_ratio() -> dict:
+    """HitMissRatioPlugin 统计的缓存命中率，未读取过缓存时为空"""
+    return {
+        "mem_cache": getattr(mem_cache, "hit_miss_ratio", {}),
+        "redis_cache": getattr(redis_cache, "hit_miss_ratio", {}),
+    }
@@ -1,64 +1,176 @@
-from typing import Type, List, Union, Optional
+from itertools import count
+from typing import Type, List, Union, Optional, Tuple, Any, Iterator, Hashable, Set
 
-from sqlalchemy import ColumnElement
+from sqlalchemy import ColumnElement, bindparam, BindParameter
 from sqlmodel import SQLModel, func, and_, or_
 
 from app.exceptions import ParamValidationError
 from app.schemas.query import Condition, Operator, LogicCondition
 
 
+# 可以使用索引（最左前缀）的操作符；like 构造为前后模糊匹配，与 ne、not_in、json_contains 一样不能使用索引
+SARGABLE_OPERATORS = {"eq", "is_null", "in", "lt", "gt", "le", "ge"}
+
+
 class ConditionBuilder:
-    def __init__(self, model: Type[SQLModel]):
+    """条件树构造器
+
+    条件树先拆分为形状（字段、操作符、嵌套结构）和参数值两部分，再由形状构造SQL表达式。
+    形状相同、仅参数值不同的条件可以复用同一个表达式，参数名为 `{prefix}{序号}`。
+    """
+
+    def __init__(self, model: Type[SQLModel], prefix: str = "c"):
         self.model = model
+        self.prefix = prefix
 
     def build_single_condition(self, cond: Condition):
+        return self.build_condition(cond)
+
+    def build_condition(self, cond: LogicCondition | Condition) -> Optional[ColumnElement[bool]]:
+        """构造带参数值的条件表达式"""
+        shape, values = self.flatten(cond)
+        return self.build_from_shape(shape, values)
+
+    def flatten(self, cond: LogicCondition | Condition | None) -> Tuple[Hashable, List[Any]]:
+        """拆分条件树，返回形状和按先序遍历排列的参数值"""
+        values = []
+        shape = self._flatten(cond, values)
+        return shape, values
+
+    def build_from_shape(self, shape: Hashable, values: List[Any] = None) -> Optional[ColumnElement[bool]]:
+        """由形状构造条件表达式，values 为空时生成不带值的命名参数，供缓存复用"""
+        return self._build(shape, count(), values)
+
+    def index_usable(self, shape: Hashable, leading_fields: Set[str], fields: Set[str] = frozenset()) -> bool:
+        """条件能否使用索引：AND 中任一可用索引的条件命中某个索引的最左列，或嵌套的 OR 各分支均能使用索引（index merge）
+
+        :param leading_fields: 各索引的最左列
+        :param fields: 与条件 AND 组合的其他可用索引条件的字段，如查询参数
+        """
+        if shape is None:
+            return bool(fields & leading_fields)
+        if shape[0] == "cond":
+            field, operator = self.predicate(shape)
+            return (operator in SARGABLE_OPERATORS and field in leading_fields) or bool(fields & leading_fields)
+        _, and_shapes, or_shapes = shape
+        and_fields = set(fields)
+        nested = []
+        for sub_shape in and_shapes or ():
+            if sub_shape[0] == "cond":
+                field, operator = self.predicate(sub_shape)
+                if operator in SARGABLE_OPERATORS:
+                    and_fields.add(field)
+            else:
+                nested.append(sub_shape)
+        if and_fields & leading_fields:
+            return True
+        if any(self.index_usable(sub_shape, leading_fields) for sub_shape in nested):
+            return True
+        return bool(or_shapes) and all(self.index_usable(sub_shape, leading_fields) for sub_shape in or_shapes)
+
+    @staticmethod
+    def predicate(shape: Hashable) -> Tuple[str, str]:
+        """单个条件的字段和操作符，IS NULL / IS NOT NULL 为 is_null / is_not_null"""
+        _, field, operator, is_null = shape
+        if is_null:
+            return field, "is_null" if operator is Operator.EQ else "is_not_null"
+        return field, operator.value
+
+    def iter_predicates(self, shape: Hashable) -> Iterator[Tuple[str, str]]:
+        """遍历条件树中的全部 (字段, 操作符)"""
+        if shape is None:
+            return
+        if shape[0] == "cond":
+            yield self.predicate(shape)
+            return
+        _, and_shapes, or_shapes = shape
+        for sub_shape in (and_shapes or ()) + (or_shapes or ()):
+            yield from self.iter_predicates(sub_shape)
+
+    def _flatten(self, cond: LogicCondition | Condition | None, values: List[Any]) -> Hashable:
+        if cond is None:
+            return None
+        if isinstance(cond, Condition):
+            return self._flatten_single(cond, values)
+        return (
+            "logic",
+            self._flatten_conditions(cond.and_, values),
+            self._flatten_conditions(cond.or_, values),
+        )
+
+    def _flatten_conditions(self, conditions: List[Union[Condition, LogicCondition]] | None, values: List[Any]):
+        if not conditions:
+            return None
+        return tuple(self._flatten(sub_cond, values) for sub_cond in conditions)
+
+    def _flatten_single(self, cond: Condition, values: List[Any]) -> Hashable:
         if not hasattr(self.model, cond.field):
             raise ParamValidationError(f"查询条件中的字段 `{cond.field}` 不存在")
-        field_attr = getattr(self.model, cond.field)
+        is_null = False
         match cond.operator:
+            case Operator.EQ | Operator.NE if cond.value is None:
+                is_null = True  # 生成 IS NULL / IS NOT NULL，不能绑定为参数
+            case Operator.IN | Operator.NOT_IN:
+                values.append(list(cond.value) if isinstance(cond.value, (list, tuple, set)) else [cond.value])
+            case Operator.JSON_CONTAINS:
+                values.append(f'"{cond.value}"')
+            case Operator.LIKE:
+                values.append(f"%{cond.value}%")
+            case _:
+                values.append(cond.value)
+        return "cond", cond.field, cond.operator, is_null
+
+    def _bind(self, indexes: Iterator[int], values: List[Any] | None, expanding: bool = False) -> BindParameter:
+        index = next(indexes)
+        if values is None:
+            return bindparam(f"{self.prefix}{index}", expanding=expanding)
+        return bindparam(f"{self.prefix}{index}", values[index], expanding=expanding, unique=True)
+
+    def _build(self, shape: Hashable, indexes: Iterator[int], values: List[Any] | None):
+        if shape is None:
+            return None
+        if shape[0] == "cond":
+            return self._build_single(shape, indexes, values)
+        _, and_shapes, or_shapes = shape
+        outer_clauses = []
+        if and_shapes:
+            outer_clauses.append(self.process_conditions(and_shapes, and_, indexes, values))
+        if or_shapes:
+            outer_clauses.append(self.process_conditions(or_shapes, or_, indexes, values))
+        if valid_clauses := list(filter(lambda x: x is not None, outer_clauses)):
+            return and_(*valid_clauses)
+
+    def process_conditions(
+        self, shapes: Tuple[Hashable, ...], expr, indexes: Iterator[int], values: List[Any] | None
+    ) -> Optional[ColumnElement[bool]]:
+        clauses = []
+        for sub_shape in shapes:
+            if (clause := self._build(sub_shape, indexes, values)) is not None:
+                clauses.append(clause)
+        if clauses:
+            return expr(*clauses)
+
+    def _build_single(self, shape: Hashable, indexes: Iterator[int], values: List[Any] | None):
+        _, field, operator, is_null = shape
+        field_attr = getattr(self.model, field)
+        match operator:
             case Operator.EQ:
-                return field_attr == cond.value
+                return field_attr.is_(None) if is_null else field_attr == self._bind(indexes, values)
             case Operator.NE:
-                return field_attr != cond.value
+                return field_attr.is_not(None) if is_null else field_attr != self._bind(indexes, values)
             case Operator.IN:
-                return field_attr.in_(cond.value)
+                return field_attr.in_(self._bind(indexes, values, expanding=True))
             case Operator.NOT_IN:
-                return ~field_attr.in_(cond.value)
+                return ~field_attr.in_(self._bind(indexes, values, expanding=True))
             case Operator.LT:
-                return field_attr < cond.value
+                return field_attr < self._bind(indexes, values)
             case Operator.GT:
-                return field_attr > cond.value
+                return field_attr > self._bind(indexes, values)
             case Operator.LE:
-                return field_attr <= cond.value
+                return field_attr <= self._bind(indexes, values)
             case Operator.GE:
-                return field_attr >= cond.value
+                return field_attr >= self._bind(indexes, values)
             case Operator.JSON_CONTAINS:
-                return func.json_contains(field_attr, f'"{cond.value}"')
+                return func.json_contains(field_attr, self._bind(indexes, values))
             case Operator.LIKE:
-                return field_attr.like(f"%{cond.value}%")
-
-    def process_conditions(
-        self, conditions: List[Union[Condition, LogicCondition]], expr
-    ) -> Optional[ColumnElement[bool]]:
-        clauses = []
-        for sub_cond in conditions:
-            if isinstance(sub_cond, LogicCondition):
-                if (clause := self.build_condition(sub_cond)) is not None:
-                    clauses.append(clause)
-            elif isinstance(sub_cond, Condition):
-                clauses.append(self.build_single_condition(sub_cond))
-        if clauses:
-            return expr(*clauses)
-
-    def build_condition(self, cond: LogicCondition | Condition) -> Optional[ColumnElement[bool]]:
-        if cond is None:
-            return None
-        if isinstance(cond, Condition):
-            return self.build_single_condition(cond)
-        outer_clauses = []
-        if cond.and_:
-            outer_clauses.append(self.process_conditions(cond.and_, expr=and_))
-        if cond.or_:
-            outer_clauses.append(self.process_conditions(cond.or_, expr=or_))
-        if valid_clauses := list(filter(lambda x: x is not None, outer_clauses)):
-            return and_(*valid_clauses)
+                return field_attr.like(self._bind(indexes, values))
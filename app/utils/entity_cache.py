@@ -0,0 +1,69 @@
+import logging
+from typing import Any, Dict, Optional, Tuple, Sequence
+
+from app.config import config
+from app.utils.cache import mem_cache, redis_cache
+
+logger = logging.getLogger(__name__)
+
+# 负缓存占位值，表示主键对应的记录不存在
+MISSING = "__missing__"
+
+
+class EntityCache:
+    """主键读穿透缓存，L1 为进程内存（mem_cache），L2 为 Redis（redis_cache）
+
+    缓存值为响应模型序列化后的字典，不持有ORM对象。
+    L1 的过期时间不超过 config.cache.entity_local_ttl，限制其他进程写入后读到旧值的时长。
+    """
+
+    def __init__(self, name: str, ttl: int, negative_ttl: int = 0):
+        self.prefix = f"entity:{name}:"
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def make_key(self, ident: Tuple) -> str:
+        return self.prefix + ",".join(map(str, ident))
+
+    async def get(self, ident: Tuple) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """返回 (是否命中, 缓存值)，命中负缓存时缓存值为None"""
+        key = self.make_key(ident)
+        value = await mem_cache.get(key)
+        if value is None:
+            try:
+                value = await redis_cache.get(key)
+            except Exception as e:
+                logger.warning(f"读取实体缓存失败: {e}")
+            if value is not None:
+                await mem_cache.set(key, value, ttl=self.local_ttl(self.ttl))
+        if value is None:
+            return False, None
+        return True, None if value == MISSING else value
+
+    async def set(self, ident: Tuple, value: Optional[Dict[str, Any]]):
+        """写入缓存，value 为None时写入负缓存（未启用负缓存时跳过）"""
+        ttl = self.ttl
+        if value is None:
+            if not self.negative_ttl:
+                return
+            value, ttl = MISSING, self.negative_ttl
+        key = self.make_key(ident)
+        await mem_cache.set(key, value, ttl=self.local_ttl(ttl))
+        try:
+            await redis_cache.set(key, value, ttl=ttl)
+        except Exception as e:
+            logger.warning(f"写入实体缓存失败: {e}")
+
+    async def delete(self, idents: Sequence[Tuple]):
+        keys = [self.make_key(ident) for ident in idents]
+        for key in keys:
+            await mem_cache.delete(key)
+        try:
+            for key in keys:
+                await redis_cache.delete(key)
+        except Exception as e:
+            logger.warning(f"删除实体缓存失败: {e}")
+
+    @staticmethod
+    def local_ttl(ttl: int) -> int:
+        return min(ttl, config.cache.entity_local_ttl)
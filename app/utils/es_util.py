@@ -1,59 +1,265 @@
-import json
+import asyncio
+import contextlib
 import logging
-from functools import lru_cache
-from typing import Sequence, List
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 
-from elasticsearch import AsyncElasticsearch
+from elasticsearch import AsyncElasticsearch, ApiError, TransportError
 
 from app.config import config
+from app.config.models import ESClusterConfig
 
 logger = logging.getLogger(__name__)
 
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# 重试的初始等待时间（秒），之后每次加倍
+RETRY_BACKOFF = 0.5
+# config.es 的集群名称
+DEFAULT_CLUSTER = "default"
 
-@lru_cache(maxsize=8)
-def get_es() -> AsyncElasticsearch:
+
+class ESClientRegistry:
+    """ES客户端注册表，每个集群一个客户端，在应用 lifespan 中创建和关闭
+
+    客户端的连接池绑定创建时的事件循环，未在 lifespan 中创建时（如脚本、调度任务）首次使用时创建，需自行调用 close
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, AsyncElasticsearch] = {}
+
+    @staticmethod
+    def get_cluster_config(name: str) -> ESClusterConfig:
+        if name == DEFAULT_CLUSTER:
+            return config.es
+        try:
+            return config.es.clusters[name]
+        except KeyError:
+            raise ValueError(f"未配置ES集群 {name}")
+
+    @staticmethod
+    def create_client(cluster: ESClusterConfig) -> AsyncElasticsearch:
+        sniff_options = {}
+        # 传入任一嗅探参数即启用嗅探（如 min_delay_between_sniffing 隐含 sniff_before_requests），只在需要时传入
+        if cluster.sniff_on_start or cluster.sniff_on_node_failure or cluster.sniff_interval is not None:
+            sniff_options = {
+                "sniff_on_start": cluster.sniff_on_start,
+                "sniff_on_node_failure": cluster.sniff_on_node_failure,
+                "sniff_before_requests": cluster.sniff_interval is not None,
+                "min_delay_between_sniffing": cluster.sniff_interval or 10.0,
+                "sniff_timeout": cluster.sniff_timeout,
+            }
+        return AsyncElasticsearch(
+            hosts=cluster.host.split(","),
+            # ca_certs=ca_path,  # E:\application-service\apps\s105-c7es-01.crt
+            request_timeout=cluster.timeout,
+            verify_certs=False,
+            basic_auth=(cluster.user, cluster.password),
+            connections_per_node=cluster.connections_per_node,
+            max_retries=cluster.max_retries,
+            retry_on_timeout=cluster.retry_on_timeout,
+            **sniff_options,
+        )
+
+    def get(self, name: str = DEFAULT_CLUSTER) -> AsyncElasticsearch:
+        if name not in self._clients:
+            self._clients[name] = self.create_client(self.get_cluster_config(name))
+        return self._clients[name]
+
+    async def start(self):
+        for name in [DEFAULT_CLUSTER, *config.es.clusters]:
+            self.get(name)
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for name, client in clients.items():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"关闭ES集群 {name} 的客户端失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """各集群每个节点的连接池使用情况：上限、使用中、空闲的连接数"""
+        stats = {}
+        for name, client in self._clients.items():
+            nodes = []
+            for node in client.transport.node_pool.all():
+                session = node.session  # 首次请求时才创建连接池
+                connector = session.connector if session is not None else None
+                nodes.append(
+                    {
+                        "node": node.base_url,
+                        "limit": node.config.connections_per_node,
+                        "in_use": len(getattr(connector, "_acquired", ())),
+                        "idle": sum(len(conns) for conns in getattr(connector, "_conns", {}).values()),
+                    }
+                )
+            stats[name] = nodes
+        return stats
+
+
+es_clients = ESClientRegistry()
+
+
+def get_es(name: str = DEFAULT_CLUSTER) -> AsyncElasticsearch:
     """
     获取ES连接对象
+
+    :param name: 集群名称，默认为 config.es 的集群，其他集群见 config.es.clusters
     """
-    es = AsyncElasticsearch(
-        hosts=config.es.host.split(","),
-        # ca_certs=ca_path,  # E:\application-service\apps\s105-c7es-01.crt
-        timeout=config.es.timeout,
-        verify_certs=False,
-        http_auth=(config.es.user, config.es.password),
-    )
-    return es
+    return es_clients.get(name)
 
 
-async def get_by_id(eid: str, index: str):
-    return await get_es().get(index=index, id=eid, request_timeout=config.es.timeout)
+async def get_by_id(eid: str, index: str, cluster: str = DEFAULT_CLUSTER):
+    return await get_es(cluster).get(index=index, id=eid, request_timeout=config.es.timeout)
 
 
-async def query(dsl: dict, index: str):
+async def query(dsl: dict, index: str, cluster: str = DEFAULT_CLUSTER):
     """
     单条数据检索
     """
-    result = await get_es().search(index=index, body=dsl, request_timeout=config.es.timeout)
+    result = await get_es(cluster).search(index=index, body=dsl, request_timeout=config.es.timeout)
     return result
 
 
-async def bulk_query(dsl_list: list, index: str | Sequence[str], return_dsl=False) -> List[dict] | dict:
+def _error_response(error_type: str, reason: str, status: int) -> dict:
+    """与 msearch 中失败的子响应格式相同"""
+    return {"error": {"type": error_type, "reason": reason}, "status": status}
+
+
+def _is_retryable(response: dict) -> bool:
+    """限流（429）和服务端错误（5xx）可重试，DSL 错误等不可重试"""
+    return "error" in response and response.get("status", 500) in RETRYABLE_STATUS
+
+
+async def scan_pit(
+    index: str,
+    query: dict = None,
+    sort: List[dict] = None,
+    source: List[str] | bool = True,
+    batch_size: int = None,
+    keep_alive: str = None,
+    cluster: str = DEFAULT_CLUSTER,
+) -> AsyncIterator[List[dict]]:
+    """
+    以 point in time + search_after 遍历检索结果，按批返回命中的文档（hits）
+
+    结果是打开 PIT 时的快照，遍历期间的写入不影响结果；没有 from + size 的结果窗口限制，内存占用只与批大小有关。
+    返回当前批之前已发起下一批的检索，调用方处理当前批时下一批在后台获取。
+
+    :param sort: 排序，默认按 _shard_doc（最快）；PIT 检索会自动追加 _shard_doc 作为唯一的排序后缀
+    :param source: 返回的 _source 字段
+    :param batch_size: 每批的文档数，默认 config.es.scan_batch_size
+    :param keep_alive: PIT 在两批之间的保持时间，默认 config.es.pit_keep_alive
+    """
+    es = get_es(cluster)
+    batch_size = batch_size or config.es.scan_batch_size
+    keep_alive = keep_alive or config.es.pit_keep_alive
+    response = await es.open_point_in_time(index=index, keep_alive=keep_alive)
+    pit_id = response["id"]
+
+    async def search(search_after: Optional[list]) -> dict:
+        return await es.search(
+            pit={"id": pit_id, "keep_alive": keep_alive},
+            query=query,
+            sort=sort or [{"_shard_doc": "asc"}],
+            source=source,
+            size=batch_size,
+            search_after=search_after,
+            track_total_hits=False,
+        )
+
+    task: Optional[asyncio.Task] = asyncio.create_task(search(None))
+    try:
+        while task is not None:
+            response = await task
+            pit_id = response.get("pit_id", pit_id)  # 每次检索可能返回新的 PIT id
+            hits = response["hits"]["hits"]
+            task = asyncio.create_task(search(hits[-1]["sort"])) if len(hits) == batch_size else None
+            if hits:
+                yield hits
+    finally:
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task  # 等待预取的检索结束后再关闭 PIT
+        try:
+            await es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logger.warning(f"关闭ES PIT失败，index: {index}: {e}")
+
+
+async def bulk_query(
+    dsl_list: list,
+    index: str | Sequence[str],
+    return_dsl=False,
+    chunk_size: int = None,
+    concurrency: int = None,
+    timeout: float = None,
+    max_retries: int = None,
+    cluster: str = DEFAULT_CLUSTER,
+) -> List[dict] | dict:
     """
     批量数据检索
+
+    按 chunk_size 分块并发 msearch，结果与 dsl_list 顺序一致；限流、服务端错误和网络错误的子查询在时限内重试，
+    最终仍失败或超过时限的子查询，结果为 msearch 格式的失败子响应（含 error 和 status），不影响其他子查询。
+    与单次 msearch 不同，请求失败（网络错误、ES返回错误、超时）不抛出异常，调用方需检查每个结果是否含 error。
+
+    :param chunk_size: 每个 msearch 请求的查询数，默认 config.es.msearch_chunk_size
+    :param concurrency: 并发的 msearch 请求数，默认 config.es.msearch_concurrency
+    :param timeout: 本次调用的总时限（秒），包括重试，默认 config.es.timeout
+    :param max_retries: 失败子查询的最大重试次数，默认 config.es.msearch_max_retries
+    :param cluster: ES集群名称
     """
-    result = []
-    requests = []
+    chunk_size = chunk_size or config.es.msearch_chunk_size
+    semaphore = asyncio.Semaphore(concurrency or config.es.msearch_concurrency)
+    max_retries = config.es.msearch_max_retries if max_retries is None else max_retries
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (timeout or config.es.timeout)
     header = {"index": index}
-    for dsl in dsl_list:
-        # print(json.dumps(dsl, ensure_ascii=False))
-        requests.extend([header, dsl])
+    result: List[dict | None] = [None] * len(dsl_list)
 
-    try:
-        responses = await get_es().msearch(body=requests, index=index)
-    except Exception as e:
-        logger.error(f"ES批量数据检索失败: {str(e)}, index: {index}, dsl_list: {json.dumps(dsl_list)}")
-        raise
-    result.extend(responses["responses"])
+    async def msearch(positions: List[int]):
+        requests = []
+        for position in positions:
+            requests.extend([header, dsl_list[position]])
+        async with semaphore:
+            # 获取信号量后再计算剩余时间，排队等待的时间不计入请求超时
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            responses = await get_es(cluster).msearch(body=requests, index=index, request_timeout=remaining)
+        for position, response in zip(positions, responses["responses"]):
+            result[position] = response
+
+    async def query_chunk(positions: List[int]):
+        for attempt in range(max_retries + 1):
+            if attempt:
+                await asyncio.sleep(min(RETRY_BACKOFF * 2 ** (attempt - 1), max(deadline - loop.time(), 0)))
+            try:
+                await msearch(positions)
+            except asyncio.TimeoutError:
+                for position in positions:
+                    result[position] = _error_response("timeout", "超过批量检索时限", 504)
+                return
+            except ApiError as e:
+                for position in positions:
+                    result[position] = _error_response(type(e).__name__, str(e.message), e.meta.status)
+            except TransportError as e:
+                for position in positions:
+                    result[position] = _error_response(type(e).__name__, str(e.message), 503)
+            positions = [position for position in positions if _is_retryable(result[position])]
+            if not positions:
+                return
+
+    chunks = [list(range(i, min(i + chunk_size, len(dsl_list)))) for i in range(0, len(dsl_list), chunk_size)]
+    await asyncio.gather(*(query_chunk(chunk) for chunk in chunks))
+
+    if failed := [response for response in result if "error" in response]:
+        error = failed[0]["error"]
+        logger.error(
+            f"ES批量数据检索 {len(failed)}/{len(dsl_list)} 条失败，index: {index}，"
+            f"首个错误: {error.get('type')}: {str(error.get('reason'))[:200]}"
+        )
 
     if return_dsl:
         return {
@@ -0,0 +1,29 @@
+import csv
+import io
+import json
+from typing import Sequence, Mapping, Any, List
+
+from pydantic_core import to_jsonable_python
+
+
+def to_ndjson(rows: Sequence[Mapping[str, Any]]) -> bytes:
+    """每行一个JSON对象"""
+    lines = [json.dumps(dict(row), ensure_ascii=False, default=to_jsonable_python) for row in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def to_csv(rows: Sequence[Mapping[str, Any]], columns: List[str], header: bool = False) -> bytes:
+    """按列顺序输出CSV，json字段序列化为字符串"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(row[column]) for column in columns])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=to_jsonable_python)
+    return value
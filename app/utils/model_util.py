@@ -1,9 +1,13 @@
-from typing import Type, List
+from functools import lru_cache
+from typing import Type, List, Optional, Dict, Tuple
 
 from pydantic import BaseModel
+from sqlalchemy import UniqueConstraint
 from sqlalchemy.orm import Mapper, RelationshipProperty
 from sqlmodel import SQLModel, inspect
 
+from app.exceptions import ParamValidationError
+
 
 def get_primary_key(model: Type[SQLModel]) -> str:
     mapper: Mapper = inspect(model).mapper
@@ -15,6 +19,80 @@ def get_primary_keys(model: Type[SQLModel]):
     return [column.name for column in mapper.primary_key]
 
 
+def parse_pk(model: Type[SQLModel], pk: str) -> tuple:
+    """解析字符串形式的主键为主键元组，联合主键多个值以`,`分隔，整数主键转换为int"""
+    pk_columns = list(inspect(model).mapper.primary_key)
+    parts = pk.split(",") if len(pk_columns) > 1 else [pk]
+    if len(parts) != len(pk_columns):
+        raise ParamValidationError(f"主键 `{pk}` 应包含{len(pk_columns)}个值")
+    ident = []
+    for column, part in zip(pk_columns, parts):
+        try:
+            is_int = column.type.python_type is int
+        except NotImplementedError:
+            is_int = False
+        try:
+            ident.append(int(part) if is_int else part)
+        except ValueError:
+            raise ParamValidationError(f"主键 `{column.name}` 的值 `{part}` 不是整数")
+    return tuple(ident)
+
+
+@lru_cache
+def get_version_column(model: Type[SQLModel]) -> Optional[str]:
+    """乐观锁版本列，列的 info 中声明 version=True，如：
+
+    `version: int = Field(default=1, sa_column_kwargs={"info": {"version": True}})`
+    """
+    for attr in inspect(model).column_attrs:
+        if attr.columns[0].info.get("version"):
+            return attr.key
+    return None
+
+
+@lru_cache
+def get_indexes(model: Type[SQLModel]) -> Dict[str, Tuple[str, ...]]:
+    """模型声明的索引，索引名 -> 字段名元组（按索引列顺序），包括主键、唯一约束和外键列（InnoDB 自动为外键建索引）"""
+    mapper: Mapper = inspect(model).mapper
+    table = model.__table__
+
+    def keys(columns) -> Tuple[str, ...]:
+        return tuple(mapper.get_property_by_column(column).key for column in columns)
+
+    indexes = {"PRIMARY": keys(table.primary_key.columns)}
+    for index in table.indexes:
+        if index.columns:
+            indexes[index.name] = keys(index.columns)
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.columns:
+            columns = keys(constraint.columns)
+            indexes[constraint.name or f"uniq_{'_'.join(columns)}"] = columns
+    for foreign_key in table.foreign_keys:
+        (key,) = keys([foreign_key.parent])
+        if not any(columns[0] == key for columns in indexes.values()):
+            indexes[f"fk_{key}"] = (key,)
+    return indexes
+
+
+@lru_cache
+def get_unique_keys(model: Type[SQLModel]) -> List[Tuple[str, ...]]:
+    """模型声明的唯一键（主键、唯一索引、唯一约束），字段名元组"""
+    mapper: Mapper = inspect(model).mapper
+    table = model.__table__
+
+    def keys(columns) -> Tuple[str, ...]:
+        return tuple(mapper.get_property_by_column(column).key for column in columns)
+
+    unique_keys = [keys(table.primary_key.columns)]
+    for index in table.indexes:
+        if index.unique and index.columns:
+            unique_keys.append(keys(index.columns))
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.columns:
+            unique_keys.append(keys(constraint.columns))
+    return list(dict.fromkeys(unique_keys))
+
+
 def get_relationship_fields(model: SQLModel) -> List[str]:
     relationship_fields = []
     for field_name, field in model.__mapper__.relationships.items():
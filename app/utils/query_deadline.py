@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import Request
+
+from app.config import config
+from app.context import query_timeout_context
+from app.core.db import kill_queries
+from app.exceptions import QueryTimeout, QueryCancelled, ParamValidationError
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+QUERY_TIMEOUT_HEADER = "X-Query-Timeout"
+# 客户端时限比 MAX_EXECUTION_TIME 多留的时间（秒），优先由服务端中止查询，连接可继续使用
+GRACE_PERIOD = 1
+# MySQL/TiDB 查询超过 MAX_EXECUTION_TIME 被中止的错误码
+ER_QUERY_TIMEOUT = 3024
+
+
+def get_request_timeout(request: Request, default: int) -> int:
+    """请求的查询时限（秒），请求头 X-Query-Timeout 优先于路由的默认值"""
+    value = request.headers.get(QUERY_TIMEOUT_HEADER)
+    if value is None:
+        return default
+    try:
+        timeout = int(value)
+    except ValueError:
+        raise ParamValidationError(f"请求头 {QUERY_TIMEOUT_HEADER} 应为整数秒")
+    if not 0 < timeout <= config.db.max_query_timeout:
+        raise ParamValidationError(f"请求头 {QUERY_TIMEOUT_HEADER} 的取值范围为 1~{config.db.max_query_timeout}")
+    return timeout
+
+
+async def run_with_deadline(
+    request: Request, session: AsyncSession, timeout: int, func: Callable[[], Awaitable[R]]
+) -> R:
+    """在查询时限内执行查询
+
+    查询语句带 MAX_EXECUTION_TIME 提示由服务端中止；服务端未中止（如非 SELECT、数据库不支持）时到期在客户端取消。
+    客户端断开时同样取消。取消时先 KILL QUERY 终止服务端查询，再作废会话的连接，释放连接池占用。
+    """
+    if not timeout:
+        return await func()
+    connection_ids = session.info.setdefault("connection_ids", set())
+    token = query_timeout_context.set(timeout)
+    try:
+        task = asyncio.create_task(func())
+    finally:
+        query_timeout_context.reset(token)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout + GRACE_PERIOD
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                error = QueryTimeout(f"查询超过时限 {timeout} 秒")
+                break
+            done, _ = await asyncio.wait({task}, timeout=min(remaining, config.db.disconnect_check_interval))
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                error = QueryCancelled()
+                break
+    except DBAPIError as e:
+        if e.orig is not None and e.orig.args and e.orig.args[0] == ER_QUERY_TIMEOUT:
+            raise QueryTimeout(f"查询超过时限 {timeout} 秒") from e
+        raise
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    logger.warning(f"{error.message}，终止查询: {request.method} {request.url.path}")
+    await kill_queries(session.bind, connection_ids)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    # 中途取消的连接状态不确定，作废而不归还连接池
+    await session.invalidate()
+    raise error
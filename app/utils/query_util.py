@@ -1,63 +1,136 @@
+import base64
+import binascii
+import hashlib
+import json
 import re
+from datetime import datetime, date
+from decimal import Decimal
+from functools import lru_cache
+from itertools import count
 from typing import Type, Dict, Any, List, Tuple
 
-from sqlalchemy import ColumnElement
-from sqlalchemy.orm import Relationship
+from pydantic_core import to_jsonable_python
+from sqlalchemy import ColumnElement, tuple_, bindparam
+from sqlalchemy.orm import Relationship, InstrumentedAttribute
 from sqlmodel import SQLModel, func
 
 from app.exceptions import ParamValidationError
-from app.schemas.query import CommonQuery, TEMP_QUERY_FIELDS, SortOrder
+from app.schemas.query import CommonQuery, TEMP_QUERY_FIELDS, SortOrder, Condition, LogicCondition, Operator
+from app.utils.model_util import get_primary_keys
 from app.utils.string_util import split_comma_separated
 
 PATTERN = re.compile(r"^(?P<field>\w+)__(?P<op>in|not_in|lt|gt|le|ge|json_contains)$")
 
 
-def extract_query_params(query: CommonQuery):
-    return query.model_dump(exclude_none=True, exclude=set(CommonQuery.model_fields) | TEMP_QUERY_FIELDS)
+@lru_cache(maxsize=None)
+def get_filter_names(schema_query: Type[CommonQuery]) -> Tuple[str, ...]:
+    """查询模型中的过滤参数名（排除分页、排序等通用参数和临时参数）"""
+    return tuple(
+        name
+        for name in schema_query.model_fields
+        if name not in CommonQuery.model_fields and name not in TEMP_QUERY_FIELDS
+    )
+
+
+def extract_query_params(query: CommonQuery) -> Dict[str, Any]:
+    return {name: value for name in get_filter_names(type(query)) if (value := getattr(query, name)) is not None}
+
+
+@lru_cache(maxsize=4096)
+def resolve_filter(model: Type[SQLModel], name: str) -> Tuple[str, str]:
+    """解析过滤参数名为 (字段名, 操作符)，如 create_time__ge -> (create_time, ge)，解析结果按模型缓存"""
+    if hasattr(model, name):
+        return name, "eq"
+    match = PATTERN.match(name)
+    if not match:
+        raise ParamValidationError(f"字段不存在或不支持的查询条件: {name}")
+    field_name = match.group("field")
+    if not hasattr(model, field_name):
+        raise ParamValidationError(f"字段不存在: {name}")
+    return field_name, match.group("op")
+
+
+def check_filter_params(model: Type[SQLModel], schema_query: Type[CommonQuery]):
+    """检查查询模型的过滤参数都能映射到数据模型的字段，注册路由时调用，在启动阶段暴露问题，同时预热 resolve_filter 缓存"""
+    for name in get_filter_names(schema_query):
+        try:
+            resolve_filter(model, name)
+        except ParamValidationError as e:
+            raise ValueError(f"{schema_query.__name__}.{name} 无法映射到 {model.__name__} 的字段: {e.message}")
 
 
 def build_conditions(model: Type[SQLModel], query_params: Dict[str, Any] = None) -> List[ColumnElement[bool]]:
+    shape, values = flatten_query_params(model, query_params)
+    return build_conditions_from_shape(model, shape, values)
+
+
+def flatten_query_params(model: Type[SQLModel], query_params: Dict[str, Any] = None) -> Tuple[tuple, List[Any]]:
+    """拆分查询参数为形状 ((字段, 操作符), ...) 和参数值，形状相同的查询可复用同一SQL表达式"""
     if not query_params:
-        return []
-    conditions = []
+        return (), []
+    shape = []
+    values = []
     for field, value in query_params.items():
-        if hasattr(model, field):
-            conditions.append(getattr(model, field) == value)
-            continue
-        match = PATTERN.match(field)
-        if not match:
-            raise ParamValidationError(f"字段不存在或不支持的查询条件: {field}")
-        field_name = match.group("field")
-        op = match.group("op")
-        if not hasattr(model, field_name):
-            raise ParamValidationError(f"字段不存在: {field}")
-        field_attr = getattr(model, field_name)
+        field_name, op = resolve_filter(model, field)
         match op:
-            case "in":
+            case "eq" if value is None:
+                op = "is_null"
+            case "in" | "not_in":
                 if isinstance(value, str):
                     value = split_comma_separated(value)
-                if len(value) == 1:
+                if op == "in" and len(value) == 1:
                     # tidb in 单值可能查不到
-                    conditions.append(field_attr == value[0])
-                else:
-                    conditions.append(field_attr.in_(value))
+                    op, value = "eq", value[0]
+            case "json_contains":
+                value = f'"{value}"'
+        shape.append((field_name, op))
+        if op != "is_null":
+            values.append(value)
+    return tuple(shape), values
+
+
+def build_conditions_from_shape(
+    model: Type[SQLModel], shape: tuple, values: List[Any] = None, prefix: str = "q"
+) -> List[ColumnElement[bool]]:
+    """由查询参数形状构造条件，values 为空时生成不带值的命名参数 `{prefix}{序号}`，供缓存复用"""
+    conditions = []
+    indexes = count()
+
+    def bind(expanding: bool = False):
+        index = next(indexes)
+        if values is None:
+            return bindparam(f"{prefix}{index}", expanding=expanding)
+        return bindparam(f"{prefix}{index}", values[index], expanding=expanding, unique=True)
+
+    for field_name, op in shape:
+        field_attr = getattr(model, field_name)
+        match op:
+            case "is_null":
+                conditions.append(field_attr.is_(None))
+            case "eq":
+                conditions.append(field_attr == bind())
+            case "in":
+                conditions.append(field_attr.in_(bind(expanding=True)))
             case "not_in":
-                if isinstance(value, str):
-                    value = split_comma_separated(value)
-                conditions.append(~field_attr.in_(value))
+                conditions.append(~field_attr.in_(bind(expanding=True)))
             case "lt":
-                conditions.append(field_attr < value)
+                conditions.append(field_attr < bind())
             case "gt":
-                conditions.append(field_attr > value)
+                conditions.append(field_attr > bind())
             case "le":
-                conditions.append(field_attr <= value)
+                conditions.append(field_attr <= bind())
             case "ge":
-                conditions.append(field_attr >= value)
+                conditions.append(field_attr >= bind())
             case "json_contains":
-                conditions.append(func.json_contains(field_attr, f'"{value}"'))
+                conditions.append(func.json_contains(field_attr, bind()))
     return conditions
 
 
+def make_params(prefix: str, values: List[Any]) -> Dict[str, Any]:
+    """按命名规则 `{prefix}{序号}` 生成参数字典"""
+    return {f"{prefix}{index}": value for index, value in enumerate(values)}
+
+
 def format_sort(model: Type[SQLModel], sort_by: str, sort_order: SortOrder) -> list:
     """格式化排序条件"""
     if not sort_by:
@@ -74,7 +147,8 @@ def format_sort(model: Type[SQLModel], sort_by: str, sort_order: SortOrder) -> l
     return sort_columns
 
 
-def format_fields(model: Type[SQLModel], fields: List[str] | str) -> Tuple[list, list]:
+def format_fields(model: Type[SQLModel], fields: List[str] | str, strict: bool = False) -> Tuple[list, list]:
+    """拆分字段为普通列和关系字段，不存在的字段忽略；strict 为 True 时抛出 ParamValidationError"""
     if not fields:
         return [], []
     if isinstance(fields, str):
@@ -82,10 +156,115 @@ def format_fields(model: Type[SQLModel], fields: List[str] | str) -> Tuple[list,
     select_columns = []
     relation_columns = []
     for field in fields:
-        if hasattr(model, field):
-            field_attr = getattr(model, field)
-            if isinstance(field_attr.property, Relationship):
-                relation_columns.append(field_attr)
-            else:
-                select_columns.append(field_attr)
+        field_attr = getattr(model, field, None) if field else None
+        if not isinstance(field_attr, InstrumentedAttribute):
+            if strict:
+                raise ParamValidationError(f"Invalid field: {field}")
+            continue
+        if isinstance(field_attr.property, Relationship):
+            relation_columns.append(field_attr)
+        else:
+            select_columns.append(field_attr)
     return select_columns, relation_columns
+
+
+def format_keyset(model: Type[SQLModel], sort_by: str) -> List[InstrumentedAttribute]:
+    """游标分页的排序键：排序字段 + 主键，保证排序唯一
+
+    seek 条件的比较会跳过排序字段为 NULL 的记录，不支持可为空的排序字段
+    """
+    keyset_columns = []
+    for field in split_comma_separated(sort_by):
+        column = getattr(model, field, None)
+        if not column:
+            raise ParamValidationError(f"Invalid sort_by field: {field}")
+        if any(c.nullable for c in getattr(column.property, "columns", ())):
+            raise ParamValidationError(f"游标分页不支持可为空的排序字段: {field}")
+        keyset_columns.append(column)
+    keyset_keys = {column.key for column in keyset_columns}
+    for pk in get_primary_keys(model):
+        if pk not in keyset_keys:
+            keyset_columns.append(getattr(model, pk))
+    return keyset_columns
+
+
+def build_keyset_condition(
+    columns: List[InstrumentedAttribute], values: List[Any] | None, sort_order: SortOrder, prefix: str = "k"
+) -> ColumnElement[bool]:
+    """构造 (sort_col, pk) > (...) 形式的 seek 条件，排序字段需非空（NULL 不参与比较，会被跳过）
+
+    values 为空时生成不带值的命名参数 `{prefix}{序号}`，供缓存复用
+    """
+    if values is None:
+        binds = [bindparam(f"{prefix}{i}", type_=column.type) for i, column in enumerate(columns)]
+    else:
+        binds = [
+            bindparam(f"{prefix}{i}", v, type_=c.type, unique=True) for i, (c, v) in enumerate(zip(columns, values))
+        ]
+    if len(columns) == 1:
+        left, right = columns[0], binds[0]
+    else:
+        left, right = tuple_(*columns), tuple_(*binds)
+    if sort_order is SortOrder.DESC:
+        return left < right
+    return left > right
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """将排序键的值编码为不透明游标"""
+    raw = json.dumps(to_jsonable_python(values), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, columns: List[InstrumentedAttribute]) -> List[Any]:
+    """解码游标并按字段类型还原排序键的值"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ParamValidationError(f"无效的游标: {cursor}")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ParamValidationError(f"游标与排序字段不匹配: {cursor}")
+    return [_coerce_cursor_value(column, value) for column, value in zip(columns, values)]
+
+
+def _coerce_cursor_value(column: InstrumentedAttribute, value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type is date:
+            return date.fromisoformat(value)
+        if python_type is Decimal:
+            return Decimal(value)
+    except (ValueError, ArithmeticError):
+        raise ParamValidationError(f"无效的游标值: {value}")
+    return value
+
+
+def normalize_condition(cond: LogicCondition | Condition | None) -> Any:
+    """条件树规范化：同层条件与多值列表排序，使语义相同的条件得到相同结果"""
+    if cond is None:
+        return None
+    if isinstance(cond, Condition):
+        value = cond.value
+        if cond.operator in (Operator.IN, Operator.NOT_IN) and isinstance(value, list):
+            value = sorted(value, key=str)
+        return {"field": cond.field, "operator": cond.operator.value, "value": value}
+    normalized = {}
+    for key in ("and_", "or_"):
+        sub_conds = [normalize_condition(c) for c in getattr(cond, key) or []]
+        sub_conds = [c for c in sub_conds if c]
+        if sub_conds:
+            normalized[key] = sorted(sub_conds, key=make_digest)
+    return normalized
+
+
+def make_digest(data: Any) -> str:
+    """计算数据的稳定摘要"""
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=to_jsonable_python)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,60 @@
+from typing import Type, Dict, Any, Optional, get_args
+
+import orjson
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
+from sqlmodel import SQLModel, inspect
+
+from app.utils.model_util import get_relationship_fields
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=to_jsonable_python, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONRenderer:
+    """快速响应序列化：路由构建时校验一次响应模型，请求时直接用 orjson 输出，不再按 response_model 校验
+
+    响应模型需与数据库模型字段一致（不使用别名和自定义序列化器），
+    数据库模型中有而响应模型中没有的字段在输出时过滤，与 response_model 的效果一致。
+    """
+
+    def __init__(self, model: Type[SQLModel], schema_response: Type[BaseModel]):
+        self.check_schema(schema_response)
+        self.fields = set(schema_response.model_fields)
+        model_fields = {attr.key for attr in inspect(model).column_attrs} | set(get_relationship_fields(model))
+        for relation in set(get_relationship_fields(model)) & self.fields:
+            self.check_relation(model, relation, schema_response)
+        # 响应模型包含数据库模型的全部字段时无需逐条过滤
+        self.need_filter = not model_fields <= self.fields
+
+    @staticmethod
+    def check_schema(schema: Type[BaseModel]):
+        decorators = schema.__pydantic_decorators__
+        if decorators.field_serializers or decorators.model_serializers or decorators.computed_fields:
+            raise ValueError(f"响应模型 {schema.__name__} 含有自定义序列化，不能使用快速响应")
+        for name, field in schema.model_fields.items():
+            if field.alias or field.serialization_alias:
+                raise ValueError(f"响应模型 {schema.__name__} 的字段 {name} 使用了别名，不能使用快速响应")
+
+    def check_relation(self, model: Type[SQLModel], relation: str, schema_response: Type[BaseModel]):
+        related_model = getattr(model, relation).property.mapper.class_
+        annotation = schema_response.model_fields[relation].annotation
+        related_schemas = [arg for arg in (annotation, *get_args(annotation)) if isinstance(arg, type)]
+        related_schema = next((arg for arg in related_schemas if issubclass(arg, BaseModel)), None)
+        if related_schema is None:
+            return
+        self.check_schema(related_schema)
+        related_columns = {attr.key for attr in inspect(related_model).column_attrs}
+        if not related_columns <= set(related_schema.model_fields):
+            raise ValueError(
+                f"响应模型 {schema_response.__name__} 的关系字段 {relation} 未包含 {related_model.__name__} 的全部字段"
+            )
+
+    def filter(self, item: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if item is None or not self.need_filter:
+            return item
+        return {key: value for key, value in item.items() if key in self.fields}
+
+    def render(self, data: Any) -> bytes:
+        return dumps({"code": 200, "message": "", "data": data})
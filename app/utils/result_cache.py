@@ -0,0 +1,56 @@
+import logging
+from typing import Optional, Tuple, Set
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.db import after_commit
+from app.utils.cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _raw(value):
+    """缓存值已是JSON文本，跳过序列化器"""
+    return value
+
+
+class ResultCache:
+    """查询结果缓存，缓存序列化后的响应JSON
+
+    缓存键带有模型的代数（generation），写操作提交后代数加一，旧代数的缓存不再被读取，随过期时间淘汰。
+    """
+
+    def __init__(self, name: str, ttl: int):
+        self.name = name
+        self.ttl = ttl
+        self.prefix = f"result:{name}:"
+        self.generation_key = f"result_gen:{name}"
+
+    async def make_key(self, digest: str) -> str:
+        generation = await redis_cache.get(self.generation_key) or 0
+        return f"{self.prefix}{generation}:{digest}"
+
+    async def get(self, digest: str) -> Tuple[Optional[str], Optional[str]]:
+        """返回 (缓存键, 缓存值)，Redis 不可用时均为None"""
+        try:
+            key = await self.make_key(digest)
+            return key, await redis_cache.get(key, loads_fn=_raw)
+        except Exception as e:
+            logger.warning(f"读取结果缓存失败: {e}")
+            return None, None
+
+    async def set(self, key: str, body: str):
+        try:
+            await redis_cache.set(key, body, ttl=self.ttl, dumps_fn=_raw)
+        except Exception as e:
+            logger.warning(f"写入结果缓存失败: {e}")
+
+    async def bump(self):
+        await redis_cache.increment(self.generation_key)
+
+    def mark_dirty(self, session: AsyncSession):
+        """标记会话写入了该模型，提交后代数加一（同一会话只加一次）"""
+        dirty: Set[str] = session.info.setdefault("result_cache_dirty", set())
+        if self.name not in dirty:
+            dirty.add(self.name)
+            after_commit(session, self.bump)
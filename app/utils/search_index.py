@@ -0,0 +1,175 @@
+import logging
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Sequence, Tuple, Type
+
+from sqlmodel import SQLModel
+
+from app.config import config
+from app.exceptions import ParamValidationError
+from app.schemas.query import Condition, LogicCondition, Operator, SortOrder
+from app.utils.es_util import get_es, scan_pit, DEFAULT_CLUSTER
+from app.utils.model_util import get_primary_keys, parse_pk
+from app.utils.string_util import split_comma_separated
+
+logger = logging.getLogger(__name__)
+
+RANGE_OPERATORS = {Operator.LT: "lt", Operator.GT: "gt", Operator.LE: "lte", Operator.GE: "gte"}
+
+
+class SearchIndex:
+    """模型的ES检索索引，/query 中的模糊匹配（like）条件先在ES中检索出候选主键，MySQL 在候选主键内执行原条件
+
+    只下推与其余条件 AND 组合、且全部由模糊匹配组成的子条件；ES只用于缩小范围，原 LIKE 条件仍在 MySQL 中执行，
+    结果不会多于原条件，排序、分页、计数仍由 MySQL 执行。命中数超过 max_hits 或ES不可用时回退为 MySQL 的 LIKE 查询。
+    召回受限于ES：增量同步的延迟内新增或修改的记录、分词后短语匹配不到的子串（如 match_phrase 不能匹配半个词）会被漏掉，
+    要求结果完整的查询不应配置检索索引。
+    文档 _id 为记录主键，不支持联合主键的模型。
+    """
+
+    def __init__(
+        self,
+        index: str,
+        fields: Dict[str, str] | Sequence[str],
+        query_type: Literal["match_phrase", "wildcard"] = "match_phrase",
+        max_hits: int = None,
+        cluster: str = DEFAULT_CLUSTER,
+    ):
+        """
+        :param index: 索引名或别名
+        :param fields: 可在ES中检索的字段，模型字段名 -> ES字段名，字段名相同时可传列表
+        :param query_type: 模糊匹配的ES查询方式，match_phrase 适用于分词的 text 字段，wildcard 适用于 keyword 字段
+        :param max_hits: 主键数量上限，默认 config.es.prefilter_max_hits
+        :param cluster: ES集群名称
+        """
+        self.index = index
+        self.fields = dict(fields) if isinstance(fields, dict) else {field: field for field in fields}
+        self.query_type = query_type
+        self.max_hits = max_hits or config.es.prefilter_max_hits
+        self.cluster = cluster
+
+    def is_searchable(self, cond: LogicCondition | Condition) -> bool:
+        """条件树是否全部由可在ES中检索的模糊匹配组成"""
+        if isinstance(cond, Condition):
+            return cond.operator is Operator.LIKE and cond.field in self.fields and cond.value is not None
+        sub_conds = (cond.and_ or []) + (cond.or_ or [])
+        return bool(sub_conds) and all(self.is_searchable(sub_cond) for sub_cond in sub_conds)
+
+    def split(
+        self, condition: LogicCondition | Condition | None
+    ) -> Tuple[List[LogicCondition | Condition], LogicCondition | Condition | None]:
+        """拆分条件为 (在ES中检索的子条件, 在 MySQL 中执行的剩余条件)，两部分以 AND 组合"""
+        if condition is None:
+            return [], None
+        if self.is_searchable(condition):
+            return [condition], None
+        if isinstance(condition, Condition):
+            return [], condition
+        searched, rest = [], []
+        for sub_cond in condition.and_ or []:
+            (searched if self.is_searchable(sub_cond) else rest).append(sub_cond)
+        or_ = condition.or_
+        if or_ and self.is_searchable(LogicCondition(or_=or_)):
+            searched.append(LogicCondition(or_=or_))
+            or_ = None
+        if not searched:
+            return [], condition
+        if not rest and not or_:
+            return searched, None
+        return searched, LogicCondition(and_=rest or None, or_=or_)
+
+    def to_es_query(self, cond: LogicCondition | Condition) -> Dict[str, Any]:
+        """转换条件树为ES查询，模糊匹配使用 fields 中的ES字段，其他条件使用同名字段（keyword、数值、日期类型）"""
+        if isinstance(cond, Condition):
+            return self._to_es_single(cond)
+        bool_query: Dict[str, Any] = {"filter": [self.to_es_query(sub_cond) for sub_cond in cond.and_ or []]}
+        if cond.or_:
+            bool_query["should"] = [self.to_es_query(sub_cond) for sub_cond in cond.or_]
+            bool_query["minimum_should_match"] = 1
+        return {"bool": bool_query}
+
+    def _to_es_single(self, cond: Condition) -> Dict[str, Any]:
+        field, value = cond.field, cond.value
+        match cond.operator:
+            case Operator.LIKE:
+                es_field = self.fields.get(field, field)
+                if self.query_type == "wildcard":
+                    value = str(value).replace("\\", "\\\\").replace("*", "\\*").replace("?", "\\?")
+                    return {"wildcard": {es_field: {"value": f"*{value}*", "case_insensitive": True}}}
+                return {"match_phrase": {es_field: value}}
+            case Operator.EQ if value is None:
+                return {"bool": {"must_not": [{"exists": {"field": field}}]}}
+            case Operator.NE if value is None:
+                return {"exists": {"field": field}}
+            case Operator.EQ | Operator.JSON_CONTAINS:
+                return {"term": {field: value}}
+            case Operator.NE:
+                return {"bool": {"must_not": [{"term": {field: value}}]}}
+            case Operator.IN | Operator.NOT_IN:
+                terms = {"terms": {field: value if isinstance(value, (list, tuple, set)) else [value]}}
+                return terms if cond.operator is Operator.IN else {"bool": {"must_not": [terms]}}
+        return {"range": {field: {RANGE_OPERATORS[cond.operator]: value}}}
+
+    def scan(
+        self,
+        condition: LogicCondition | Condition | None,
+        fields: List[str],
+        sort_by: str = None,
+        sort_order: SortOrder = SortOrder.ASC,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """以 PIT + search_after 遍历索引中符合条件的文档，按批返回 _source 中的 fields 字段
+
+        ES查询在调用时构造，遍历在迭代时开始。
+        """
+        batches = scan_pit(
+            self.index,
+            query=None if condition is None else self.to_es_query(condition),
+            sort=[{field: sort_order.value} for field in split_comma_separated(sort_by)] if sort_by else None,
+            source=fields,
+            cluster=self.cluster,
+        )
+        return self._pick_fields(batches, fields)
+
+    @staticmethod
+    async def _pick_fields(
+        batches: AsyncIterator[List[dict]], fields: List[str]
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        async for hits in batches:
+            yield [{field: hit.get("_source", {}).get(field) for field in fields} for hit in hits]
+
+    async def search_ids(self, conds: List[LogicCondition | Condition]) -> Optional[List[str]]:
+        """在ES中检索匹配的文档ID，超过 max_hits 时返回None"""
+        response = await get_es(self.cluster).search(
+            index=self.index,
+            query={"bool": {"filter": [self.to_es_query(cond) for cond in conds]}},
+            size=self.max_hits,
+            track_total_hits=self.max_hits + 1,
+            source=False,
+            request_timeout=config.es.timeout,
+        )
+        hits = response["hits"]
+        if hits["total"]["value"] > self.max_hits:
+            return None
+        return [hit["_id"] for hit in hits["hits"]]
+
+    async def prefilter(
+        self, model: Type[SQLModel], condition: LogicCondition | Condition | None
+    ) -> LogicCondition | Condition | None:
+        """在原条件前加上ES检索出的主键 IN 条件，不能下推或需要回退时原样返回"""
+        pk_names = get_primary_keys(model)
+        searched, rest = self.split(condition)
+        if not searched or len(pk_names) != 1:
+            return condition
+        try:
+            ids = await self.search_ids(searched)
+        except Exception as e:
+            logger.warning(f"ES检索 {self.index} 失败，回退为数据库模糊查询: {e}")
+            return condition
+        if ids is None:
+            logger.info(f"ES检索 {self.index} 命中超过 {self.max_hits} 条，回退为数据库模糊查询")
+            return condition
+        try:
+            pks = [parse_pk(model, _id)[0] for _id in ids]
+        except ParamValidationError:
+            logger.warning(f"ES索引 {self.index} 的文档ID不是 {model.__name__} 的主键，回退为数据库模糊查询")
+            return condition
+        pk_condition = Condition(field=pk_names[0], operator=Operator.IN, value=pks)
+        return LogicCondition(and_=[pk_condition, *searched] + ([rest] if rest is not None else []))
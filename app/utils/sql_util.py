@@ -0,0 +1,65 @@
+import logging
+from typing import List, Optional
+
+from sqlalchemy import RowMapping, Select, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.context import get_query_timeout
+
+logger = logging.getLogger(__name__)
+
+
+def apply_query_timeout(statement: Select) -> Select:
+    """按当前请求的查询时限添加 MAX_EXECUTION_TIME 提示，超时由 MySQL/TiDB 服务端中止查询（只对 SELECT 生效）"""
+    timeout = get_query_timeout()
+    if not timeout:
+        return statement
+    return statement.prefix_with(f"/*+ MAX_EXECUTION_TIME({timeout * 1000}) */", dialect="mysql")
+
+
+async def explain(session: AsyncSession, statement: Select) -> List[RowMapping]:
+    """获取语句的执行计划"""
+    bind = session.bind
+    compiled = statement.compile(dialect=bind.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup or [])
+    connection = await session.connection()
+    result = await connection.exec_driver_sql(f"EXPLAIN {compiled.string}", params)
+    return result.mappings().all()
+
+
+def estimate_rows(plan: List[RowMapping]) -> Optional[int]:
+    """从执行计划中取行数估算，未走索引时估算不可信，返回None
+
+    兼容 MySQL（rows/filtered/key 列）和 TiDB（estRows/id 列）的 EXPLAIN 输出
+    """
+    if not plan:
+        return None
+    first = plan[0]
+    if "estRows" in first:
+        if any(str(row["id"]).lstrip("├└─│ ").startswith("TableFullScan") for row in plan):
+            return None
+        return int(float(first["estRows"]))
+    if first.get("key") is None or first.get("rows") is None:
+        return None
+    filtered = float(first.get("filtered") or 100)
+    return int(first["rows"] * filtered / 100)
+
+
+def is_full_scan(plan: List[RowMapping]) -> bool:
+    """执行计划中是否有全表扫描（MySQL type=ALL，TiDB TableFullScan）"""
+    for row in plan:
+        if "estRows" in row:
+            if str(row["id"]).lstrip("├└─│ ").startswith("TableFullScan"):
+                return True
+        elif row.get("type") == "ALL":
+            return True
+    return False
+
+
+async def get_table_rows(session: AsyncSession, table_name: str) -> Optional[int]:
+    """从 information_schema 读取表行数统计值（InnoDB 为估算值）"""
+    statement = text(
+        "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name"
+    )
+    result = await session.exec(statement, params={"table_name": table_name})
+    return result.scalar_one_or_none()
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, TypeVar
+
+from app.config import config
+
+T = TypeVar("T")
+
+
+class StatementCache:
+    """按查询形状缓存已构造的SQL语句（LRU），命中时只需绑定参数值"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get_or_build(self, key: Hashable, builder: Callable[[], T]) -> T:
+        value = self.get(key)
+        if value is None:
+            value = builder()
+            self.set(key, value)
+        return value
+
+    def get(self, key: Hashable) -> Any:
+        """未命中返回None"""
+        try:
+            value = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._cache.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+statement_cache = StatementCache(maxsize=config.db.statement_cache_size)
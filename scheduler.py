@@ -1,3 +1,4 @@
+import asyncio
 import logging.config
 import os
 import time
@@ -6,6 +7,7 @@ from apscheduler.executors.pool import ProcessPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 
 from app.core.log import LOGGING_CONFIG
+from scripts.es_reindex import run_reindex
 
 logging.config.dictConfig(LOGGING_CONFIG)
 
@@ -26,11 +28,17 @@ def scheduler_test2():
     logger.warning("test2 end")
 
 
+def es_reindex_job(alias: str, **kwargs):
+    """ES索引蓝绿重建，参数见 scripts.es_reindex.reindex"""
+    asyncio.run(run_reindex(alias=alias, **kwargs))
+
+
 def start_scheduler():
     scheduler = BlockingScheduler(executors={"default": ProcessPoolExecutor(os.cpu_count())})
 
     # scheduler.add_job(scheduler_test, "interval", seconds=10)
     # scheduler.add_job(scheduler_test2, "interval", seconds=10)
+    # scheduler.add_job(es_reindex_job, "cron", hour=3, args=["hero"], kwargs={"requests_per_second": 20000})
     try:
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
@@ -4,13 +4,15 @@ import signal
 import sys
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-# from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 from app.core.log import LOGGING_CONFIG
 from app.config import config
 
 
 from app.core.nacos.registry import ServiceRegistry
+from app.task.es_sync import ESSyncTask
+from app.utils.es_util import es_clients
 
 logging.config.dictConfig(LOGGING_CONFIG)
 
@@ -18,6 +20,9 @@ logger = logging.getLogger(__name__)
 
 """异步任务定时调度，基于asyncio，适合I/O密集型任务。"""
 
+# MySQL 到ES的增量同步任务，如 ESSyncTask(Hero, HeroPublic, index="hero")
+ES_SYNC_TASKS: list[ESSyncTask] = []
+
 
 def scheduler_task(scheduler: AsyncIOScheduler):
     """添加调度任务"""
@@ -28,6 +33,14 @@ def scheduler_task(scheduler: AsyncIOScheduler):
     #     misfire_grace_time=30,  # 如果错过了执行时间，最多延迟30秒执行
     #     coalesce=True,  # 合并错过的执行
     # )
+    for task in ES_SYNC_TASKS:
+        scheduler.add_job(
+            task.run,
+            IntervalTrigger(seconds=config.es.sync_interval),
+            id=task.watermark_key,
+            max_instances=1,  # 上一轮未结束时跳过，同一索引不并发同步
+            coalesce=True,
+        )
 
 
 async def main():
@@ -52,6 +65,7 @@ async def main():
             await stop_event.wait()
         finally:
             scheduler.shutdown()
+            await es_clients.close()
 
 
 if __name__ == "__main__":
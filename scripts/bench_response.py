@@ -0,0 +1,93 @@
+"""列表响应序列化耗时对比：FastAPI response_model 校验序列化 vs 快速响应（orjson）
+
+在项目根目录执行：python -m scripts.bench_response --rows 10000
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models.hero import Hero, Team
+from app.schemas.hero import HeroPublic
+from app.schemas.pagination import Paged
+from app.schemas.response import APIResponse
+from app.service.base import BaseService
+from app.utils.response_util import FastJSONRenderer
+
+FIELDS = "id,name,secret_name,age,intro,pets,address_info,create_time,update_time,team"
+
+
+def make_paged(rows: int) -> Paged:
+    teams = [Team(id=i, name=f"team{i}", headquarters="hq") for i in range(50)]
+    now = datetime.now()
+    items = [
+        Hero(
+            id=i,
+            name=f"name{i}",
+            secret_name=f"secret{i}",
+            age=i % 100,
+            intro="intro",
+            pets=["cat", "dog"],
+            address_info={"city": "city", "street": "street"},
+            create_time=now,
+            update_time=now,
+            team=teams[i % len(teams)],
+        )
+        for i in range(rows)
+    ]
+    return Paged[Hero](count=rows, items=items)
+
+
+async def fastapi_render(data: dict) -> bytes:
+    field = create_model_field("response", APIResponse[Paged[HeroPublic]])
+    content = await serialize_response(
+        field=field, response_content=APIResponse(code=200, message="", data=data), exclude_unset=True
+    )
+    return JSONResponse(content).body
+
+
+def fast_render(renderer: FastJSONRenderer, data: dict) -> bytes:
+    if renderer.need_filter:
+        data["items"] = [renderer.filter(item) for item in data["items"]]
+    return renderer.render(data)
+
+
+def measure(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        func()
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    service = BaseService(Hero)
+    renderer = FastJSONRenderer(Hero, HeroPublic)
+    paged = make_paged(args.rows)
+    dump = lambda: service._dump_paged_data(paged, FIELDS)  # noqa: E731
+
+    dump_time = measure(dump, args.repeat)
+    before = measure(lambda: asyncio.run(fastapi_render(dump())), args.repeat) - dump_time
+    after = measure(lambda: fast_render(renderer, dump()), args.repeat) - dump_time
+    assert len(asyncio.run(fastapi_render(dump()))) == len(fast_render(renderer, dump()))
+
+    per_10k = 10000 / args.rows
+    print(f"rows={args.rows}，以下为每1万行的CPU时间")
+    print(f"  _dump_paged_data:        {dump_time * per_10k * 1000:8.1f} ms")
+    print(f"  response_model 序列化:   {before * per_10k * 1000:8.1f} ms")
+    print(f"  快速响应(orjson)序列化:  {after * per_10k * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
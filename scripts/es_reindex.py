@@ -0,0 +1,209 @@
+"""ES索引蓝绿重建：新建带版本号的索引，以 _reindex 分片并行复制数据，校验数量后原子切换别名
+
+适用于修改 mapping、分词器或分片数。读写均通过别名访问索引（如 SearchIndex、ESSyncTask 使用别名），切换对调用方透明。
+复制期间写入旧索引的数据不会复制到新索引，切换后需让增量同步从复制开始时间重新同步（见 ESSyncTask.set_watermark）。
+
+在项目根目录执行：python -m scripts.es_reindex hero --body hero_index.json --requests-per-second 20000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from elasticsearch import NotFoundError
+
+from app.utils.es_util import get_es, es_clients, DEFAULT_CLUSTER
+
+logger = logging.getLogger(__name__)
+
+# 从旧索引复制的索引设置，其余为 uuid、creation_date 等只读或自动生成的设置
+COPIED_SETTINGS = (
+    "number_of_shards",
+    "number_of_replicas",
+    "refresh_interval",
+    "max_result_window",
+    "analysis",
+    "similarity",
+    "sort",
+    "mapping",
+)
+
+
+def make_index_name(alias: str, now: datetime = None) -> str:
+    """带版本号的索引名，如 hero_v20240101120000"""
+    return f"{alias}_v{(now or datetime.now()).strftime('%Y%m%d%H%M%S')}"
+
+
+def make_index_settings(source_settings: Dict[str, Any], overrides: Dict[str, Any] = None) -> Dict[str, Any]:
+    """新索引的设置：复制旧索引的可复制设置，overrides 优先"""
+    settings = {key: source_settings[key] for key in COPIED_SETTINGS if key in source_settings}
+    settings.update((overrides or {}).get("index", overrides or {}))
+    return settings
+
+
+async def get_alias_indices(alias: str, cluster: str = DEFAULT_CLUSTER) -> List[str]:
+    try:
+        response = await get_es(cluster).indices.get_alias(name=alias)
+    except NotFoundError:
+        return []
+    return list(response.body)
+
+
+async def wait_for_task(task_id: str, poll_interval: float, cluster: str = DEFAULT_CLUSTER) -> Dict[str, Any]:
+    """轮询 _reindex 任务直到完成，定期输出进度，返回任务结果；任务失败时抛出 RuntimeError"""
+    es = get_es(cluster)
+    while True:
+        response = await es.tasks.get(task_id=task_id)
+        status = response["task"]["status"]
+        done = status.get("created", 0) + status.get("updated", 0) + status.get("deleted", 0)
+        total = status.get("total") or 0
+        if response.get("completed"):
+            break
+        logger.info(f"重建索引进度 {done}/{total}（{done / total:.1%}）" if total else "重建索引等待开始")
+        await asyncio.sleep(poll_interval)
+    if error := response.get("error"):
+        raise RuntimeError(f"重建索引任务失败: {error}")
+    result = response.get("response", {})
+    if failures := result.get("failures"):
+        raise RuntimeError(f"重建索引有 {len(failures)} 条失败，如: {failures[:3]}")
+    return result
+
+
+async def reindex(
+    alias: str,
+    body: Dict[str, Any] = None,
+    source: str = None,
+    slices: int | str = "auto",
+    requests_per_second: float = -1,
+    max_count_diff: int = 0,
+    poll_interval: float = 10,
+    delete_old: bool = False,
+    cluster: str = DEFAULT_CLUSTER,
+) -> str:
+    """
+    重建别名指向的索引，返回新索引名
+
+    复制期间新索引关闭刷新、副本数为0，复制完成后恢复。数量校验失败或复制失败时删除新索引，别名不变。
+
+    :param alias: 别名，首次使用时可为已有的索引名以外的任意名称，此时需指定 source
+    :param body: 新索引的 mappings 和 settings，默认复制旧索引的
+    :param source: 源索引，默认为别名当前指向的索引
+    :param slices: _reindex 的并行切片数，auto 为每个分片一个切片
+    :param requests_per_second: 每秒复制的文档数上限，-1 表示不限
+    :param max_count_diff: 新旧索引文档数允许的差值，复制期间旧索引仍有写入时可适当放宽
+    :param delete_old: 切换别名后删除旧索引
+    """
+    es = get_es(cluster)
+    old_indices = await get_alias_indices(alias, cluster)
+    source = source or ",".join(old_indices)
+    if not source:
+        raise ValueError(f"别名 {alias} 不存在，需指定源索引")
+
+    body = body or {}
+    source_index = await es.indices.get(index=source)
+    _, source_info = next(iter(source_index.body.items()))
+    mappings = body.get("mappings") or source_info["mappings"]
+    settings = make_index_settings(source_info["settings"]["index"], body.get("settings"))
+    final_settings = {
+        "number_of_replicas": settings.get("number_of_replicas", 1),
+        "refresh_interval": settings.get("refresh_interval"),  # None 恢复为默认值
+    }
+    new_index = make_index_name(alias)
+    await es.indices.create(
+        index=new_index, mappings=mappings, settings={**settings, "number_of_replicas": 0, "refresh_interval": -1}
+    )
+    logger.info(f"创建索引 {new_index}，从 {source} 复制数据")
+
+    start = time.perf_counter()
+    task_id = None
+    try:
+        response = await es.reindex(
+            source={"index": source},
+            dest={"index": new_index},
+            slices=slices,
+            requests_per_second=requests_per_second,
+            wait_for_completion=False,
+        )
+        task_id = response["task"]
+        result = await wait_for_task(task_id, poll_interval, cluster)
+        await es.indices.put_settings(index=new_index, settings={"index": final_settings})
+        await es.indices.refresh(index=new_index)
+        source_count = (await es.count(index=source))["count"]
+        new_count = (await es.count(index=new_index))["count"]
+        if abs(source_count - new_count) > max_count_diff:
+            raise RuntimeError(f"文档数不一致: {source} {source_count}，{new_index} {new_count}")
+    except BaseException:
+        logger.error(f"重建索引失败，删除 {new_index}，别名 {alias} 不变")
+        try:
+            if task_id is not None:
+                await es.tasks.cancel(task_id=task_id)  # 中断时（如 Ctrl+C）任务仍在服务端执行，先取消
+            await es.indices.delete(index=new_index, ignore_unavailable=True)
+        except Exception as e:
+            logger.error(f"清理 {new_index} 失败，需手动删除: {e}")
+        raise
+    logger.info(
+        f"复制完成 {result.get('total')} 条，耗时 {time.perf_counter() - start:.0f} 秒，"
+        f"文档数 {source} {source_count}，{new_index} {new_count}"
+    )
+
+    # 一次请求中移除旧索引的别名并添加到新索引，切换是原子的
+    actions: List[Dict[str, Any]] = [{"remove": {"index": index, "alias": alias}} for index in old_indices]
+    actions.append({"add": {"index": new_index, "alias": alias}})
+    await es.indices.update_aliases(actions=actions)
+    logger.info(f"别名 {alias} 切换到 {new_index}，原索引: {', '.join(old_indices) or '无'}")
+    if delete_old and old_indices:
+        await es.indices.delete(index=",".join(old_indices))
+        logger.info(f"删除旧索引 {', '.join(old_indices)}")
+    return new_index
+
+
+async def run_reindex(**kwargs) -> str:
+    """在独立的事件循环中执行（CLI、调度任务），结束时关闭ES客户端"""
+    try:
+        return await reindex(**kwargs)
+    finally:
+        await es_clients.close()
+
+
+def load_body(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ES索引蓝绿重建")
+    parser.add_argument("alias", help="索引别名")
+    parser.add_argument("--body", help="新索引的 mappings、settings（JSON文件），默认复制旧索引的")
+    parser.add_argument("--source", help="源索引，默认为别名当前指向的索引")
+    parser.add_argument("--slices", default="auto", help="并行切片数，默认 auto（每个分片一个切片）")
+    parser.add_argument("--requests-per-second", type=float, default=-1, help="每秒复制的文档数上限，默认不限")
+    parser.add_argument("--max-count-diff", type=int, default=0, help="新旧索引文档数允许的差值")
+    parser.add_argument("--poll-interval", type=float, default=10, help="查询复制进度的间隔（秒）")
+    parser.add_argument("--delete-old", action="store_true", help="切换后删除旧索引")
+    parser.add_argument("--cluster", default=DEFAULT_CLUSTER, help="ES集群名称")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(
+        run_reindex(
+            alias=args.alias,
+            body=load_body(args.body),
+            source=args.source,
+            slices=int(args.slices) if args.slices.isdigit() else args.slices,
+            requests_per_second=args.requests_per_second,
+            max_count_diff=args.max_count_diff,
+            poll_interval=args.poll_interval,
+            delete_old=args.delete_old,
+            cluster=args.cluster,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from sqlalchemy import NullPool
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.deps.session import get_session
+from app.api.deps.session import get_session, get_read_session
 from app.core.db import ASYNC_DATABASE_URL
 from app.main import app
 from app.config import config
@@ -44,6 +44,7 @@ async def client(db_session: AsyncSession):
         return db_session
 
     app.dependency_overrides[get_session] = get_session_override  # 替换成测试用的会话
+    app.dependency_overrides[get_read_session] = get_session_override
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
     app.dependency_overrides.clear()
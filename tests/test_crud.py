@@ -0,0 +1,218 @@
+import asyncio
+
+import pytest
+
+from app.exceptions import QueryNotIndexed, ParamValidationError
+
+from app.config import config
+from app.crud import base as crud_module
+from app.crud.base import CRUDBase
+from app.models.hero import Hero, Team
+from app.schemas.hero import HeroQuery
+from app.utils.condition_builder import ConditionBuilder
+from app.utils.model_util import get_indexes, get_unique_keys
+from app.utils.query_util import decode_cursor, format_keyset
+from app.schemas.query import (
+    RelationLoad,
+    LoadStrategy,
+    LogicCondition,
+    Condition,
+    Operator,
+    ExportQuery,
+    ExportSource,
+)
+from app.service.base import BaseService
+from app.utils.search_index import SearchIndex
+
+
+def test_row_columns():
+    crud = CRUDBase(Hero)
+    columns, hidden_keys = crud.get_row_columns(["name", "team"])
+    assert [column.key for column in columns] == ["name", "id", "team_id"]
+    assert hidden_keys == {"team_id"}
+    columns, _ = crud.get_row_columns(["name"], sort_by="create_time", cursor_mode=False)
+    assert [column.key for column in columns] == ["name", "id", "create_time"]
+    assert CRUDBase(Team).supports_rows("heroes")
+
+
+def test_relation_loading():
+    crud = CRUDBase(Hero)
+    crud.set_relation_loading({"team": RelationLoad(strategy=LoadStrategy.JOINED, fields=["name"])})
+    columns, hidden_keys = crud.get_row_columns(["name", "team"])
+    assert [column.key for column in columns] == ["name", "id", "team__name", "team__id"]
+    assert hidden_keys == set()
+    crud.set_relation_loading({"team": RelationLoad(fields=["name"])})
+    columns, hidden_keys = crud.get_related_columns(Hero.team)
+    assert [column.key for column in columns] == ["name", "id"]
+    with pytest.raises(ValueError):
+        crud.set_relation_loading({"team": RelationLoad(fields=["secret_name"])})
+
+
+def test_not_indexed():
+    crud = CRUDBase(Hero)
+    where_shape = crud.flatten_where({"age__ge": 18}, Condition(field="intro", operator=Operator.EQ, value="x"))[0]
+    error = crud.not_indexed_error(where_shape)
+    assert isinstance(error, QueryNotIndexed)
+    assert error.data["unindexed"] == ["intro eq"]
+    assert error.data["suggested_index"] == ["intro", "age"]
+    assert "Index(intro, age)" in error.message and "age(hero_age_IDX)" in error.message
+
+
+def test_index_usable():
+    builder = ConditionBuilder(Hero)
+    leading_fields = {columns[0] for columns in get_indexes(Hero).values()}
+
+    def usable(condition: LogicCondition | Condition, fields=frozenset()) -> bool:
+        return builder.index_usable(builder.flatten(condition)[0], leading_fields, fields)
+
+    assert usable(Condition(field="age", operator=Operator.GE, value=18))
+    assert not usable(Condition(field="update_time", operator=Operator.GE, value="2024-01-01"))
+    assert not usable(Condition(field="name", operator=Operator.LIKE, value="a"))
+    assert usable(Condition(field="intro", value="x"), fields={"name"})
+    intro = Condition(field="intro", value="x")
+    assert usable(LogicCondition(and_=[intro, Condition(field="name", value="a")]))
+    assert not usable(LogicCondition(or_=[intro, Condition(field="name", value="a")]))
+    assert usable(LogicCondition(or_=[Condition(field="id", value=1), Condition(field="name", value="a")]))
+
+
+def test_export_validation():
+    """导出参数在开始响应前校验"""
+    service = BaseService(Hero)
+    service.search_index = SearchIndex("hero", ["name"])
+    for source in ExportSource:
+        with pytest.raises(ParamValidationError):
+            service.export(ExportQuery(fields=["name", "unknown"], source=source))
+        with pytest.raises(ParamValidationError):
+            service.export(ExportQuery(sort_by="unknown", source=source))
+        with pytest.raises(ParamValidationError):
+            service.export(ExportQuery(condition=Condition(field="unknown", value=1), source=source))
+    statement = service.crud.stream_statement(service.crud.get_column_attrs(["name"]), sort_by="age")
+    assert "ORDER BY hero.age" in str(statement)
+
+
+class FakeSession:
+    bind = None
+
+    def __init__(self):
+        self.invalidated = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def in_transaction(self):
+        return False
+
+    async def invalidate(self):
+        self.invalidated = True
+
+
+@pytest.mark.asyncio
+async def test_parallel_count(monkeypatch):
+    """计数在独立会话上与分页查询并发，分页查询失败时取消计数并作废其连接"""
+    count_session = FakeSession()
+    monkeypatch.setattr(crud_module, "fork_session", lambda session: count_session)
+    monkeypatch.setattr(crud_module, "pool_has_capacity", lambda bind, required: True)
+    monkeypatch.setattr(config.db, "parallel_count", True)
+    count_events = []
+
+    async def count(session):
+        assert session is count_session
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            count_events.append("cancelled")
+            raise
+        return 10
+
+    async def get_list(session):
+        return [1]
+
+    async def failed_get_list(session):
+        await asyncio.sleep(0.01)
+        raise ValueError
+
+    assert await CRUDBase.count_and_get_list(FakeSession(), count, get_list) == (10, [1])
+    assert not count_session.invalidated
+    with pytest.raises(ValueError):
+        await CRUDBase.count_and_get_list(FakeSession(), count, failed_get_list)
+    assert count_events == ["cancelled"]
+    assert count_session.invalidated
+
+    async def failed_count(session):
+        raise KeyError
+
+    count_session.invalidated = False
+    with pytest.raises(KeyError):
+        await CRUDBase.count_and_get_list(FakeSession(), failed_count, get_list)
+    assert not count_session.invalidated
+
+
+class FakeEntityCache:
+    def __init__(self, values):
+        self.values = values
+
+    async def get(self, ident):
+        return (ident in self.values), self.values.get(ident)
+
+
+@pytest.mark.asyncio
+async def test_get_many_entity_cache(monkeypatch):
+    """批量查询先读主键缓存，缓存中字段不全的记录和未命中的记录查询数据库"""
+    service = BaseService(Hero)
+    service.entity_cache = FakeEntityCache({(1,): {"id": 1, "name": "cached", "age": 1}, (2,): None, (3,): {"id": 3}})
+    queried = []
+
+    async def get_by_pks(session, idents, fields=None):
+        queried.extend(idents)
+        return [Hero(id=ident[0], name="db", age=2) for ident in idents if ident != (5,)]
+
+    monkeypatch.setattr(service.crud, "get_by_pks", get_by_pks)
+    data = await service.get_many(None, [1, 2, 3, 4, 5, 1], fields=["name"])
+    assert queried == [(3,), (4,), (5,)]
+    assert [item and item["name"] for item in data["items"]] == ["cached", None, "db", "db", None, "cached"]
+    assert data["items"][0] == {"id": 1, "name": "cached"}
+    assert data["missing"] == [2, 5]
+
+
+def test_next_cursor():
+    """游标分页多查一条判断是否有下一页，最后一页不返回游标"""
+    crud = CRUDBase(Hero)
+    query = HeroQuery(sort_by="create_time", page_size=2, cursor="")
+    items = [{"id": i, "create_time": "2024-01-01T00:00:00"} for i in range(3)]
+    paged = crud.make_paged(items, query, rows=True)
+    assert len(paged.items) == 2
+    assert decode_cursor(paged.next_cursor, format_keyset(Hero, "create_time"))[1] == 1
+    paged = crud.make_paged(items[:2], query, rows=True)
+    assert len(paged.items) == 2 and paged.next_cursor is None
+    with pytest.raises(ParamValidationError):
+        format_keyset(Hero, "age")  # 可为空的排序字段
+
+
+@pytest.mark.asyncio
+async def test_upsert_invalidates_conflicts(monkeypatch):
+    """upsert 按唯一键冲突更新的已有记录同样失效主键缓存，包括返回主键为None的行"""
+    service = BaseService(Hero)
+    service.entity_cache = FakeEntityCache({})
+    deleted = []
+
+    async def delete(idents):
+        deleted.append(list(idents))
+
+    async def get_upsert_conflicts(session, objs_new):
+        return [(3,), (5,)]
+
+    async def bulk_create(session, objs_new, upsert=False):
+        return 3, [None, (5,)]
+
+    monkeypatch.setattr(service.entity_cache, "delete", delete, raising=False)
+    monkeypatch.setattr(service.crud, "get_upsert_conflicts", get_upsert_conflicts)
+    monkeypatch.setattr(service.crud, "bulk_create", bulk_create)
+    session = FakeSession()
+    session.info = {}
+    data = await service.bulk_create(session, [Hero(), Hero(id=5)], upsert=True)
+    assert data["keys"] == [None, 5]
+    assert deleted == [[(3,), (5,)]]
+    assert get_unique_keys(Hero) == [("id",)]
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import config
+from app.core.db import engine, get_replica_lag, pool_has_capacity, read_engine
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def mappings(self):
+        return self
+
+    def first(self):
+        return self.row
+
+
+class FakeConnection:
+    def __init__(self, statuses):
+        self.statuses = statuses  # 语句 -> 复制状态行，缺少的语句抛出 DBAPIError
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def exec_driver_sql(self, sql):
+        if sql not in self.statuses:
+            raise DBAPIError(sql, None, Exception(1227, "Access denied"))
+        return FakeResult(self.statuses[sql])
+
+    async def rollback(self):
+        pass
+
+
+class FakeEngine:
+    url = type("URL", (), {"host": "replica"})
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def connect(self):
+        return FakeConnection(self.statuses)
+
+
+@pytest.mark.asyncio
+async def test_replica_lag():
+    lag = await get_replica_lag(FakeEngine({"SHOW REPLICA STATUS": {"Seconds_Behind_Source": 3}}))
+    assert lag == 3
+    lag = await get_replica_lag(FakeEngine({"SHOW SLAVE STATUS": {"Seconds_Behind_Master": None}}))
+    assert lag is None
+    assert await get_replica_lag(FakeEngine({"SHOW REPLICA STATUS": None})) == 0
+    # 两条语句都不支持（如TiDB）或无权限时视为无延迟，不从读库中移除
+    assert await get_replica_lag(FakeEngine({})) == 0
+
+
+def test_pool_has_capacity(monkeypatch):
+    monkeypatch.setattr(config.db, "parallel_pool_usage", 0.8)
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=AsyncAdaptedQueuePool, pool_size=2, max_overflow=3)
+    assert pool_has_capacity(engine, 4)  # (2 + 3) * 0.8
+    assert not pool_has_capacity(engine, 5)
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=AsyncAdaptedQueuePool, pool_size=2, max_overflow=-1)
+    assert pool_has_capacity(engine, 100)
+    assert not pool_has_capacity(create_async_engine("sqlite+aiosqlite://", poolclass=NullPool))
+
+
+def test_read_engine_pool():
+    """主库读引擎使用独立的较小连接池，与主库连接池合计不超过 max_connections 的预算"""
+    assert read_engine.pool.size() == config.db.read_pool_size
+    assert read_engine.pool._max_overflow == config.db.read_max_overflow
+    assert engine.pool.size() == config.db.pool_size
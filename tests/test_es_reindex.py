@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from scripts.es_reindex import make_index_name, make_index_settings
+
+
+def test_make_index_name():
+    assert make_index_name("hero", datetime(2024, 1, 2, 3, 4, 5)) == "hero_v20240102030405"
+
+
+def test_make_index_settings():
+    source_settings = {
+        "number_of_shards": "3",
+        "number_of_replicas": "1",
+        "uuid": "abc",
+        "creation_date": "1700000000000",
+        "analysis": {"analyzer": {}},
+    }
+    assert make_index_settings(source_settings, {"index": {"number_of_shards": 6}}) == {
+        "number_of_shards": 6,
+        "number_of_replicas": "1",
+        "analysis": {"analyzer": {}},
+    }
+    assert make_index_settings(source_settings, {"number_of_replicas": 2})["number_of_replicas"] == 2
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import config
+from app.models.hero import Hero
+from app.schemas.hero import HeroPublic
+from app.task import es_sync
+from app.task.es_sync import ESSyncTask
+
+
+def test_to_action():
+    task = ESSyncTask(Hero, HeroPublic, index="hero")
+    assert "team" not in task.doc_fields
+    row = {name: None for name in task.doc_fields} | {"id": 1, "name": "n", "is_deprecated": 0, "address_info": {}}
+    action = task.to_action(row)
+    assert action["_op_type"] == "index" and action["_id"] == 1 and action["_source"]["name"] == "n"
+    assert task.to_action(row | {"is_deprecated": 1}) == {"_op_type": "delete", "_index": "hero", "_id": 1}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeReadSession:
+    def __init__(self, source: "FakeSource"):
+        self.source = source
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def exec(self, statement):
+        self.source.statements.append(statement)
+        return FakeResult(self.source.batches.pop(0) if self.source.batches else [])
+
+
+class FakeSource:
+    """按顺序返回预设的批次，记录每批的查询语句"""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.statements = []
+
+    async def create_read_session(self):
+        return FakeReadSession(self)
+
+
+T0 = datetime(2024, 1, 1)
+
+
+def make_row(task: ESSyncTask, pk: int, seconds: int) -> dict:
+    return {name: None for name in task.doc_fields} | {
+        "id": pk,
+        "name": f"n{pk}",
+        "is_deprecated": 0,
+        "address_info": {},
+        "update_time": T0 + timedelta(seconds=seconds),
+    }
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    """返回 (同步任务, 各次 bulk 写入的文档ID, 写入失败的文档ID)"""
+    task = ESSyncTask(Hero, HeroPublic, index="hero")
+    redis = FakeRedis()
+    bulks = []
+    fail_ids = set()
+
+    async def async_bulk(client, actions, **kwargs):
+        ids = [action["_id"] for action in actions]
+        bulks.append(ids)
+        errors = [{"index": {"_id": _id, "status": 400}} for _id in ids if _id in fail_ids]
+        return len(ids) - len(errors), errors
+
+    monkeypatch.setattr(es_sync, "redis_cache", redis)
+    monkeypatch.setattr(es_sync, "async_bulk", async_bulk)
+    monkeypatch.setattr(es_sync, "get_es", lambda cluster: None)
+    monkeypatch.setattr(config.es, "sync_batch_size", 2)
+    monkeypatch.setattr(config.es, "sync_safety_lag", 10)
+    return task, bulks, fail_ids
+
+
+def use_source(monkeypatch, task: ESSyncTask, pks_and_seconds: list) -> FakeSource:
+    rows = [make_row(task, pk, seconds) for pk, seconds in pks_and_seconds]
+    source = FakeSource([rows[i : i + 2] for i in range(0, len(rows), 2)])
+    monkeypatch.setattr(es_sync, "create_read_session", source.create_read_session)
+    return source
+
+
+def where_params(statement) -> list:
+    compiled = statement.compile()
+    return [value for key, value in compiled.params.items() if not key.startswith("param")]
+
+
+@pytest.mark.asyncio
+async def test_watermark_advances(monkeypatch, sync):
+    task, bulks, fail_ids = sync
+    source = use_source(monkeypatch, task, [(1, 1), (2, 2), (3, 3)])
+    await task.run()
+    assert bulks == [[1, 2], [3]]
+    assert await task.get_watermark() == (T0 + timedelta(seconds=3), 3)
+    # 首轮没有水位线，全量读取；不足一批说明已读完，不再查询
+    assert source.statements[0].whereclause is None
+    assert len(source.statements) == 2
+
+
+@pytest.mark.asyncio
+async def test_keyset_continuation(monkeypatch, sync):
+    """下一批从上一批最后一条的 (更新时间, 主键) 之后开始，同一时间的记录不会漏读"""
+    task, bulks, fail_ids = sync
+    source = use_source(monkeypatch, task, [(1, 1), (2, 1), (3, 1), (4, 2)])
+    await task.run()
+    assert bulks == [[1, 2], [3, 4]]
+    second, third = source.statements[1:]
+    assert "(hero.update_time, hero.id) >" in str(second)
+    assert where_params(second) == [T0 + timedelta(seconds=1), 2]
+    assert where_params(third) == [T0 + timedelta(seconds=2), 4]
+
+
+@pytest.mark.asyncio
+async def test_stop_on_failure(monkeypatch, sync):
+    """一批写入失败时停止本轮，水位线停在上一成功批次，下一轮从该处重试"""
+    task, bulks, fail_ids = sync
+    fail_ids.add(3)
+    use_source(monkeypatch, task, [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 6)])
+    await task.run()
+    assert bulks == [[1, 2], [3, 4]]  # 已读取的下一批不再写入
+    assert await task.get_watermark() == (T0 + timedelta(seconds=2), 2)
+
+
+@pytest.mark.asyncio
+async def test_safety_lag_rewind(monkeypatch, sync):
+    """每轮从水位线回退 sync_safety_lag 秒开始读取，重新同步长事务晚提交的记录"""
+    task, bulks, fail_ids = sync
+    await task.set_watermark(T0 + timedelta(seconds=100), 7)
+    source = use_source(monkeypatch, task, [(8, 95)])
+    await task.run()
+    assert "hero.update_time >=" in str(source.statements[0])
+    assert where_params(source.statements[0]) == [T0 + timedelta(seconds=90)]
+    assert await task.get_watermark() == (T0 + timedelta(seconds=95), 8)
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from app.config import config
+from app.utils import es_util
+
+
+class FakeES:
+    """第一次请求时 dsl 为 {"fail": True} 的子查询返回 429"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def msearch(self, body, index, request_timeout):
+        dsl_list = body[1::2]
+        self.calls.append(len(dsl_list))
+        responses = []
+        for dsl in dsl_list:
+            if dsl.get("fail") and len(self.calls) <= 3:
+                responses.append({"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+            elif dsl.get("bad"):
+                responses.append({"error": {"type": "parsing_exception"}, "status": 400})
+            else:
+                responses.append({"hits": {"hits": [dsl["n"]]}, "status": 200})
+        return {"responses": responses}
+
+
+@pytest.mark.asyncio
+async def test_bulk_query(monkeypatch):
+    es = FakeES()
+    monkeypatch.setattr(es_util, "get_es", lambda cluster: es)
+    monkeypatch.setattr(es_util, "RETRY_BACKOFF", 0)
+    dsl_list = [{"n": i} for i in range(7)]
+    dsl_list[2]["fail"] = True
+    dsl_list[5]["bad"] = True
+    result = await es_util.bulk_query(dsl_list, "hero", chunk_size=3, concurrency=2)
+    assert sorted(es.calls) == [1, 1, 3, 3]
+    assert [response.get("status") for response in result] == [200, 200, 200, 200, 200, 400, 200]
+    assert [response["hits"]["hits"][0] for response in result if response["status"] == 200] == [0, 1, 2, 3, 4, 6]
+
+
+class SlowES:
+    def __init__(self):
+        self.timeouts = []
+
+    async def msearch(self, body, index, request_timeout):
+        self.timeouts.append(request_timeout)
+        await asyncio.sleep(0.05)
+        return {"responses": [{"hits": {"hits": []}, "status": 200} for _ in body[1::2]]}
+
+
+@pytest.mark.asyncio
+async def test_bulk_query_deadline(monkeypatch):
+    """等待并发名额的时间计入总时限但不占用请求超时；名额到手时已超时的子查询返回 504 错误，不抛出异常"""
+    es = SlowES()
+    monkeypatch.setattr(es_util, "get_es", lambda cluster: es)
+    result = await es_util.bulk_query([{}, {}], "hero", chunk_size=1, concurrency=1, timeout=1)
+    assert [response["status"] for response in result] == [200, 200]
+    assert es.timeouts[1] < es.timeouts[0] - 0.04
+    es.timeouts.clear()
+    result = await es_util.bulk_query([{}, {}], "hero", chunk_size=1, concurrency=1, timeout=0.03)
+    assert sorted(response["status"] for response in result) == [200, 504]
+    assert len(es.timeouts) == 1
+
+
+class FakePitES:
+    def __init__(self, total: int, delay: float = 0):
+        self.docs = [{"_source": {"n": i}, "sort": [i]} for i in range(total)]
+        self.delay = delay
+        self.searches = []
+        self.cancelled = []
+        self.closed = []
+
+    async def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit0"}
+
+    async def search(self, pit, size, search_after, **kwargs):
+        self.searches.append(search_after)
+        if search_after is not None and self.delay:
+            try:
+                await asyncio.sleep(self.delay)
+            except asyncio.CancelledError:
+                self.cancelled.append(search_after)
+                raise
+        start = 0 if search_after is None else search_after[0] + 1
+        return {"pit_id": f"pit{len(self.searches)}", "hits": {"hits": self.docs[start : start + size]}}
+
+    async def close_point_in_time(self, id):
+        self.closed.append(id)
+
+
+@pytest.mark.asyncio
+async def test_scan_pit(monkeypatch):
+    es = FakePitES(5)
+    monkeypatch.setattr(es_util, "get_es", lambda cluster: es)
+
+    batches = [[hit["_source"]["n"] for hit in hits] async for hits in es_util.scan_pit("hero", batch_size=2)]
+    assert batches == [[0, 1], [2, 3], [4]]
+    assert es.searches == [None, [1], [3]]
+    assert es.closed == ["pit3"]
+
+
+@pytest.mark.asyncio
+async def test_scan_pit_break(monkeypatch):
+    """提前结束遍历时，预取中的检索先取消并结束，再关闭 PIT"""
+    es = FakePitES(5, delay=1)
+    monkeypatch.setattr(es_util, "get_es", lambda cluster: es)
+    scanner = es_util.scan_pit("hero", batch_size=2)
+    async for hits in scanner:
+        await asyncio.sleep(0)  # 让预取的检索开始执行
+        break
+    await scanner.aclose()
+    assert es.cancelled == [[1]]
+    assert es.closed == ["pit1"]
+
+
+@pytest.mark.asyncio
+async def test_client_stats():
+    """连接池统计：请求进行中的连接计入 in_use，响应读完后归还为 idle"""
+    finished = asyncio.Event()
+
+    async def handle(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(b"{")
+        await finished.wait()  # 响应未结束前连接保持使用中
+        await response.write(b"}")
+        return response
+
+    app = web.Application()
+    app.router.add_get("/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    registry = es_util.ESClientRegistry()
+    cluster = config.es.model_copy(update={"host": f"http://127.0.0.1:{port}", "connections_per_node": 3})
+    registry._clients["test"] = registry.create_client(cluster)
+    try:
+        (node_stats,) = registry.stats()["test"]
+        assert (node_stats["limit"], node_stats["in_use"], node_stats["idle"]) == (3, 0, 0)  # 尚未创建连接池
+        (node,) = registry._clients["test"].transport.node_pool.all()
+        node._create_aiohttp_session()
+        async with node.session.get(f"http://127.0.0.1:{port}/") as response:
+            (node_stats,) = registry.stats()["test"]
+            assert (node_stats["in_use"], node_stats["idle"]) == (1, 0)
+            finished.set()
+            await response.read()
+        (node_stats,) = registry.stats()["test"]
+        assert (node_stats["in_use"], node_stats["idle"]) == (0, 1)
+    finally:
+        await registry.close()
+        await runner.cleanup()
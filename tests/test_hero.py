@@ -2,6 +2,7 @@ import pytest
 
 from app.crud.base import CRUDBase
 from app.models.hero import Hero
+from app.schemas.hero import HeroQuery
 from app.schemas.query import CommonQuery, Condition, Operator
 from app.service.base import BaseService
 
@@ -33,3 +34,77 @@ async def test_crud(db_session):
     await crud.create(db_session, Hero(name="n1", secret_name="s1", intro="i1", address_info={}))
     db_item = await crud.get_first(db_session, condition=Condition(field="name", operator=Operator.EQ, value="n1"))
     assert db_item.intro == "i1"
+
+
+@pytest.mark.asyncio
+async def test_cursor_pagination(db_session):
+    crud = CRUDBase[Hero](Hero)
+    for i in range(3):
+        await crud.create(db_session, Hero(name="cursor", secret_name="s", intro="i", address_info={}, age=i))
+    ids, cursor = [], ""
+    while cursor is not None:
+        query = HeroQuery(name="cursor", fields="id", sort_by="create_time", page_size=2, cursor=cursor)
+        paged = await crud.list(db_session, query)
+        ids.extend(item.id for item in paged.items)
+        cursor = paged.next_cursor
+    assert len(ids) == len(set(ids)) >= 3
+
+
+@pytest.mark.asyncio
+async def test_export(client):
+    result = await client.post("/api/v1/hero/export", json={"fields": ["id", "name"], "format": "csv"})
+    assert result.status_code == 200
+    assert result.text.splitlines()[0] == "id,name"
+
+
+@pytest.mark.asyncio
+async def test_bulk_create(client):
+    items = [{"name": f"bulk{i}", "secret_name": "s", "intro": "i", "address_info": {}} for i in range(3)]
+    result = await client.post("/api/v1/hero/bulk_create", json={"items": items, "fields": ["id", "create_time"]})
+    data = result.json()["data"]
+    assert data["count"] == 3
+    assert [item["id"] for item in data["items"]] == data["keys"]
+    assert all(item["create_time"] for item in data["items"])
+
+
+@pytest.mark.asyncio
+async def test_update_many(db_session):
+    crud = CRUDBase[Hero](Hero)
+    for _ in range(2):
+        await crud.create(db_session, Hero(name="many", secret_name="s", intro="i", address_info={}))
+    condition = Condition(field="name", operator=Operator.EQ, value="many")
+    assert await crud.update_many(db_session, condition, {"age": 30}, dry_run=True) >= 2
+    count = await crud.update_many(db_session, condition, {"age": 30})
+    assert count == await crud.count(db_session, condition=condition)
+
+
+@pytest.mark.asyncio
+async def test_update_fields(client):
+    params = {"name": "n1", "secret_name": "s1", "intro": "i1", "address_info": {}}
+    pk = (await client.post("/api/v1/hero/create", json=params)).json()["data"]["id"]
+    result = await client.post(f"/api/v1/hero/update/{pk}", json={"name": "n2"})
+    assert result.json()["data"] == {"id": pk, "name": "n2"}
+    result = await client.post(f"/api/v1/hero/update/{pk}?fields=update_time", json={"name": "n3"})
+    assert result.json()["data"]["update_time"]
+    result = await client.post("/api/v1/hero/update/0", json={"name": "n3"})
+    assert result.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_batch_get(client):
+    params = {"name": "n1", "secret_name": "s1", "intro": "i1", "address_info": {}}
+    pk = (await client.post("/api/v1/hero/create", json=params)).json()["data"]["id"]
+    result = await client.post("/api/v1/hero/batch_get", json={"pks": [pk, 0, pk], "fields": ["name"]})
+    data = result.json()["data"]
+    assert data["items"] == [{"id": pk, "name": "n1"}, None, {"id": pk, "name": "n1"}]
+    assert data["missing"] == [0]
+
+
+@pytest.mark.asyncio
+async def test_get(client):
+    params = {"name": "n1", "secret_name": "s1", "intro": "i1", "address_info": {}}
+    pk = (await client.post("/api/v1/hero/create", json=params)).json()["data"]["id"]
+    result = await client.get(f"/api/v1/hero/get/{pk}")
+    assert result.json()["data"]["name"] == "n1"
+    result = await client.get("/api/v1/hero/get/0")
+    assert result.status_code == 404
@@ -0,0 +1,24 @@
+import pytest
+
+from app.exceptions import ParamValidationError
+from app.models.hero import Hero
+from app.utils.model_util import parse_pk, get_version_column, get_indexes
+
+
+def test_parse_pk():
+    assert parse_pk(Hero, "12") == (12,)
+    with pytest.raises(ParamValidationError):
+        parse_pk(Hero, "abc")
+
+
+def test_version_column():
+    assert get_version_column(Hero) is None
+
+
+def test_indexes():
+    assert get_indexes(Hero) == {
+        "PRIMARY": ("id",),
+        "hero_name_IDX": ("name",),
+        "hero_age_IDX": ("age", "update_time"),
+        "fk_team_id": ("team_id",),
+    }
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from app.config import config
+from app.context import query_timeout_context
+from app.exceptions import ParamValidationError, QueryCancelled, QueryTimeout
+from app.utils import query_deadline
+from app.utils.query_deadline import get_request_timeout, run_with_deadline, QUERY_TIMEOUT_HEADER
+
+
+class FakeRequest:
+    method = "POST"
+    url = type("URL", (), {"path": "/api/v1/hero/query"})
+
+    def __init__(self, headers=None, disconnect_after: int = None):
+        self.headers = headers or {}
+        self.disconnect_after = disconnect_after  # 第几次检查时客户端已断开
+        self.checks = 0
+
+    async def is_disconnected(self):
+        self.checks += 1
+        return self.disconnect_after is not None and self.checks >= self.disconnect_after
+
+
+class FakeSession:
+    bind = None
+
+    def __init__(self):
+        self.info = {}
+        self.invalidated = False
+
+    async def invalidate(self):
+        self.invalidated = True
+
+
+@pytest.fixture
+def killed(monkeypatch):
+    killed = []
+
+    async def kill_queries(bind, connection_ids):
+        killed.append(connection_ids)
+
+    monkeypatch.setattr(query_deadline, "kill_queries", kill_queries)
+    monkeypatch.setattr(query_deadline, "GRACE_PERIOD", 0)
+    monkeypatch.setattr(config.db, "disconnect_check_interval", 0.01)
+    return killed
+
+
+def slow_query(events: list, seconds: float = 10):
+    async def func():
+        events.append(query_timeout_context.get())
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return "done"
+
+    return func
+
+
+def test_request_timeout(monkeypatch):
+    monkeypatch.setattr(config.db, "max_query_timeout", 300)
+    assert get_request_timeout(FakeRequest(), 30) == 30
+    assert get_request_timeout(FakeRequest({QUERY_TIMEOUT_HEADER: "300"}), 30) == 300
+    for value in ("abc", "0", "-1", "301", "1.5"):
+        with pytest.raises(ParamValidationError):
+            get_request_timeout(FakeRequest({QUERY_TIMEOUT_HEADER: value}), 30)
+
+
+@pytest.mark.asyncio
+async def test_completed(killed):
+    session, events = FakeSession(), []
+    assert await run_with_deadline(FakeRequest(), session, 5, slow_query(events, 0.01)) == "done"
+    assert events == [5]  # 查询在时限上下文中执行，语句带 MAX_EXECUTION_TIME 提示
+    assert not killed and not session.invalidated
+
+
+@pytest.mark.asyncio
+async def test_timeout(killed):
+    session, events = FakeSession(), []
+    with pytest.raises(QueryTimeout):
+        await run_with_deadline(FakeRequest(), session, 1, slow_query(events))
+    assert events == [1, "cancelled"]
+    assert killed == [set()] and session.invalidated
+
+
+@pytest.mark.asyncio
+async def test_disconnect(killed):
+    session, events = FakeSession(), []
+    request = FakeRequest(disconnect_after=2)
+    with pytest.raises(QueryCancelled):
+        await run_with_deadline(request, session, 30, slow_query(events))
+    assert request.checks == 2
+    assert events == [30, "cancelled"]
+    assert len(killed) == 1 and session.invalidated
+
+
+@pytest.mark.asyncio
+async def test_server_timeout(killed):
+    """服务端按 MAX_EXECUTION_TIME 中止查询（错误码 3024）时转换为 QueryTimeout，不终止查询、不作废连接"""
+
+    async def func():
+        raise DBAPIError(
+            "SELECT 1", None, Exception(query_deadline.ER_QUERY_TIMEOUT, "maximum statement execution time")
+        )
+
+    session = FakeSession()
+    with pytest.raises(QueryTimeout):
+        await run_with_deadline(FakeRequest(), session, 5, func)
+    assert not killed and not session.invalidated
+
+    async def other_error():
+        raise DBAPIError("SELECT 1", None, Exception(1064, "syntax error"))
+
+    with pytest.raises(DBAPIError):
+        await run_with_deadline(FakeRequest(), session, 5, other_error)
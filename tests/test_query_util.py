@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from app.exceptions import ParamValidationError
+from app.models.hero import Hero
+from app.schemas.hero import HeroQuery
+from app.schemas.query import LogicCondition, Condition, Operator, CommonQuery
+from app.utils.condition_builder import ConditionBuilder
+from app.utils.query_util import (
+    format_keyset,
+    encode_cursor,
+    decode_cursor,
+    normalize_condition,
+    make_digest,
+    flatten_query_params,
+    check_filter_params,
+    format_fields,
+    resolve_filter,
+)
+from app.utils.statement_cache import StatementCache
+
+
+def test_keyset_appends_primary_key():
+    """排序键自动追加主键"""
+    assert [c.key for c in format_keyset(Hero, "update_time")] == ["update_time", "id"]
+    assert [c.key for c in format_keyset(Hero, None)] == ["id"]
+
+
+def test_cursor_roundtrip():
+    """游标编解码还原字段类型"""
+    columns = format_keyset(Hero, "update_time")
+    values = [datetime(2024, 9, 3, 12, 30), 42]
+    assert decode_cursor(encode_cursor(values), columns) == values
+
+
+def test_invalid_cursor():
+    with pytest.raises(ParamValidationError):
+        decode_cursor("not-a-cursor", format_keyset(Hero, None))
+    with pytest.raises(ParamValidationError):
+        decode_cursor(encode_cursor([1, 2]), format_keyset(Hero, None))
+
+
+def test_normalize_condition():
+    """同层条件顺序与多值顺序不影响规范化结果"""
+    cond1 = LogicCondition(
+        and_=[Condition(field="age", operator=Operator.IN, value=[2, 1]), Condition(field="name", value="n1")]
+    )
+    cond2 = LogicCondition(
+        and_=[Condition(field="name", value="n1"), Condition(field="age", operator=Operator.IN, value=[1, 2])]
+    )
+    assert make_digest(normalize_condition(cond1)) == make_digest(normalize_condition(cond2))
+
+
+def test_condition_shape():
+    """仅参数值不同的条件形状相同"""
+    builder = ConditionBuilder(Hero)
+    shape1, values1 = builder.flatten(LogicCondition(and_=[Condition(field="age", value=1)]))
+    shape2, values2 = builder.flatten(LogicCondition(and_=[Condition(field="age", value=2)]))
+    assert shape1 == shape2 and values1 != values2
+    shape3, _ = builder.flatten(LogicCondition(and_=[Condition(field="age", value=None)]))
+    assert shape3 != shape1
+    assert flatten_query_params(Hero, {"id__in": "1"}) != flatten_query_params(Hero, {"id__in": "1,2"})
+
+
+def test_statement_cache():
+    cache = StatementCache(maxsize=2)
+    for key in ("a", "b", "a", "c"):
+        cache.get_or_build(key, lambda: object())
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+    assert list(cache._cache) == ["a", "c"]
+
+
+def test_filter_params():
+    check_filter_params(Hero, HeroQuery)
+    assert resolve_filter(Hero, "create_time__ge") == ("create_time", "ge")
+    assert resolve_filter(Hero, "pets__json_contains") == ("pets", "json_contains")
+
+    class BadQuery(CommonQuery):
+        unknown__ge: int = None
+
+    with pytest.raises(ValueError):
+        check_filter_params(Hero, BadQuery)
+
+
+def test_format_fields():
+    """未知字段默认忽略（/list、/query 的既有行为），strict 时报错（导出）"""
+    select_columns, relation_columns = format_fields(Hero, "name, unknown,team,metadata")
+    assert [c.key for c in select_columns] == ["name"] and [c.key for c in relation_columns] == ["team"]
+    with pytest.raises(ParamValidationError):
+        format_fields(Hero, ["name", "unknown"], strict=True)
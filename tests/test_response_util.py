@@ -0,0 +1,31 @@
+import json
+from datetime import datetime
+
+import pytest
+from pydantic import BaseModel, Field
+
+from app.models.hero import Hero
+from app.schemas.hero import HeroPublic
+from app.utils.response_util import FastJSONRenderer
+
+
+def test_fast_renderer():
+    renderer = FastJSONRenderer(Hero, HeroPublic)
+    assert not renderer.need_filter
+    body = renderer.render({"items": [{"id": 1, "create_time": datetime(2024, 1, 2, 3, 4, 5)}]})
+    assert json.loads(body)["data"]["items"][0]["create_time"] == "2024-01-02T03:04:05"
+
+
+def test_fast_renderer_filter():
+    class HeroName(BaseModel):
+        id: int
+        name: str
+
+    renderer = FastJSONRenderer(Hero, HeroName)
+    assert renderer.filter({"id": 1, "name": "n", "intro": "i"}) == {"id": 1, "name": "n"}
+
+    class HeroAlias(BaseModel):
+        name: str = Field(alias="heroName")
+
+    with pytest.raises(ValueError):
+        FastJSONRenderer(Hero, HeroAlias)
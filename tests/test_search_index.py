@@ -0,0 +1,75 @@
+import pytest
+
+from app.models.hero import Hero
+from app.schemas.query import Condition, LogicCondition, Operator
+from app.utils.search_index import SearchIndex
+
+
+def test_split():
+    search_index = SearchIndex("hero", ["name", "intro"])
+    name = Condition(field="name", operator=Operator.LIKE, value="浩景")
+    intro = Condition(field="intro", operator=Operator.LIKE, value="a*b")
+    age = Condition(field="age", operator=Operator.GE, value=18)
+    assert search_index.split(name) == ([name], None)
+    assert search_index.split(age) == ([], age)
+    searched, rest = search_index.split(LogicCondition(and_=[name, age], or_=[intro, name]))
+    assert searched == [name, LogicCondition(or_=[intro, name])]
+    assert rest == LogicCondition(and_=[age])
+    # OR 分支中有不能在ES中检索的条件时整体留在数据库执行
+    condition = LogicCondition(or_=[name, age])
+    assert search_index.split(condition) == ([], condition)
+
+
+def test_to_es_query():
+    name = Condition(field="name", operator=Operator.LIKE, value="浩景")
+    intro = Condition(field="intro", operator=Operator.LIKE, value="a*b")
+    search_index = SearchIndex("hero", {"name": "name.text", "intro": "intro"})
+    assert search_index.to_es_query(LogicCondition(and_=[name], or_=[intro])) == {
+        "bool": {
+            "filter": [{"match_phrase": {"name.text": "浩景"}}],
+            "should": [{"match_phrase": {"intro": "a*b"}}],
+            "minimum_should_match": 1,
+        }
+    }
+    search_index = SearchIndex("hero", ["intro"], query_type="wildcard")
+    assert search_index.to_es_query(intro) == {"wildcard": {"intro": {"value": "*a\\*b*", "case_insensitive": True}}}
+
+
+def test_to_es_query_structured():
+    search_index = SearchIndex("hero", ["name"])
+    condition = LogicCondition(
+        and_=[
+            Condition(field="age", operator=Operator.GE, value=18),
+            Condition(field="team_id", operator=Operator.IN, value=[1, 2]),
+            Condition(field="parent_id", value=None),
+        ]
+    )
+    assert search_index.to_es_query(condition) == {
+        "bool": {
+            "filter": [
+                {"range": {"age": {"gte": 18}}},
+                {"terms": {"team_id": [1, 2]}},
+                {"bool": {"must_not": [{"exists": {"field": "parent_id"}}]}},
+            ]
+        }
+    }
+
+
+@pytest.mark.asyncio
+async def test_prefilter(monkeypatch):
+    """ES检索出的主键只缩小范围，原模糊匹配条件仍在数据库中执行"""
+    search_index = SearchIndex("hero", ["name"])
+    name = Condition(field="name", operator=Operator.LIKE, value="浩景")
+    age = Condition(field="age", operator=Operator.GE, value=18)
+    hits = ["1", "2"]
+
+    async def search_ids(conds):
+        return hits
+
+    monkeypatch.setattr(search_index, "search_ids", search_ids)
+    pk_condition = Condition(field="id", operator=Operator.IN, value=[1, 2])
+    condition = await search_index.prefilter(Hero, LogicCondition(and_=[name, age]))
+    assert condition == LogicCondition(and_=[pk_condition, name, LogicCondition(and_=[age])])
+    assert await search_index.prefilter(Hero, name) == LogicCondition(and_=[pk_condition, name])
+    hits = None  # 命中超过上限时回退为原条件
+    assert await search_index.prefilter(Hero, name) == name
@@ -0,0 +1,43 @@
+from sqlalchemy.dialects import mysql, sqlite
+from sqlmodel import select
+
+from app.context import query_timeout_context
+from app.models.hero import Hero
+from app.utils.sql_util import estimate_rows, apply_query_timeout, is_full_scan
+
+
+def test_estimate_rows_mysql():
+    plan = [{"id": 1, "table": "hero", "type": "ref", "key": "hero_name_IDX", "rows": 200, "filtered": 50.0}]
+    assert estimate_rows(plan) == 100
+    plan = [{"id": 1, "table": "hero", "type": "ALL", "key": None, "rows": 200000, "filtered": 10.0}]
+    assert estimate_rows(plan) is None
+
+
+def test_estimate_rows_tidb():
+    plan = [
+        {"id": "IndexLookUp_10", "estRows": "120.00"},
+        {"id": "├─IndexRangeScan_8(Build)", "estRows": "120.00"},
+        {"id": "└─TableRowIDScan_9(Probe)", "estRows": "120.00"},
+    ]
+    assert estimate_rows(plan) == 120
+    plan = [{"id": "TableReader_7", "estRows": "10.00"}, {"id": "└─TableFullScan_5", "estRows": "10000.00"}]
+    assert estimate_rows(plan) is None
+
+
+def test_is_full_scan():
+    assert is_full_scan([{"id": 1, "table": "hero", "type": "ALL", "key": None}])
+    assert not is_full_scan([{"id": 1, "table": "hero", "type": "range", "key": "hero_age_IDX"}])
+    assert is_full_scan([{"id": "TableReader_7", "estRows": "10.00"}, {"id": "└─TableFullScan_5", "estRows": "1.00"}])
+    assert not is_full_scan([{"id": "IndexLookUp_10", "estRows": "1.00"}, {"id": "├─IndexRangeScan_8(Build)"}])
+
+
+def test_apply_query_timeout():
+    statement = select(Hero.id)
+    assert apply_query_timeout(statement) is statement
+    token = query_timeout_context.set(5)
+    try:
+        statement = apply_query_timeout(statement)
+    finally:
+        query_timeout_context.reset(token)
+    assert str(statement.compile(dialect=mysql.dialect())).startswith("SELECT /*+ MAX_EXECUTION_TIME(5000) */ hero.id")
+    assert "MAX_EXECUTION_TIME" not in str(statement.compile(dialect=sqlite.dialect()))